@@ -1,5 +1,8 @@
+import time
+import hashlib
+from collections import OrderedDict
 from jose import jwt, JWTError
-from api.config import JWT_SECRET
+from api.config import JWT_SECRET, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
 
 SECRET_KEY = JWT_SECRET
 ALGORITHM = "HS256"
@@ -7,9 +10,61 @@ ALGORITHM = "HS256"
 def create_token(user_id: str):
     return jwt.encode({"sub": user_id}, SECRET_KEY, algorithm=ALGORITHM)
 
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens: sha256(token) → (user_id, expires_at).
+
+    An entry expires at the token's `exp` claim, or after
+    TOKEN_CACHE_TTL_SECONDS for tokens without one. Only valid tokens
+    are cached, so junk tokens cannot evict real ones.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+
+    def get(self, key: bytes):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user_id
+
+    def put(self, key: bytes, user_id: str, exp=None):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        self._entries[key] = (user_id, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS)
+
 def verify_token(token: str):
+    key = hashlib.sha256(token.encode()).digest()
+    user_id = token_cache.get(key)
+    if user_id is not None:
+        return user_id
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
     except JWTError:
         return None
+
+    user_id = payload.get("sub")
+    if user_id:
+        token_cache.put(key, user_id, payload.get("exp"))
+    return user_id
@@ -1,4 +1,5 @@
 import os
+import json
 
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
@@ -11,5 +12,40 @@ QUEUE_NAME = os.getenv("QUEUE_NAME", "job_queue")
 
 JWT_SECRET = os.getenv("JWT_SECRET", "super-secret-key")
 
+# Verified JWTs cached per API process (tokens without `exp` are
+# re-verified after TOKEN_CACHE_TTL_SECONDS)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 300))
+
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", 5))
 WINDOW_SECONDS = int(os.getenv("WINDOW_SECONDS", 60))
+# Jobs per WINDOW_SECONDS a user may submit through POST /jobs/batch and
+# POST /workflows (their own bucket, instead of the RATE_LIMIT one)
+BULK_RATE_LIMIT = int(os.getenv("BULK_RATE_LIMIT", 1000))
+# Extra per-user limits for some job types (jobs per WINDOW_SECONDS),
+# e.g. JOB_TYPE_RATE_LIMITS='{"report": 2}'
+JOB_TYPE_RATE_LIMITS = json.loads(os.getenv("JOB_TYPE_RATE_LIMITS", "{}"))
+# Reject clients whose bucket is known to be empty without asking Redis
+RATE_LIMIT_LOCAL_PRECHECK = os.getenv("RATE_LIMIT_LOCAL_PRECHECK", "true").lower() == "true"
+
+# Upper bound on the number of jobs accepted by a single POST /jobs/batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 1000))
+
+# Async API request path (asyncpg + redis.asyncio)
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 200))
+
+# In-process cache of job status snapshots in front of Redis (GET /jobs/{id})
+JOB_CACHE_SIZE = int(os.getenv("JOB_CACHE_SIZE", 10000))
+JOB_CACHE_TTL_SECONDS = float(os.getenv("JOB_CACHE_TTL_SECONDS", 1))
+
+# Page sizes of GET /jobs
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", 50))
+MAX_LIST_PAGE_SIZE = int(os.getenv("MAX_LIST_PAGE_SIZE", 500))
@@ -4,9 +4,20 @@ from sqlalchemy import create_engine, text
 # SQLAlchemy session management
 from sqlalchemy.orm import sessionmaker
 
+# Async engine and sessions for the request path
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
 # Base class that holds all ORM models (tables)
 from common.models import Base
 
+from api.config import (
+    ASYNC_DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE
+)
+
 
 # =========================
 # DATABASE CONFIGURATION
@@ -37,6 +48,40 @@ SessionLocal = sessionmaker(
 )
 
 
+# =========================
+# ASYNC ENGINE SETUP
+# =========================
+
+# Async engine used by the API routes
+# pool_pre_ping → drops dead connections before handing them out
+# pool_recycle  → avoids server-side idle timeouts
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True
+)
+
+# expire_on_commit=False → objects stay usable after commit
+# without an extra SELECT to refresh them
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    expire_on_commit=False,
+    autoflush=False
+)
+
+
+async def get_db():
+    """
+    FastAPI dependency yielding one AsyncSession per request.
+    The session is always closed when the request finishes.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
 # =========================
 # DATABASE HEALTH CHECK
 # =========================
@@ -60,14 +105,29 @@ def test_connection():
 # TABLE CREATION
 # =========================
 
+# Columns added to the jobs table after its first release
+# (create_all never alters a table that already exists)
+ADDED_COLUMNS = [
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS run_at TIMESTAMP WITHOUT TIME ZONE",
+]
+
+
 def create_tables():
     """
     Creates all database tables defined by ORM models.
 
     - Reads all models inheriting from Base
     - Creates missing tables only
+    - Adds columns and indexes declared later to tables that already existed
     - Safe to run multiple times
 
     Used at API startup to ensure schema exists.
     """
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in ADDED_COLUMNS:
+            conn.execute(text(statement))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -1,6 +1,9 @@
 # Import the Redis client library
 # This allows Python code to communicate with a Redis server
 import redis
+import redis.asyncio
+
+from api.config import REDIS_MAX_CONNECTIONS
 
 
 # Create a Redis client instance
@@ -12,6 +15,18 @@ redis_client = redis.Redis(
 )
 
 
+# Async Redis client for the API request path
+# All requests share one bounded connection pool
+# (callers wait for a free connection instead of failing)
+async_redis_pool = redis.asyncio.BlockingConnectionPool(
+    host="localhost",
+    port=6379,
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS
+)
+async_redis_client = redis.asyncio.Redis(connection_pool=async_redis_pool)
+
+
 # Name of the Redis queue (LIST data structure)
 # This key holds job IDs waiting to be processed by workers
 QUEUE_NAME = "job_queue"
@@ -4,7 +4,8 @@ from api.auth import verify_token
 
 security = HTTPBearer()
 
-def get_current_user(
+# async def → resolved on the event loop, not in the threadpool
+async def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(security)
 ):
     user_id = verify_token(creds.credentials)
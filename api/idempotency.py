@@ -1,12 +1,30 @@
-from api.db.redis_client import redis_client
+from api.db.redis_client import async_redis_client
 
 IDEMPOTENCY_TTL = 300  # 5 minutes
 
-def check_idempotency(key: str):
-    exists = redis_client.get(f"idempotency:{key}")
+async def check_idempotency(key: str):
+    exists = await async_redis_client.get(f"idempotency:{key}")
     if exists:
         return exists
     return None
 
-def save_idempotency(key: str, job_id: str):
-    redis_client.setex(f"idempotency:{key}", IDEMPOTENCY_TTL, job_id)
+async def save_idempotency(key: str, job_id: str):
+    await async_redis_client.setex(f"idempotency:{key}", IDEMPOTENCY_TTL, job_id)
+
+async def check_idempotency_many(keys: list) -> dict:
+    """
+    Resolves many idempotency keys with a single MGET.
+    Returns {key: existing_job_id} for the keys that were already used.
+    """
+    if not keys:
+        return {}
+    values = await async_redis_client.mget([f"idempotency:{key}" for key in keys])
+    return {key: job_id for key, job_id in zip(keys, values) if job_id}
+
+async def save_idempotency_many(mapping: dict):
+    if not mapping:
+        return
+    pipe = async_redis_client.pipeline(transaction=False)
+    for key, job_id in mapping.items():
+        pipe.setex(f"idempotency:{key}", IDEMPOTENCY_TTL, job_id)
+    await pipe.execute()
@@ -0,0 +1,136 @@
+import time
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import select
+
+from api.config import JOB_CACHE_SIZE, JOB_CACHE_TTL_SECONDS
+from api.db.database import AsyncSessionLocal
+from api.db.redis_client import async_redis_client
+from common.models import Job, JobHistory
+from common.snapshot import snapshot_key, decode_snapshot, queue_snapshot_fill, SNAPSHOT_FIELDS
+
+# Terminal snapshots never change, so they may stay cached longer
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+TERMINAL_TTL_SECONDS = 300
+
+
+class SnapshotCache:
+    """
+    Size-bounded LRU of job snapshots with a per-entry TTL.
+    Entries are also invalidated by the Redis listener on job updates.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        entry = self._entries.get(job_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self._entries[job_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(job_id)
+        self.hits += 1
+        return snapshot
+
+    def put(self, job_id: str, snapshot: dict):
+        ttl = TERMINAL_TTL_SECONDS if snapshot["status"] in TERMINAL_STATUSES else self.ttl
+        self._entries[job_id] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(job_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, job_id: str):
+        self._entries.pop(job_id, None)
+
+
+job_cache = SnapshotCache(JOB_CACHE_SIZE, JOB_CACHE_TTL_SECONDS)
+
+
+async def get_job_snapshot(job_id: str) -> Optional[dict]:
+    """
+    Read-through lookup of a job's status snapshot:
+    in-process cache → Redis snapshot → PostgreSQL (jobs, then jobs_history).
+
+    A PostgreSQL read fills the Redis snapshot for the next poll.
+    Returns None if the job does not exist.
+    """
+    return (await get_job_snapshots([job_id])).get(job_id)
+
+
+async def get_job_snapshots(job_ids: list) -> dict:
+    """
+    get_job_snapshot() for many jobs: one Redis pipeline for the
+    in-process misses and one query per table for the Redis misses.
+    Returns {job_id: snapshot} for the jobs that exist.
+    """
+    snapshots = {}
+    missing = []
+    for job_id in dict.fromkeys(job_ids):
+        snapshot = job_cache.get(job_id)
+        if snapshot is not None:
+            snapshots[job_id] = snapshot
+        else:
+            missing.append(job_id)
+    if not missing:
+        return snapshots
+
+    pipe = async_redis_client.pipeline(transaction=False)
+    for job_id in missing:
+        pipe.hgetall(snapshot_key(job_id))
+    not_cached = []
+    for job_id, raw in zip(missing, await pipe.execute()):
+        snapshot = decode_snapshot(raw)
+        if snapshot is None:
+            not_cached.append(job_id)
+        else:
+            snapshots[job_id] = snapshot
+            job_cache.put(job_id, snapshot)
+    if not not_cached:
+        return snapshots
+
+    rows = []
+    async with AsyncSessionLocal() as db:
+        # Live table first, then the archive (see worker/archiver.py)
+        for table in (Job, JobHistory):
+            found = (await db.execute(
+                select(
+                    table.id.label("job_id"),
+                    *(getattr(table, name) for name in SNAPSHOT_FIELDS if name != "job_id")
+                ).where(table.id.in_(not_cached))
+            )).all()
+            rows.extend(found)
+            not_cached = list(set(not_cached) - {row.job_id for row in found})
+            if not not_cached:
+                break
+
+    if rows:
+        # Fresher fields written by a worker in the meantime win
+        pipe = async_redis_client.pipeline(transaction=False)
+        merged_at = []
+        for row in rows:
+            queue_snapshot_fill(pipe, row.job_id, row._asdict())
+            merged_at.append(len(pipe) - 1)
+        results = await pipe.execute()
+        for row, index in zip(rows, merged_at):
+            snapshot = decode_snapshot(results[index])
+            snapshots[row.job_id] = snapshot
+            job_cache.put(row.job_id, snapshot)
+
+    return snapshots
+
+
+def snapshot_etag(snapshot: dict) -> str:
+    digest = hashlib.sha1(json.dumps(snapshot, sort_keys=True).encode()).hexdigest()
+    return f'"{digest}"'
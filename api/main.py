@@ -1,12 +1,14 @@
 from fastapi import FastAPI
-from api.db.database import create_tables, test_connection
+from api.db.database import create_tables, test_connection, async_engine
+from api.db.redis_client import async_redis_pool
 from api.routes.jobs import router as jobs_router
 from api.routes.metrics import router as metrics_router
 from api.redis_listener import start_redis_listener
 from api.routes.ws import manager
 from api.routes.ws import router as ws_router
-from api.recovery import recover_stale_jobs
-import threading
+from api.recovery import recover_stale_jobs, migrate_legacy_queue
+import asyncio
+from api.metrics import sync_cached_job_counts
 
 app = FastAPI()
 
@@ -18,10 +20,18 @@ app.include_router(ws_router)
 
 @app.on_event("startup")
 def startup_event():
+    migrate_legacy_queue()
     recover_stale_jobs()
+    sync_cached_job_counts()
     
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.listener_task.cancel()
+    await async_engine.dispose()
+    await async_redis_pool.disconnect()
+
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
 @app.get("/db-check")
@@ -33,10 +43,6 @@ def db_check():
         return {"database": "error", "detail": str(e)}
 
 @app.on_event("startup")
-def startup_event():
-    thread = threading.Thread(
-        target=start_redis_listener,
-        args=(manager,),
-        daemon=True
-    )
-    thread.start()
\ No newline at end of file
+async def start_listener():
+    # Runs on the server's event loop, next to the WebSockets it feeds
+    app.state.listener_task = asyncio.create_task(start_redis_listener(manager))
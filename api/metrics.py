@@ -1,46 +1,84 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, extract, select
 from common.models import Job
-from api.db.redis_client import redis_client, QUEUE_NAME
+from common.telemetry import (
+    JOB_STATUSES,
+    read_counters_async,
+    render_prometheus_async,
+    reset_job_counts
+)
+from api.db.database import SessionLocal
+from api.db.redis_client import redis_client, async_redis_client
+from common.queue import QUEUE_DEPTH
+from api.auth import token_cache
+from api.job_cache import job_cache
 from datetime import datetime, timedelta
 
-def get_queue_length():
-    return redis_client.llen(QUEUE_NAME)
+async def get_queue_length():
+    return int(await async_redis_client.get(QUEUE_DEPTH) or 0)
 
-def get_job_counts(db: Session):
-    return {
-        "queued": db.query(Job).filter(Job.status == "QUEUED").count(),
-        "running": db.query(Job).filter(Job.status == "RUNNING").count(),
-        "retrying": db.query(Job).filter(Job.status == "RETRYING").count(),
-        "completed": db.query(Job).filter(Job.status == "COMPLETED").count(),
-        "failed": db.query(Job).filter(Job.status == "FAILED").count(),
-    }
+async def get_job_counts(db: AsyncSession):
+    rows = await db.execute(select(Job.status, func.count()).group_by(Job.status))
+    counts = dict(rows.all())
+    return {status.lower(): counts.get(status, 0) for status in JOB_STATUSES}
 
-def get_avg_latency(db: Session):
-    jobs = db.query(Job).filter(
-        Job.finished_at.isnot(None),
-        Job.started_at.isnot(None)
-    ).all()
+async def get_avg_latency(db: AsyncSession):
+    avg = await db.scalar(
+        select(func.avg(extract("epoch", Job.finished_at - Job.started_at)))
+        .where(
+            Job.finished_at.isnot(None),
+            Job.started_at.isnot(None)
+        )
+    )
 
-    if not jobs:
+    if avg is None:
         return 0
 
-    latencies = [
-        (job.finished_at - job.started_at).total_seconds()
-        for job in jobs
-    ]
+    return round(float(avg), 2)
 
-    return round(sum(latencies) / len(latencies), 2)
-
-def get_throughput(db: Session, window_minutes: int = 1):
+async def get_throughput(db: AsyncSession, window_minutes: int = 1):
     window_start = datetime.utcnow() - timedelta(minutes=window_minutes)
 
-    completed_count = db.query(Job).filter(
-        Job.status == "COMPLETED",
-        Job.finished_at >= window_start
-    ).count()
+    completed_count = await db.scalar(
+        select(func.count()).select_from(Job).where(
+            Job.status == "COMPLETED",
+            Job.finished_at >= window_start
+        )
+    )
 
     return {
         "jobs_per_minute": completed_count,
         "window_minutes": window_minutes
-    }
\ No newline at end of file
+    }
+
+def sync_cached_job_counts():
+    """
+    Re-seeds the Redis status counters from PostgreSQL.
+    Run at API startup so the counters start from the true totals.
+    """
+    db = SessionLocal()
+    try:
+        counts = dict(db.query(Job.status, func.count()).group_by(Job.status).all())
+    finally:
+        db.close()
+    reset_job_counts(redis_client, counts)
+
+async def get_cached_metrics(window_minutes: int = 1):
+    """
+    Metrics served from the Redis counters kept up to date
+    by the API and the workers (no PostgreSQL access).
+    """
+    return await read_counters_async(async_redis_client, window_minutes)
+
+async def get_prometheus_metrics():
+    return await render_prometheus_async(
+        async_redis_client,
+        extra_gauges={"queue_length": ("Jobs waiting in the queue", await get_queue_length())},
+        # Per API process, so the caches' effect can be checked per node
+        extra_counters={
+            "auth_token_cache_hits_total": ("Verified-token cache hits in this API process", token_cache.hits),
+            "auth_token_cache_misses_total": ("Verified-token cache misses in this API process", token_cache.misses),
+            "job_snapshot_cache_hits_total": ("In-process job snapshot cache hits in this API process", job_cache.hits),
+            "job_snapshot_cache_misses_total": ("In-process job snapshot cache misses in this API process", job_cache.misses),
+        }
+    )
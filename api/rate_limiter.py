@@ -1,17 +1,209 @@
+import math
 import time
-from fastapi import HTTPException
-from api.db.redis_client import redis_client
-from api.config import RATE_LIMIT, WINDOW_SECONDS
-
-def check_rate_limit(user_id: str):
-    key = f"rate_limit:{user_id}"
-    current = redis_client.incr(key)
-
-    if current == 1:
-        redis_client.expire(key, WINDOW_SECONDS)
-
-    if current > RATE_LIMIT:
-        raise HTTPException(
-            status_code=429,
-            detail="Too many job submissions. Please retry later."
-        )
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import HTTPException, Response
+from api.db.redis_client import async_redis_client
+from api.config import (
+    RATE_LIMIT,
+    BULK_RATE_LIMIT,
+    WINDOW_SECONDS,
+    JOB_TYPE_RATE_LIMITS,
+    RATE_LIMIT_LOCAL_PRECHECK
+)
+
+# =========================
+# TOKEN BUCKET RATE LIMITER
+# =========================
+# Each limit is a token bucket holding up to `limit` tokens and
+# refilled at limit / WINDOW_SECONDS tokens per second, so a client
+# can burst up to `limit` jobs but never exceed the rate over time.
+#
+# A submission is charged against its user's bucket (RATE_LIMIT, or
+# BULK_RATE_LIMIT for batches and workflows) and against a
+# per-(user, job_type) bucket for job types listed in
+# JOB_TYPE_RATE_LIMITS. All buckets are checked and charged by one
+# Lua script (single EVALSHA, all-or-nothing, clocked by Redis TIME).
+# A submission larger than a bucket's capacity could never succeed
+# and is rejected with 413 instead of 429.
+#
+# Keys: rate_limit:{<user_id>}, rate_limit:bulk:{<user_id>} and
+# rate_limit:{<user_id>}:<job_type>, in one Redis Cluster slot per user.
+
+BUCKET_PREFIX = "rate_limit:"
+
+# KEYS: bucket hashes (tokens, ts)
+# ARGV: triples of capacity, refill per ms, cost (one per key)
+# Returns {allowed, retry_after_ms, then per key: remaining, reset_ms, one_token_ms}
+# remaining: whole tokens left in the bucket
+# reset_ms: time until the bucket is full again
+# one_token_ms: time until the bucket holds a token
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local tokens, allowed, retry_after = {}, 1, 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local cost = tonumber(ARGV[i * 3])
+
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    level = math.min(capacity, level + math.max(now - ts, 0) * rate)
+    tokens[i] = level
+
+    if level < cost then
+        allowed = 0
+        retry_after = math.max(retry_after, math.ceil((cost - level) / rate))
+    end
+end
+
+local result = {allowed, retry_after}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local level = tokens[i]
+    if allowed == 1 then
+        level = level - tonumber(ARGV[i * 3])
+        redis.call('HSET', key, 'tokens', tostring(level), 'ts', now)
+        -- An idle bucket is full again after capacity / rate
+        redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+    end
+    local one_token = 0
+    if level < 1 then
+        one_token = math.ceil((1 - level) / rate)
+    end
+    table.insert(result, math.floor(level))
+    table.insert(result, math.ceil((capacity - level) / rate))
+    table.insert(result, one_token)
+end
+
+return result
+"""
+
+_script = None
+
+# Local pre-check: bucket key → (monotonic time before which the bucket,
+# last seen empty, cannot hold a single token; monotonic time at which
+# it is full again). Requests hitting such a bucket are rejected
+# without a Redis round trip.
+LOCAL_BLOCKS_SIZE = 10000
+_local_blocks: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+@dataclass
+class RateLimitStatus:
+    limit: int
+    remaining: int
+    reset_seconds: float
+
+    def headers(self) -> dict:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_seconds)),
+        }
+
+    def apply(self, response: Response):
+        response.headers.update(self.headers())
+
+
+def _buckets(user_id: str, job_type_costs: dict, bulk: bool = False) -> list:
+    """
+    (key, capacity, cost) for the user bucket (first; the bulk one for
+    bulk submissions) and every limited job type of the submission.
+    """
+    total = sum(job_type_costs.values())
+    user_key = f"{BUCKET_PREFIX}{{{user_id}}}"
+    if bulk:
+        buckets = [(f"{BUCKET_PREFIX}bulk:{{{user_id}}}", BULK_RATE_LIMIT, total)]
+    else:
+        buckets = [(user_key, RATE_LIMIT, total)]
+    for job_type, cost in job_type_costs.items():
+        if job_type in JOB_TYPE_RATE_LIMITS:
+            buckets.append((
+                f"{user_key}:{job_type}",
+                JOB_TYPE_RATE_LIMITS[job_type],
+                cost
+            ))
+    return buckets
+
+
+def _too_many(retry_after: float, status: RateLimitStatus = None):
+    headers = {"Retry-After": str(max(math.ceil(retry_after), 1))}
+    if status is not None:
+        headers.update(status.headers())
+    raise HTTPException(
+        status_code=429,
+        detail="Too many job submissions. Please retry later.",
+        headers=headers
+    )
+
+
+async def check_rate_limit(user_id: str, job_type_costs: dict, bulk: bool = False) -> RateLimitStatus:
+    """
+    Charges a submission of {job_type: number of jobs} against the
+    caller's buckets in one EVALSHA. A batch is charged as a whole,
+    against the BULK_RATE_LIMIT bucket when bulk is set.
+
+    Returns the status of the bucket with the fewest tokens left (the
+    user bucket on ties) for the X-RateLimit-* headers, or raises 429
+    with Retry-After and those headers. Raises 413 when the submission
+    exceeds a bucket's capacity (retrying would not help).
+    """
+    global _script
+
+    buckets = _buckets(user_id, job_type_costs, bulk)
+
+    for key, capacity, cost in buckets:
+        if cost > capacity:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Submission of {cost} jobs exceeds the rate limit capacity of {capacity} jobs "
+                       f"per {WINDOW_SECONDS} seconds"
+            )
+
+    if RATE_LIMIT_LOCAL_PRECHECK:
+        now = time.monotonic()
+        blocked = [
+            (_local_blocks[key], capacity)
+            for key, capacity, _ in buckets if key in _local_blocks
+        ]
+        if blocked:
+            (blocked_until, full_at), capacity = max(blocked)
+            if blocked_until > now:
+                _too_many(blocked_until - now, RateLimitStatus(capacity, 0, full_at - now))
+
+    if _script is None:
+        _script = async_redis_client.register_script(_TOKEN_BUCKET_LUA)
+
+    args = []
+    for _, capacity, cost in buckets:
+        args.extend([capacity, capacity / (WINDOW_SECONDS * 1000), cost])
+    allowed, retry_after_ms, *states = await _script(
+        keys=[key for key, _, _ in buckets],
+        args=args
+    )
+    # (remaining, reset_ms, one_token_ms) per bucket
+    states = [states[i:i + 3] for i in range(0, len(states), 3)]
+
+    # All headers describe the same bucket: the one closest to empty
+    binding = min(range(len(buckets)), key=lambda i: states[i][0])
+    remaining, reset_ms, _ = states[binding]
+    status = RateLimitStatus(buckets[binding][1], remaining, reset_ms / 1000)
+    if allowed:
+        return status
+
+    if RATE_LIMIT_LOCAL_PRECHECK:
+        # Only buckets that are empty even for a single job
+        now = time.monotonic()
+        for (key, _, _), (_, full_ms, wait_ms) in zip(buckets, states):
+            if wait_ms > 0:
+                _local_blocks[key] = (now + wait_ms / 1000, now + full_ms / 1000)
+                _local_blocks.move_to_end(key)
+        while len(_local_blocks) > LOCAL_BLOCKS_SIZE:
+            _local_blocks.popitem(last=False)
+
+    _too_many(retry_after_ms / 1000, status)
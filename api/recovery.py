@@ -1,23 +1,76 @@
 from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from api.config import QUEUE_NAME
 from api.db.database import SessionLocal
 from common.models import Job
-from api.db.redis_client import redis_client, QUEUE_NAME
+from common.logger import logger
+from api.db.redis_client import redis_client
+from common.queue import enqueue
+from common.telemetry import record_transition
+from common.snapshot import delete_snapshots
 
 STALE_THRESHOLD_MINUTES = 5
 
+# Only one API process migrates the legacy queue at a time (seconds)
+MIGRATION_LOCK_TTL = 60
+
 def recover_stale_jobs():
-    db = SessionLocal()
+    """
+    Requeues jobs RUNNING for more than STALE_THRESHOLD_MINUTES with one
+    conditional UPDATE, so only rows it actually moved are counted and
+    enqueued (a worker finishing one meanwhile keeps its outcome).
+    """
     cutoff = datetime.utcnow() - timedelta(minutes=STALE_THRESHOLD_MINUTES)
 
-    stale_jobs = db.query(Job).filter(
-        Job.status == "RUNNING",
-        Job.started_at < cutoff
-    ).all()
+    with SessionLocal() as db:
+        stale_jobs = db.execute(
+            update(Job)
+            .where(Job.status == "RUNNING", Job.started_at < cutoff)
+            .values(status="QUEUED", worker_id=None)
+            .returning(Job.id, Job.job_type, Job.priority, Job.user_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
 
     for job in stale_jobs:
-        job.status = "QUEUED"
-        job.worker_id = None
-        db.commit()
-        redis_client.rpush(QUEUE_NAME, job.id)
+        enqueue(redis_client, job.job_type, job.priority, job.user_id, [job.id])
+
+    if stale_jobs:
+        record_transition(redis_client, "RUNNING", "QUEUED", count=len(stale_jobs))
+        delete_snapshots(redis_client, [job.id for job in stale_jobs])
+
+
+def migrate_legacy_queue():
+    """
+    One-shot migration of the single `job_queue` list used before the
+    fair queue (see common.queue): its job IDs are moved, in order,
+    into their flows. Runs at API startup; a no-op once the list is gone.
+    """
+    lock = f"{QUEUE_NAME}:migration_lock"
+    if not redis_client.set(lock, "1", nx=True, ex=MIGRATION_LOCK_TTL):
+        return
+
+    try:
+        job_ids = redis_client.lrange(QUEUE_NAME, 0, -1)
+        if not job_ids:
+            return
+
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Job.id, Job.job_type, Job.priority, Job.user_id)
+                .where(Job.id.in_(job_ids), Job.status.in_(("QUEUED", "RETRYING")))
+            ).all()
+
+        # One enqueue per flow, keeping the list's order
+        position = {job_id: index for index, job_id in enumerate(job_ids)}
+        flows = {}
+        for row in sorted(rows, key=lambda row: position[row.id]):
+            flows.setdefault((row.job_type, row.priority, row.user_id), []).append(row.id)
+        for (job_type, priority, user_id), flow_job_ids in flows.items():
+            enqueue(redis_client, job_type, priority, user_id, flow_job_ids)
 
-    db.close()
+        # Only drop what was read (old-style producers may still push)
+        redis_client.ltrim(QUEUE_NAME, len(job_ids), -1)
+        logger.info(f"[MIGRATION] Moved {len(rows)} of {len(job_ids)} jobs from {QUEUE_NAME} to the fair queue")
+    finally:
+        redis_client.delete(lock)
@@ -1,21 +1,65 @@
 import json
-import threading
-import redis
+import asyncio
+from redis.exceptions import ConnectionError as RedisConnectionError
+from api.db.redis_client import async_redis_client
 from api.websocket_manager import WebSocketManager
+from api.job_cache import job_cache
+from common.logger import logger
 
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
+# Delay before resubscribing after the Redis connection drops (seconds)
+RECONNECT_DELAY = 1
 
-def start_redis_listener(manager: WebSocketManager):
-    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-    pubsub = client.pubsub()
-    pubsub.subscribe("job_updates")
+# Longest a subscription change waits while the channels are idle (seconds)
+POLL_INTERVAL = 0.1
 
-    for message in pubsub.listen():
-        if message["type"] == "message":
-            data = json.loads(message["data"])
-            job_id = data["job_id"]
+async def start_redis_listener(manager: WebSocketManager):
+    """
+    Runs on the API event loop as a background task.
 
-            # Push to all WebSocket clients subscribed to this job
-            import asyncio
-            asyncio.run(manager.send_update(job_id, data))
+    - Subscribes only to the shard channels needed by the WebSockets
+      connected to this node, following manager.channels_changed
+    - Forwards every job update to the WebSocket manager,
+      which fans it out without blocking
+    - Invalidates the job's cached status snapshot (jobs on other
+      shards rely on the cache TTL, JOB_CACHE_TTL_SECONDS)
+    """
+    while True:
+        pubsub = async_redis_client.pubsub()
+        subscribed = set()
+        try:
+            while True:
+                if manager.channels_changed.is_set() or not subscribed:
+                    manager.channels_changed.clear()
+                    wanted = manager.wanted_channels()
+                    if wanted - subscribed:
+                        await pubsub.subscribe(*(wanted - subscribed))
+                    if subscribed - wanted:
+                        await pubsub.unsubscribe(*(subscribed - wanted))
+                    subscribed = wanted
+
+                if not subscribed:
+                    await manager.channels_changed.wait()
+                    continue
+
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=POLL_INTERVAL
+                )
+                if message and message["type"] == "message":
+                    try:
+                        update = json.loads(message["data"])
+                        # The cached status snapshot is now stale
+                        job_cache.invalidate(update["job_id"])
+                    except (ValueError, TypeError, KeyError):
+                        # A malformed message must not stop the listener
+                        logger.warning(f"[LISTENER] Ignoring malformed job update: {message['data']!r}")
+                        continue
+                    # Push to all WebSocket clients subscribed to this job
+                    manager.send_update(update)
+
+        except RedisConnectionError:
+            logger.warning("[LISTENER] Redis connection lost. Resubscribing...")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+        finally:
+            await pubsub.aclose()
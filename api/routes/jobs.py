@@ -1,75 +1,644 @@
-from fastapi import APIRouter, Depends, HTTPException
-from api.schemas.job import JobCreate, JobStatusResponse
-from api.db.database import SessionLocal
-from api.db.redis_client import redis_client, QUEUE_NAME
-from common.models import Job
+import time
+import json
+import uuid
+import asyncio
+import base64
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, FileResponse
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.schemas.job import JobCreate, JobStatusResponse, JobSummary, JobListResponse, WorkflowCreate
+from api.db.database import get_db
+from api.db.redis_client import async_redis_client
+from common.models import Job, JobHistory
 from api.dependencies import get_current_user
 from api.rate_limiter import check_rate_limit
 from fastapi import Header
-from api.idempotency import check_idempotency, save_idempotency
+from api.idempotency import (
+    check_idempotency,
+    save_idempotency,
+    check_idempotency_many,
+    save_idempotency_many
+)
+from api.config import MAX_BATCH_SIZE, LIST_PAGE_SIZE, MAX_LIST_PAGE_SIZE
+from api.job_cache import get_job_snapshot, get_job_snapshots, snapshot_etag
 from common.logger import logger
+from common.telemetry import record_transition
+from common.queue import enqueue, schedule
+from common.dag import register_dependents, settle_dependents, queue_pending_jobs, fail_pending_jobs, dependency_error
+from common.memo import (
+    memo_policy, memo_key, group_by_job_type, claim_memo_entries, confirm_memo_entries,
+    decode_memo, forget_memo_entries
+)
+from common.blobstore import offload, is_blob_ref, blob_path, BLOB_REF_KEY
 
 router = APIRouter()
 
+
+def _db_time(timestamp: Optional[float]) -> Optional[datetime]:
+    # The jobs table stores naive UTC timestamps
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+async def _enqueue_new_jobs(user_id: str, items: list):
+    """
+    Queues new jobs, given as (job_id, job_type, priority, run_at) tuples:
+    one scheduler call per (job_type, priority) flow, and delayed jobs
+    to the scheduled set in one pipeline.
+    """
+    now = time.time()
+    flows = {}
+    delayed = []
+    for job_id, job_type, priority, run_at in items:
+        if run_at is not None and run_at > now:
+            delayed.append((job_id, job_type, priority, user_id, run_at))
+        else:
+            flows.setdefault((job_type, priority), []).append(job_id)
+    if delayed:
+        await schedule(async_redis_client, delayed)
+    for (job_type, priority), job_ids in flows.items():
+        await enqueue(async_redis_client, job_type, priority, user_id, job_ids)
+
+
+async def _memo_calls(func, entries: list) -> list:
+    """
+    Runs a common.memo entry function once per job type (one Cluster
+    slot each) in a single pipelined round trip.
+    Returns (entries of the job type, script result) pairs.
+    """
+    groups = group_by_job_type(entries)
+    pipe = async_redis_client.pipeline(transaction=False)
+    for job_type, group in groups.items():
+        # Script calls on an asyncio pipeline are awaited to queue them
+        await func(pipe, job_type, group)
+    return list(zip(groups.values(), await pipe.execute()))
+
+
+async def _claim_memoized(user_id: str, items: list):
+    """
+    Result memoization (see common.memo) for new jobs, given as
+    (job_id, JobCreate) pairs that would be queued right away.
+    Looks up / claims the memo entries of memoized job types with one
+    script call per job type, in one round trip.
+
+    Returns (hits, claimed): hits maps the job_id of each item that is
+    answered by an existing job to that job's {"job_id", "status"};
+    claimed lists the entries taken by the other items (to be confirmed
+    with confirm_memo_entries once their jobs are committed, or dropped
+    with forget_memo_entries if they are not created).
+    """
+    entries = [
+        (memo_key(user_id, job.job_type, job.payload), job_id, job.job_type)
+        for job_id, job in items if memo_policy(job.job_type)
+    ]
+    if not entries:
+        return {}, []
+
+    hits = {}
+    claimed = []
+    for group, raws in await _memo_calls(claim_memo_entries, entries):
+        for entry, raw in zip(group, raws):
+            existing = decode_memo(raw)
+            if existing is None:
+                claimed.append(entry)
+            else:
+                hits[entry[1]] = existing
+
+    # Coalesced onto a job still in flight: report its current status
+    in_flight = [hit["job_id"] for hit in hits.values() if hit["status"] != "COMPLETED"]
+    if in_flight:
+        snapshots = await get_job_snapshots(in_flight)
+        for hit in hits.values():
+            if hit["job_id"] in snapshots:
+                hit["status"] = snapshots[hit["job_id"]]["status"]
+
+    return hits, claimed
+
+
+async def _create_dependent_jobs(
+    db: AsyncSession,
+    user_id: str,
+    jobs: List[JobCreate],
+    job_ids: List[str],
+    parents: List[List[str]]
+    ) -> dict:
+    """
+    Creates jobs that wait for other jobs (see common.dag) and returns
+    {job_id: status}.
+
+    jobs[i] gets the ID job_ids[i] and waits for the IDs in parents[i]:
+    existing jobs of the caller, or jobs earlier in the list.
+
+    - Reads the existing parents' statuses with one primary-key query
+      (and one on the archive for parents not found)
+    - Jobs whose parents all COMPLETED are queued right away, jobs with
+      a FAILED parent are created FAILED, the others PENDING
+    - Registers every PENDING job with one script call
+    """
+    status_of = {}
+    existing_ids = {parent for parent_ids in parents for parent in parent_ids} - set(job_ids)
+    if existing_ids:
+        rows = (await db.execute(
+            select(Job.id, Job.status).where(Job.id.in_(existing_ids), Job.user_id == user_id)
+        )).all()
+        status_of = {row.id: row.status for row in rows}
+        missing = existing_ids - set(status_of)
+        if missing:
+            # Parents moved to the archive (all COMPLETED / FAILED)
+            rows = (await db.execute(
+                select(JobHistory.id, JobHistory.status)
+                .where(JobHistory.id.in_(missing), JobHistory.user_id == user_id)
+            )).all()
+            status_of.update({row.id: row.status for row in rows})
+            missing -= {row.id for row in rows}
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown parent jobs: {', '.join(sorted(missing))}")
+
+    errors = {}
+    for job_id, parent_ids in zip(job_ids, parents):
+        failed_parent = next((parent for parent in parent_ids if status_of[parent] == "FAILED"), None)
+        if failed_parent:
+            status_of[job_id] = "FAILED"
+            errors[job_id] = dependency_error(failed_parent)
+        elif all(status_of[parent] == "COMPLETED" for parent in parent_ids):
+            status_of[job_id] = "QUEUED"
+        else:
+            status_of[job_id] = "PENDING"
+
+    run_at = [job.scheduled_at() for job in jobs]
+    payloads = await asyncio.to_thread(lambda: [offload(job.payload) for job in jobs])
+    now = _db_time(time.time())
+    await db.execute(insert(Job), [
+        {
+            "id": job_id,
+            "job_type": job.job_type,
+            "payload": payload,
+            "user_id": user_id,
+            "status": status_of[job_id],
+            "max_retries": job.max_retries,
+            "timeout_seconds": job.timeout_seconds,
+            "priority": job.priority,
+            "run_at": _db_time(job_run_at),
+            "last_error": errors.get(job_id),
+            "finished_at": now if job_id in errors else None
+        }
+        for job, job_id, payload, job_run_at in zip(jobs, job_ids, payloads, run_at)
+    ])
+    await db.commit()
+    for status, count in Counter(status_of[job_id] for job_id in job_ids).items():
+        await record_transition(async_redis_client, None, status, count=count)
+
+    await _enqueue_new_jobs(user_id, [
+        (job_id, job.job_type, job.priority, job_run_at)
+        for job, job_id, job_run_at in zip(jobs, job_ids, run_at)
+        if status_of[job_id] == "QUEUED"
+    ])
+
+    pending = [
+        (
+            job_id,
+            [parent for parent in parent_ids if status_of[parent] != "COMPLETED"],
+            job.job_type, job.priority, user_id, job_run_at
+        )
+        for job, job_id, parent_ids, job_run_at in zip(jobs, job_ids, parents, run_at)
+        if status_of[job_id] == "PENDING"
+    ]
+    if pending:
+        # Parents may have finished since they were read
+        ready, failed, failed_parents = await register_dependents(async_redis_client, pending)
+        if ready:
+            queued = (await db.execute(queue_pending_jobs(ready))).all()
+            await db.commit()
+            for row in queued:
+                status_of[row.id] = "QUEUED"
+            await record_transition(async_redis_client, "PENDING", "QUEUED", count=len(queued))
+        if failed:
+            by_parent = defaultdict(list)
+            for job_id, parent in zip(failed, failed_parents):
+                by_parent[parent].append(job_id)
+            count = 0
+            for parent, child_ids in by_parent.items():
+                for row in (await db.execute(fail_pending_jobs(child_ids, dependency_error(parent), now))).all():
+                    status_of[row.id] = "FAILED"
+                    count += 1
+            await db.commit()
+            await record_transition(async_redis_client, "PENDING", "FAILED", count=count)
+        if ready or failed:
+            # Rows committed (otherwise the timeout monitor settles them)
+            await settle_dependents(async_redis_client, [*ready, *failed])
+
+    return {job_id: status_of[job_id] for job_id in job_ids}
+
+
 @router.post("/jobs")
-def create_job(
+async def create_job(
     job: JobCreate, 
+    response: Response,
     user_id: str = Depends(get_current_user),
-    idempotency_key: str = Header(None)):
+    idempotency_key: str = Header(None),
+    db: AsyncSession = Depends(get_db)):
     
-    db = SessionLocal()
-    check_rate_limit(user_id)  # 🔒 PROTECTION HERE
+    rate_limit = await check_rate_limit(user_id, {job.job_type: 1})  # 🔒 PROTECTION HERE
+    rate_limit.apply(response)
 
     if idempotency_key:
-        existing_job_id = check_idempotency(idempotency_key)
+        existing_job_id = await check_idempotency(idempotency_key)
         if existing_job_id:
             return {"job_id": existing_job_id, "status": "COMPLETED"}
 
+    if job.depends_on:
+        job_id = str(uuid.uuid4())
+        statuses = await _create_dependent_jobs(db, user_id, [job], [job_id], [job.depends_on])
+        if idempotency_key:
+            await save_idempotency(idempotency_key, job_id)
+        return {"job_id": job_id, "status": statuses[job_id]}
+
+    job_id = str(uuid.uuid4())
+    run_at = job.scheduled_at()
+
+    claimed = []
+    if run_at is None:
+        # Identical job already done or running: return it, queue nothing
+        hits, claimed = await _claim_memoized(user_id, [(job_id, job)])
+        if job_id in hits:
+            if idempotency_key:
+                await save_idempotency(idempotency_key, hits[job_id]["job_id"])
+            return hits[job_id]
+
+    # Large payloads go to the blob store (file I/O off the event loop)
+    payload = await asyncio.to_thread(offload, job.payload)
+
     new_job = Job(
+        id=job_id,
         job_type=job.job_type,
-        payload=job.payload,
+        payload=payload,
         user_id=user_id,
         status="QUEUED",
         max_retries=job.max_retries,
-        timeout_seconds=job.timeout_seconds
+        timeout_seconds=job.timeout_seconds,
+        priority=job.priority,
+        run_at=_db_time(run_at)
     )
 
     db.add(new_job)
-    db.commit()
-    db.refresh(new_job)
+    try:
+        await db.commit()
+    except Exception:
+        if claimed:
+            await _memo_calls(forget_memo_entries, claimed)
+        raise
+    if claimed:
+        await _memo_calls(confirm_memo_entries, claimed)
+    await record_transition(async_redis_client, None, "QUEUED")
     if idempotency_key:
-        save_idempotency(idempotency_key, new_job.id)
-    redis_client.rpush(QUEUE_NAME, new_job.id)
+        await save_idempotency(idempotency_key, new_job.id)
+    if run_at is not None and run_at > time.time():
+        # Parked in the scheduled set until it is due
+        await schedule(async_redis_client, [(new_job.id, job.job_type, job.priority, user_id, run_at)])
+    else:
+        await enqueue(async_redis_client, job.job_type, job.priority, user_id, [new_job.id])
     
     return {
         "job_id": new_job.id,
         "status": new_job.status
     }
 
+@router.post("/jobs/batch")
+async def create_jobs_batch(
+    jobs: List[JobCreate],
+    response: Response,
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)):
+    """
+    Submits many jobs in one request.
+
+    - Charges the rate limiter once for the whole batch, against the
+      BULK_RATE_LIMIT bucket
+    - Resolves per-item idempotency keys with one MGET
+    - Answers memoized jobs from identical earlier jobs with one
+      script call (see common.memo)
+    - Inserts all new rows with one bulk INSERT
+    - Enqueues new job IDs with one scheduler call per flow;
+      delayed jobs go to the scheduled set in one pipeline
+    """
+    if not jobs:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(jobs) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the maximum of {MAX_BATCH_SIZE} jobs"
+        )
+    if any(job.depends_on for job in jobs):
+        raise HTTPException(status_code=400, detail="Submit jobs with dependencies with POST /workflows")
+
+    rate_limit = await check_rate_limit(user_id, Counter(job.job_type for job in jobs), bulk=True)
+    rate_limit.apply(response)
+
+    keys = list({job.idempotency_key for job in jobs if job.idempotency_key})
+    existing = await check_idempotency_many(keys)
+
+    # Index of the batch item that creates each row; duplicate keys
+    # inside the same batch resolve to the first occurrence
+    results = [None] * len(jobs)
+    new_items = []
+    first_by_key = {}
+    for index, job in enumerate(jobs):
+        key = job.idempotency_key
+        if key and key in existing:
+            results[index] = {"job_id": existing[key], "status": "COMPLETED"}
+        elif key and key in first_by_key:
+            continue
+        else:
+            if key:
+                first_by_key[key] = index
+            new_items.append(index)
+
+    new_ids = []
+    if new_items:
+        run_at = {index: jobs[index].scheduled_at() for index in new_items}
+        ids = {index: str(uuid.uuid4()) for index in new_items}
+
+        # Memoized jobs answered by an identical existing job
+        hits, claimed = await _claim_memoized(user_id, [
+            (ids[index], jobs[index]) for index in new_items if run_at[index] is None
+        ])
+        for index in new_items:
+            if ids[index] in hits:
+                results[index] = hits[ids[index]]
+        new_items = [index for index in new_items if ids[index] not in hits]
+
+    if new_items:
+        payloads = await asyncio.to_thread(
+            lambda: {index: offload(jobs[index].payload) for index in new_items}
+        )
+        rows = [
+            {
+                "id": ids[index],
+                "job_type": jobs[index].job_type,
+                "payload": payloads[index],
+                "user_id": user_id,
+                "status": "QUEUED",
+                "max_retries": jobs[index].max_retries,
+                "timeout_seconds": jobs[index].timeout_seconds,
+                "priority": jobs[index].priority,
+                "run_at": _db_time(run_at[index])
+            }
+            for index in new_items
+        ]
+
+        try:
+            await db.execute(insert(Job), rows)
+            await db.commit()
+        except Exception:
+            if claimed:
+                await _memo_calls(forget_memo_entries, claimed)
+            raise
+        if claimed:
+            await _memo_calls(confirm_memo_entries, claimed)
+        new_ids = [ids[index] for index in new_items]
+
+        for index, job_id in zip(new_items, new_ids):
+            results[index] = {"job_id": job_id, "status": "QUEUED"}
+
+    if first_by_key:
+        await save_idempotency_many({
+            key: results[index]["job_id"] for key, index in first_by_key.items()
+        })
+
+    if new_items:
+        await _enqueue_new_jobs(user_id, [
+            (job_id, jobs[index].job_type, jobs[index].priority, run_at[index])
+            for index, job_id in zip(new_items, new_ids)
+        ])
+        await record_transition(async_redis_client, None, "QUEUED", count=len(new_ids))
+
+    for index, job in enumerate(jobs):
+        if results[index] is None:
+            results[index] = dict(results[first_by_key[job.idempotency_key]])
+
+    logger.info(f"[API] Batch of {len(jobs)} accepted, {len(new_ids)} new jobs queued")
+
+    return {"jobs": results}
+
+@router.post("/workflows")
+async def create_workflow(
+    workflow: WorkflowCreate,
+    response: Response,
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)):
+    """
+    Submits a DAG of jobs in one request.
+
+    - Each job has a key; its depends_on lists keys of the workflow's
+      jobs or IDs of existing jobs
+    - Jobs start as soon as their last parent completes (no polling);
+      a failed job fails every job downstream of it
+    - Per-item idempotency keys are not supported
+    - Charged as a whole against the BULK_RATE_LIMIT bucket
+
+    Returns {key: {"job_id", "status"}}.
+    """
+    jobs = workflow.jobs
+    if not jobs:
+        raise HTTPException(status_code=400, detail="Workflow is empty")
+    if len(jobs) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Workflow exceeds the maximum of {MAX_BATCH_SIZE} jobs"
+        )
+    by_key = {job.key: job for job in jobs}
+    if len(by_key) != len(jobs):
+        raise HTTPException(status_code=400, detail="Duplicate job keys")
+
+    # Kahn's algorithm: parents before children, and no cycles
+    waiting = {job.key: {ref for ref in job.depends_on if ref in by_key} for job in jobs}
+    children = defaultdict(list)
+    for key, parent_keys in waiting.items():
+        for parent in parent_keys:
+            children[parent].append(key)
+    ready = [job.key for job in jobs if not waiting[job.key]]
+    order = []
+    while ready:
+        key = ready.pop()
+        order.append(key)
+        for child in children[key]:
+            waiting[child].discard(key)
+            if not waiting[child]:
+                ready.append(child)
+    if len(order) != len(jobs):
+        raise HTTPException(status_code=400, detail="Workflow dependencies contain a cycle")
+
+    rate_limit = await check_rate_limit(user_id, Counter(job.job_type for job in jobs), bulk=True)
+    rate_limit.apply(response)
+
+    ids = {key: str(uuid.uuid4()) for key in order}
+    ordered = [by_key[key] for key in order]
+    statuses = await _create_dependent_jobs(
+        db, user_id, ordered,
+        [ids[key] for key in order],
+        [[ids.get(ref, ref) for ref in job.depends_on] for job in ordered]
+    )
+
+    logger.info(f"[API] Workflow of {len(jobs)} jobs accepted")
+
+    return {"jobs": {
+        job.key: {"job_id": ids[job.key], "status": statuses[ids[job.key]]}
+        for job in jobs
+    }}
+
+# Columns of a listing row; payload and result only on request
+SUMMARY_COLUMNS = (
+    Job.id, Job.job_type, Job.status, Job.priority, Job.attempts, Job.created_at,
+    Job.started_at, Job.finished_at, Job.run_at, Job.last_error
+)
+LIST_INCLUDES = {"payload": Job.payload, "result": Job.result}
+
+
+def _result_url(job_id: str) -> str:
+    return f"/jobs/{job_id}/result"
+
+
+def _utc_naive(value: datetime) -> datetime:
+    # Naive query parameters are taken as UTC, like the stored timestamps
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _encode_cursor(created_at: datetime, job_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), job_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), job_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/jobs", response_model=JobListResponse, response_model_exclude_unset=True)
+async def list_jobs(
+    status: Optional[List[str]] = Query(None),
+    job_type: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include: List[str] = Query([]),
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
+    """
+    Lists the caller's jobs, newest first.
+
+    - Filters: status (repeatable), job_type, created_after / created_before
+    - Keyset pagination on (created_at, id): each page is one index
+      range scan (ix_jobs_user_created_id / ix_jobs_user_status_created),
+      however deep the client pages
+    - payload / result are only returned with ?include=payload / ?include=result
+
+    Archived jobs (jobs_history) are not listed.
+    """
+    unknown = set(include) - set(LIST_INCLUDES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+
+    query = (
+        select(*SUMMARY_COLUMNS, *(LIST_INCLUDES[name] for name in include))
+        .where(Job.user_id == user_id)
+        .order_by(Job.created_at.desc(), Job.id.desc())
+        .limit(limit + 1)
+    )
+    if status:
+        query = query.where(Job.status.in_(status))
+    if job_type:
+        query = query.where(Job.job_type == job_type)
+    if created_after:
+        query = query.where(Job.created_at >= _utc_naive(created_after))
+    if created_before:
+        query = query.where(Job.created_at < _utc_naive(created_before))
+    if cursor:
+        query = query.where(tuple_(Job.created_at, Job.id) < _decode_cursor(cursor))
+
+    rows = (await db.execute(query)).all()
+
+    # The extra row only tells whether another page exists
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_cursor(page[-1].created_at, page[-1].id)
+
+    jobs = []
+    for row in page:
+        fields = row._asdict()
+        fields["job_id"] = fields.pop("id")
+        if is_blob_ref(fields.get("result")):
+            fields["result"] = None
+            fields["result_url"] = _result_url(fields["job_id"])
+        jobs.append(JobSummary(**fields))
+
+    return JobListResponse(jobs=jobs, next_cursor=next_cursor)
+
+
 @router.get("/jobs/{job_id}", response_model=JobStatusResponse)
-def get_job_status(
-    job_id: str, 
-    user_id: str = Depends(get_current_user)
+async def get_job_status(
+    job_id: str,
+    user_id: str = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
     ):
-    db = SessionLocal()
+    """
+    Served from the job status snapshot cache (see api.job_cache);
+    PostgreSQL is only read on a miss. Supports ETag / If-None-Match.
+    """
+    snapshot = await get_job_snapshot(job_id)
 
-    job = db.query(Job).filter(Job.id == job_id).first()
-    
-    if job.user_id != user_id:
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if snapshot["user_id"] != user_id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    etag = snapshot_etag(snapshot)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    fields = {k: v for k, v in snapshot.items() if k != "user_id"}
+    if is_blob_ref(fields["result"]):
+        fields["result"] = None
+        fields["result_url"] = _result_url(job_id)
+    body = JobStatusResponse(**fields)
+    return JSONResponse(content=jsonable_encoder(body), headers={"ETag": etag})
 
-    if not job:
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    user_id: str = Depends(get_current_user)
+    ):
+    """
+    Returns a job's result document. Results held in the blob store
+    are streamed from disk in chunks, never loaded into memory whole.
+    """
+    snapshot = await get_job_snapshot(job_id)
+
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    return JobStatusResponse(
-    job_id=job.id,
-    job_type=job.job_type,
-    status=job.status,
-    attempts=job.attempts,
-    created_at=job.created_at,
-    started_at=job.started_at,
-    finished_at=job.finished_at,
-    last_error=job.last_error,
-    result=job.result
-)
+    if snapshot["user_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    result = snapshot["result"]
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not available")
+
+    if is_blob_ref(result):
+        return FileResponse(blob_path(result[BLOB_REF_KEY]), media_type="application/json")
+    return JSONResponse(content=result)
@@ -1,24 +1,44 @@
-from fastapi import APIRouter
-from api.db.database import SessionLocal
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.db.database import get_db
 from api.metrics import (
     get_queue_length,
     get_job_counts,
     get_avg_latency,
-    get_throughput
+    get_throughput,
+    get_cached_metrics,
+    get_prometheus_metrics
 )
 
 router = APIRouter()
 
 @router.get("/metrics")
-def system_metrics():
-    db = SessionLocal()
+async def system_metrics(
+    source: str = "cache",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    source=cache → O(1) answer from the Redis counters (default)
+    source=db    → recomputed from PostgreSQL
 
-    data = {
-        "queue_length": get_queue_length(),
-        "job_counts": get_job_counts(db),
-        "avg_execution_time_seconds": get_avg_latency(db),
-        "throughput": get_throughput(db, window_minutes=1)
+    The session only checks out a connection on the db path.
+    """
+    if source != "db":
+        return {"queue_length": await get_queue_length(), **await get_cached_metrics()}
+
+    return {
+        "queue_length": await get_queue_length(),
+        "job_counts": await get_job_counts(db),
+        "avg_execution_time_seconds": await get_avg_latency(db),
+        "throughput": await get_throughput(db, window_minutes=1)
     }
 
-    db.close()
-    return data
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus text exposition of the cluster-wide histograms
+    and gauges aggregated in Redis by the API and the workers.
+    """
+    body = await get_prometheus_metrics()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
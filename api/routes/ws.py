@@ -1,17 +1,18 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from api.websocket_manager import WebSocketManager
-from jose import jwt, JWTError
-from api.auth import SECRET_KEY, ALGORITHM
-from api.db.database import SessionLocal
-from common.models import Job
+from api.auth import verify_token
+from api.job_cache import get_job_snapshot, get_job_snapshots
 from common.logger import logger
 
 router = APIRouter()
 manager = WebSocketManager()
 
+# Most job IDs accepted in one subscribe/unsubscribe message
+MAX_JOB_IDS_PER_MESSAGE = 1000
+
 @router.websocket("/ws/jobs/{job_id}")
 async def job_updates(websocket: WebSocket, job_id: str):
-    logger.info("🔥 WebSocket connection attempt for job:", job_id)
+    logger.info(f"🔥 WebSocket connection attempt for job: {job_id}")
 
     # 1️⃣ Extract token from query params
     token = websocket.query_params.get("token")
@@ -19,33 +20,118 @@ async def job_updates(websocket: WebSocket, job_id: str):
         await websocket.close(code=1008)
         return
 
-    # 2️⃣ Decode token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-    except JWTError:
+    # 2️⃣ Verify token (cached, see api.auth.TokenCache)
+    user_id = verify_token(token)
+    if not user_id:
         await websocket.close(code=1008)
         return
 
-    # 3️⃣ Load job from DB
-    db = SessionLocal()
-    job = db.query(Job).filter(Job.id == job_id).first()
-    db.close()
+    # 3️⃣ Load the job's status snapshot (cached, see api.job_cache)
+    snapshot = await get_job_snapshot(job_id)
 
-    if not job:
+    if snapshot is None:
         await websocket.close(code=1008)
         return
 
     # 4️⃣ Authorization check (ownership)
-    if job.user_id != user_id:
+    if snapshot["user_id"] != user_id:
         await websocket.close(code=1008)
         return
 
     # 5️⃣ Accept WebSocket
-    await manager.connect(job_id, websocket)
+    conn = await manager.connect(websocket, user_id)
+    manager.subscribe(conn, job_id)
 
     try:
         while True:
             await websocket.receive_text()  # keep alive
     except WebSocketDisconnect:
-        manager.disconnect(job_id, websocket)
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+
+@router.websocket("/ws/jobs")
+async def multi_job_updates(websocket: WebSocket):
+    """
+    One connection for many jobs. Client messages:
+
+    {"action": "subscribe", "job_ids": [...]}
+    {"action": "unsubscribe", "job_ids": [...]}
+    {"action": "subscribe_all"}      → every job of the user
+    {"action": "unsubscribe_all"}
+
+    A subscribe is answered with one "subscribed" reply carrying the
+    current status of each owned job ({"statuses": {job_id: status}}),
+    followed by live updates. The connection is closed as soon as it
+    is dropped (e.g. as a slow consumer).
+    """
+    token = websocket.query_params.get("token")
+    user_id = verify_token(token) if token else None
+    if not user_id:
+        await websocket.close(code=1008)
+        return
+
+    conn = await manager.connect(websocket, user_id)
+
+    try:
+        while not conn.closed:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict):
+                manager.send_reply(conn, {"type": "error", "detail": "Expected a JSON object"})
+                continue
+
+            action = message.get("action")
+            job_ids = message.get("job_ids") or []
+
+            if (
+                not isinstance(job_ids, list)
+                or len(job_ids) > MAX_JOB_IDS_PER_MESSAGE
+                or not all(isinstance(job_id, str) for job_id in job_ids)
+            ):
+                manager.send_reply(conn, {
+                    "type": "error",
+                    "detail": f"job_ids must be a list of at most {MAX_JOB_IDS_PER_MESSAGE} ID strings"
+                })
+                continue
+
+            if action == "subscribe":
+                # Ownership and current status come from the snapshot cache
+                snapshots = await get_job_snapshots(job_ids)
+                owned = {
+                    job_id: snapshot["status"]
+                    for job_id, snapshot in snapshots.items()
+                    if snapshot["user_id"] == user_id
+                }
+                for job_id in owned:
+                    manager.subscribe(conn, job_id)
+                # Current statuses go out in this one message, so even
+                # MAX_JOB_IDS_PER_MESSAGE jobs take a single queue slot
+                manager.send_reply(conn, {
+                    "type": "subscribed",
+                    "job_ids": list(owned),
+                    "statuses": owned,
+                    "rejected": [job_id for job_id in job_ids if job_id not in owned]
+                })
+
+            elif action == "unsubscribe":
+                for job_id in job_ids:
+                    manager.unsubscribe(conn, job_id)
+                manager.send_reply(conn, {"type": "unsubscribed", "job_ids": job_ids})
+
+            elif action == "subscribe_all":
+                manager.subscribe_all(conn)
+                manager.send_reply(conn, {"type": "subscribed_all"})
+
+            elif action == "unsubscribe_all":
+                manager.unsubscribe_all(conn)
+                manager.send_reply(conn, {"type": "unsubscribed_all"})
+
+            else:
+                manager.send_reply(conn, {"type": "error", "detail": f"Unknown action: {action}"})
+
+    except (WebSocketDisconnect, ValueError, RuntimeError):
+        # Client left, sent invalid JSON, or was dropped as a slow consumer
+        pass
+    finally:
+        manager.disconnect(websocket)
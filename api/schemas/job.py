@@ -1,13 +1,55 @@
-from pydantic import BaseModel
-from typing import Dict
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from common.blobstore import BLOB_REF_KEY
 
 class JobCreate(BaseModel):
     job_type: str
     payload: Dict
     max_retries: int = 3
     timeout_seconds: int = 120
+    # 0 = low, 1 = normal, 2 = high (see common.queue.PRIORITY_WEIGHTS)
+    priority: int = Field(1, ge=0, le=2)
+    # Per-item idempotency key, used by POST /jobs/batch
+    # (single submissions use the Idempotency-Key header)
+    idempotency_key: Optional[str] = None
+    # Delayed start: seconds from now, or an absolute time (naive = UTC)
+    delay_seconds: Optional[float] = Field(None, ge=0)
+    run_at: Optional[datetime] = None
+    # Parent job IDs: the job waits as PENDING until all of them
+    # COMPLETED, and fails if one of them FAILED
+    depends_on: List[str] = []
+
+    @field_validator("payload")
+    @classmethod
+    def no_blob_ref(cls, payload: Dict) -> Dict:
+        # Reserved for blob references created by the server
+        if BLOB_REF_KEY in payload:
+            raise ValueError(f"payload key {BLOB_REF_KEY!r} is reserved")
+        return payload
+
+    def scheduled_at(self) -> Optional[float]:
+        """
+        UNIX time the job should start at, or None to run it right away.
+        """
+        if self.run_at is not None:
+            run_at = self.run_at
+            if run_at.tzinfo is None:
+                run_at = run_at.replace(tzinfo=timezone.utc)
+            return run_at.timestamp()
+        if self.delay_seconds:
+            return datetime.now(timezone.utc).timestamp() + self.delay_seconds
+        return None
+
+class WorkflowJob(JobCreate):
+    # Name of the job inside the workflow; depends_on may list the keys
+    # of other jobs in the same workflow as well as existing job IDs
+    key: str
+
+class WorkflowCreate(BaseModel):
+    jobs: List[WorkflowJob]
+
 class JobStatusResponse(BaseModel):
     job_id: str
     job_type: str
@@ -16,5 +58,29 @@ class JobStatusResponse(BaseModel):
     created_at: datetime
     started_at: Optional[datetime]
     finished_at: Optional[datetime]
+    run_at: Optional[datetime] = None
     last_error: Optional[str]
-    result: Optional[dict]
\ No newline at end of file
+    result: Optional[dict]
+    # Set instead of result when the result is too large to inline
+    result_url: Optional[str] = None
+
+class JobSummary(BaseModel):
+    job_id: str
+    job_type: str
+    status: str
+    priority: int
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    run_at: Optional[datetime]
+    last_error: Optional[str]
+    # Only present when requested with ?include=payload / ?include=result
+    payload: Optional[dict] = None
+    result: Optional[dict] = None
+    result_url: Optional[str] = None
+
+class JobListResponse(BaseModel):
+    jobs: List[JobSummary]
+    # Pass as ?cursor= to get the next page; None on the last page
+    next_cursor: Optional[str]
@@ -1,19 +1,180 @@
-from typing import Dict, List
+import asyncio
+import itertools
+from collections import OrderedDict
+from typing import Dict, Set
 from fastapi import WebSocket
+from common.logger import logger
+from common.pubsub import job_update_channel
+
+# Most distinct jobs with an unsent update a connection may have.
+# Updates for the same job are coalesced (latest status wins), so this
+# only fills up when a client stops reading entirely.
+MAX_PENDING_UPDATES = 256
+
+# A single send slower than this drops the connection (seconds)
+SEND_TIMEOUT = 5
+
+
+class Connection:
+    """
+    One WebSocket with its own bounded send queue and sender task,
+    so a slow client never delays updates to the others.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.job_ids: Set[str] = set()
+        self.all_jobs = False
+        self.pending: "OrderedDict[str, dict]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.sender: asyncio.Task = None
+        # Set once disconnected or dropped; the connection takes no
+        # more subscriptions or messages
+        self.closed = False
+
 
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        # job_id → connections subscribed to that job
+        self.active_connections: Dict[str, Set[Connection]] = {}
+        # user_id → connections subscribed to all of the user's jobs
+        self.user_connections: Dict[str, Set[Connection]] = {}
+        self.connections: Dict[WebSocket, Connection] = {}
 
-    async def connect(self, job_id: str, websocket: WebSocket):
+        # Shard channel → number of connections that need it.
+        # The Redis listener reconciles its subscriptions whenever
+        # channels_changed is set.
+        self.channel_refs: Dict[str, int] = {}
+        self.channels_changed = asyncio.Event()
+
+        self._reply_ids = itertools.count()
+
+        # Pending close tasks, referenced until done so they are not
+        # garbage-collected mid-close
+        self._close_tasks: Set[asyncio.Task] = set()
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
         await websocket.accept()
-        self.active_connections.setdefault(job_id, []).append(websocket)
+        conn = Connection(websocket, user_id)
+        conn.sender = asyncio.create_task(self._sender(conn))
+        self.connections[websocket] = conn
+        self._add_channel_ref(job_update_channel(user_id))
+        return conn
+
+    def subscribe(self, conn: Connection, job_id: str):
+        if conn.closed:
+            return
+        conn.job_ids.add(job_id)
+        self.active_connections.setdefault(job_id, set()).add(conn)
+
+    def unsubscribe(self, conn: Connection, job_id: str):
+        conn.job_ids.discard(job_id)
+        subscribers = self.active_connections.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self.active_connections[job_id]
+
+    def subscribe_all(self, conn: Connection):
+        if conn.closed:
+            return
+        conn.all_jobs = True
+        self.user_connections.setdefault(conn.user_id, set()).add(conn)
+
+    def unsubscribe_all(self, conn: Connection):
+        conn.all_jobs = False
+        subscribers = self.user_connections.get(conn.user_id)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self.user_connections[conn.user_id]
+
+    def disconnect(self, websocket: WebSocket):
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
+            return
+        conn.closed = True
+        for job_id in list(conn.job_ids):
+            self.unsubscribe(conn, job_id)
+        self.unsubscribe_all(conn)
+        self._remove_channel_ref(job_update_channel(conn.user_id))
+        if conn.sender is not None and conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+
+    def wanted_channels(self) -> Set[str]:
+        return set(self.channel_refs)
+
+    def _add_channel_ref(self, channel: str):
+        self.channel_refs[channel] = self.channel_refs.get(channel, 0) + 1
+        if self.channel_refs[channel] == 1:
+            self.channels_changed.set()
+
+    def _remove_channel_ref(self, channel: str):
+        self.channel_refs[channel] -= 1
+        if self.channel_refs[channel] == 0:
+            del self.channel_refs[channel]
+            self.channels_changed.set()
+
+    def send_update(self, message: dict):
+        """
+        Queues a job update for every connection subscribed to the job
+        or to all jobs of its owner, without awaiting any socket.
+        """
+        targets = set(self.active_connections.get(message["job_id"], ()))
+        targets.update(self.user_connections.get(message.get("user_id"), ()))
+        for conn in targets:
+            self.enqueue(conn, message["job_id"], message)
+
+    def send_reply(self, conn: Connection, message: dict):
+        """
+        Queues a control message (never coalesced with job updates).
+        """
+        self.enqueue(conn, f"reply:{next(self._reply_ids)}", message)
+
+    def enqueue(self, conn: Connection, key: str, message: dict):
+        """
+        A pending message with the same key is replaced (coalesced);
+        a connection whose queue is full is dropped.
+        """
+        if conn.closed:
+            return
+        if key not in conn.pending and len(conn.pending) >= MAX_PENDING_UPDATES:
+            logger.warning("[WS] Dropping slow WebSocket consumer")
+            self._drop(conn)
+            return
+        conn.pending[key] = message
+        conn.wakeup.set()
+
+    async def _sender(self, conn: Connection):
+        try:
+            while True:
+                await conn.wakeup.wait()
+                conn.wakeup.clear()
+                while conn.pending:
+                    _, message = conn.pending.popitem(last=False)
+                    await asyncio.wait_for(
+                        conn.websocket.send_json(message),
+                        timeout=SEND_TIMEOUT
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("[WS] Send failed or timed out, dropping connection")
+            self._drop(conn)
 
-    def disconnect(self, job_id: str, websocket: WebSocket):
-        self.active_connections[job_id].remove(websocket)
-        if not self.active_connections[job_id]:
-            del self.active_connections[job_id]
+    def _drop(self, conn: Connection):
+        if conn.closed:
+            return
+        self.disconnect(conn.websocket)
+        task = asyncio.create_task(self._close(conn.websocket))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
 
-    async def send_update(self, job_id: str, message: dict):
-        for ws in self.active_connections.get(job_id, []):
-            await ws.send_json(message)
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            # 1013 = try again later
+            await asyncio.wait_for(websocket.close(code=1013), timeout=SEND_TIMEOUT)
+        except Exception:
+            pass
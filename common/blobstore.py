@@ -0,0 +1,99 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+
+# =========================
+# CONTENT-ADDRESSED BLOB STORE
+# =========================
+# Payloads and results larger than BLOB_THRESHOLD_BYTES are stored as
+# files named by the SHA-256 of their JSON encoding, and the jobs row
+# only keeps a reference:
+#
+#     {"$blob": "<sha256>", "size": <bytes>}
+#
+# Identical documents are stored once. BLOB_DIR is a local (or shared,
+# e.g. NFS) directory standing in for an object store; the API and the
+# workers must see the same one.
+
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")
+BLOB_THRESHOLD_BYTES = int(os.getenv("BLOB_THRESHOLD_BYTES", 64 * 1024))
+
+BLOB_REF_KEY = "$blob"
+
+# Only SHA-256 hex digests name blobs (never a path)
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def is_digest(value) -> bool:
+    return isinstance(value, str) and _DIGEST_RE.fullmatch(value) is not None
+
+
+def blob_path(digest: str) -> str:
+    if not is_digest(digest):
+        raise ValueError(f"Invalid blob digest: {digest!r}")
+    # Two levels of fan-out keep directories small
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], digest)
+
+
+def put_blob(data: bytes) -> str:
+    """
+    Stores data under its SHA-256 and returns the digest.
+    Writing an existing blob is a no-op.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if os.path.exists(path):
+        return digest
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write-then-rename, so readers never see a partial blob
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return digest
+
+
+def read_blob(digest: str) -> bytes:
+    with open(blob_path(digest), "rb") as f:
+        return f.read()
+
+
+def is_blob_ref(value) -> bool:
+    """
+    True for references created by offload(); raises ValueError for a
+    "$blob" key that does not hold a digest.
+    """
+    if not isinstance(value, dict) or BLOB_REF_KEY not in value:
+        return False
+    if not is_digest(value[BLOB_REF_KEY]):
+        raise ValueError(f"Invalid blob reference: {value[BLOB_REF_KEY]!r}")
+    return True
+
+
+def offload(value):
+    """
+    Returns a blob reference for values whose JSON encoding exceeds
+    BLOB_THRESHOLD_BYTES (storing them first), or the value itself.
+    """
+    if value is None:
+        return None
+    data = json.dumps(value).encode()
+    if len(data) <= BLOB_THRESHOLD_BYTES:
+        return value
+    return {BLOB_REF_KEY: put_blob(data), "size": len(data)}
+
+
+def resolve(value):
+    """
+    Inverse of offload(): loads the document behind a blob reference.
+    """
+    if is_blob_ref(value):
+        return json.loads(read_blob(value[BLOB_REF_KEY]))
+    return value
@@ -0,0 +1,26 @@
+# =========================
+# SHARED REDIS KEYS
+# =========================
+
+# Per-worker in-flight list: jobs moved here by the dequeue script until
+# acknowledged (same {sched} hash tag as the scheduler keys, see common.queue)
+PROCESSING_LIST_PREFIX = "{sched}:processing:"
+
+# Per-worker liveness key, refreshed by the worker's heartbeat thread
+WORKER_HEARTBEAT_PREFIX = "worker:heartbeat:"
+
+# Set of worker IDs that may own an in-flight list
+WORKERS_SET = "workers"
+
+# Heartbeat timing (seconds). A worker whose key has expired is dead.
+HEARTBEAT_INTERVAL = 3
+HEARTBEAT_TTL = 10
+
+# Sorted set of RUNNING jobs scored by their deadline
+# (started_at + timeout_seconds, as a UNIX timestamp)
+DEADLINE_SET = "job_deadlines"
+
+# Job updates are published to one of JOB_UPDATE_SHARDS channels
+# (job_updates:<shard>), chosen by hashing the job owner's user_id
+JOB_UPDATES_CHANNEL_PREFIX = "job_updates:"
+JOB_UPDATE_SHARDS = 64
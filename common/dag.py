@@ -0,0 +1,322 @@
+import json
+import time
+
+from sqlalchemy import update
+
+from common.models import Job, naive_utc
+from common.queue import (
+    _PUSH_LUA,
+    _SCHEDULER_KEYS,
+    _script,
+    TYPE_FLOWS_PREFIX,
+    SCHED_TAG,
+    SCHEDULED_SET,
+    SCHEDULED_META,
+    DOORBELL_MAX_TOKENS,
+    flow_key,
+    flow_weight
+)
+
+# =========================
+# JOB DEPENDENCIES (DAGs)
+# =========================
+# A job submitted with depends_on waits as PENDING until every parent
+# COMPLETED. The graph lives in Redis and is resolved incrementally,
+# with one script call per finished job (no polling, no table scans):
+#
+# - dag:pending:<child>   number of parents the child still waits for
+# - dag:children:<parent> set of children waiting for the parent
+# - dag:meta              hash: child → flow metadata (as sched:delayed_meta)
+# - dag:done:<job>        terminal status of a recently finished job, so
+#                         a child registered right after its parent
+#                         finished is not left waiting
+# - dag:parents           set of jobs with waiting children
+# - dag:finishing         zset: parent → time its terminal outcome was
+#                         about to be committed (or a child started
+#                         waiting for it); cleared by its release
+# - dag:unsettled         hash: child → {"status", "parent", "at"} for
+#                         children released / failed in Redis whose row
+#                         may still say PENDING
+#
+# The keys carry the scheduler's {sched} hash tag (see common.queue),
+# since the scripts also push released jobs into their flows.
+#
+# When the last parent completes, the child goes straight into its
+# flow (or the scheduled set if it has a future run_at). When a parent
+# FAILED, every waiting descendant fails too.
+#
+# Recovery: the row updates that follow a script call are idempotent
+# (WHERE status = 'PENDING') and a child leaves dag:unsettled only once
+# they committed (settle_dependents). The timeout monitor re-applies
+# unsettled entries left behind by a crash or a DB error, and re-runs
+# release_dependents for jobs left in dag:finishing (e.g. a worker died
+# between its outcome commit and the script call); only those marked
+# parents are looked at, never the whole graph.
+# See worker.dependencies.recover_dependents.
+#
+# Functions accept a blocking or an asyncio Redis client; with an
+# asyncio client the returned awaitable must be awaited.
+
+DAG_PREFIX = f"{SCHED_TAG}:dag:"
+DAG_META = f"{DAG_PREFIX}meta"
+DAG_PARENTS = f"{DAG_PREFIX}parents"
+DAG_UNSETTLED = f"{DAG_PREFIX}unsettled"
+DAG_FINISHING = f"{DAG_PREFIX}finishing"
+
+# How long finished jobs keep their dag:done marker (seconds); only
+# needs to cover a submission's read of the parents' rows
+DONE_TTL_SECONDS = 600
+
+_DAG_KEYS = [
+    *_SCHEDULER_KEYS, SCHEDULED_SET, SCHEDULED_META, DAG_META, DAG_PARENTS, DAG_UNSETTLED, DAG_FINISHING
+]
+
+# KEYS[8] = scheduled set, KEYS[9] = scheduled metadata, KEYS[10] = dag meta,
+# KEYS[11] = parents set, KEYS[12] = unsettled hash, KEYS[13] = finishing zset
+_DAG_LUA = _PUSH_LUA + """
+local prefix, now, max_tokens = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local done_ttl, dag = tonumber(ARGV[4]), ARGV[5]
+
+-- Remembered until the child's row update committed
+local function unsettle(child, status, parent)
+    redis.call('HSET', KEYS[12], child, cjson.encode({status = status, parent = parent, at = now}))
+end
+
+local function release(child, meta)
+    local m = cjson.decode(meta)
+    if m.run_at ~= cjson.null and tonumber(m.run_at) > now then
+        redis.call('ZADD', KEYS[8], m.run_at, child)
+        redis.call('HSET', KEYS[9], child, cjson.encode({flow = m.flow, job_type = m.job_type, weight = m.weight}))
+    else
+        push(prefix, m.flow, m.job_type, tonumber(m.weight), now, false, {child}, max_tokens)
+    end
+end
+
+-- Fails every waiting descendant of job_id; appends them to failed
+local function fail_descendants(job_id, failed)
+    local stack = {job_id}
+    while #stack > 0 do
+        local parent = table.remove(stack)
+        local children_key = dag .. 'children:' .. parent
+        for _, child in ipairs(redis.call('SMEMBERS', children_key)) do
+            if redis.call('DEL', dag .. 'pending:' .. child) == 1 then
+                redis.call('HDEL', KEYS[10], child)
+                redis.call('SET', dag .. 'done:' .. child, 'FAILED', 'EX', done_ttl)
+                unsettle(child, 'FAILED', job_id)
+                table.insert(failed, child)
+                table.insert(stack, child)
+            end
+        end
+        redis.call('DEL', children_key)
+        redis.call('SREM', KEYS[11], parent)
+    end
+end
+"""
+
+# ARGV[6] = finished job, ARGV[7] = its terminal status
+_FINISH_LUA = _DAG_LUA + """
+local job_id, status = ARGV[6], ARGV[7]
+local ready, failed = {}, {}
+redis.call('SET', dag .. 'done:' .. job_id, status, 'EX', done_ttl)
+redis.call('ZREM', KEYS[13], job_id)
+
+if status == 'COMPLETED' then
+    local children_key = dag .. 'children:' .. job_id
+    for _, child in ipairs(redis.call('SMEMBERS', children_key)) do
+        local pending_key = dag .. 'pending:' .. child
+        if redis.call('EXISTS', pending_key) == 1 and redis.call('DECR', pending_key) <= 0 then
+            redis.call('DEL', pending_key)
+            local meta = redis.call('HGET', KEYS[10], child)
+            redis.call('HDEL', KEYS[10], child)
+            if meta then
+                release(child, meta)
+                unsettle(child, 'QUEUED', job_id)
+                table.insert(ready, child)
+            end
+        end
+    end
+    redis.call('DEL', children_key)
+    redis.call('SREM', KEYS[11], job_id)
+else
+    fail_descendants(job_id, failed)
+end
+return {ready, failed}
+"""
+
+# ARGV[6] = JSON list of [child, [parents], meta], parents before children
+_REGISTER_LUA = _DAG_LUA + """
+local ready, failed, failed_parents = {}, {}, {}
+for _, entry in ipairs(cjson.decode(ARGV[6])) do
+    local child, parents, meta = entry[1], entry[2], entry[3]
+    local waiting, failed_parent = 0, nil
+    for _, parent in ipairs(parents) do
+        local done = redis.call('GET', dag .. 'done:' .. parent)
+        if done == 'FAILED' then
+            failed_parent = parent
+        elseif not done then
+            redis.call('SADD', dag .. 'children:' .. parent, child)
+            redis.call('SADD', KEYS[11], parent)
+            -- The parent may have committed its outcome since its row
+            -- was read, by a worker that died before releasing it
+            redis.call('ZADD', KEYS[13], now, parent)
+            waiting = waiting + 1
+        end
+    end
+
+    if failed_parent then
+        -- Children sets it already joined skip it (no pending counter)
+        redis.call('SET', dag .. 'done:' .. child, 'FAILED', 'EX', done_ttl)
+        unsettle(child, 'FAILED', failed_parent)
+        table.insert(failed, child)
+        table.insert(failed_parents, failed_parent)
+    elseif waiting == 0 then
+        release(child, cjson.encode(meta))
+        unsettle(child, 'QUEUED', '')
+        table.insert(ready, child)
+    else
+        redis.call('SET', dag .. 'pending:' .. child, waiting)
+        redis.call('HSET', KEYS[10], child, cjson.encode(meta))
+    end
+end
+return {ready, failed, failed_parents}
+"""
+
+
+# Marks the given jobs that have waiting children as finishing.
+# KEYS[1] = parents set, KEYS[2] = finishing zset; ARGV[1] = now, then job IDs
+_MARK_FINISHING_LUA = """
+local marked = 0
+for i = 2, #ARGV do
+    if redis.call('SISMEMBER', KEYS[1], ARGV[i]) == 1 then
+        marked = marked + redis.call('ZADD', KEYS[2], ARGV[1], ARGV[i])
+    end
+end
+return marked
+"""
+
+# Drops marks not renewed since ARGV[1]; ARGV[2..] = job IDs
+_CLEAR_FINISHING_LUA = """
+local cleared = 0
+for i = 2, #ARGV do
+    local marked_at = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if marked_at and tonumber(marked_at) <= tonumber(ARGV[1]) then
+        cleared = cleared + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return cleared
+"""
+
+
+def _args() -> list:
+    return [TYPE_FLOWS_PREFIX, time.time(), DOORBELL_MAX_TOKENS, DONE_TTL_SECONDS, DAG_PREFIX]
+
+
+def register_dependents(redis_client, children: list):
+    """
+    Makes PENDING jobs wait for their parents.
+    `children` holds (job_id, parent_ids, job_type, priority, user_id, run_at)
+    tuples, run_at being a UNIX timestamp or None, with every child
+    listed after its parents. Children whose parents all completed in
+    the meantime are queued right away.
+    Returns [ready_ids, failed_ids, failed_parent_ids], the last two
+    pairwise (which parent made each child fail).
+    """
+    entries = [
+        [job_id, list(parent_ids), {
+            "flow": flow_key(job_type, priority, user_id),
+            "job_type": job_type,
+            "weight": flow_weight(job_type, priority),
+            "run_at": run_at
+        }]
+        for job_id, parent_ids, job_type, priority, user_id, run_at in children
+    ]
+    return _script(redis_client, "dag_register", _REGISTER_LUA)(
+        keys=_DAG_KEYS,
+        args=[*_args(), json.dumps(entries)]
+    )
+
+
+def release_dependents(redis_client, job_id: str, status: str):
+    """
+    Records that job_id reached a terminal status: on COMPLETED its
+    children without other pending parents are queued, on FAILED all
+    waiting descendants fail. Returns [ready_ids, failed_ids].
+    Calling it again for the same job is a no-op.
+    """
+    return _script(redis_client, "dag_finish", _FINISH_LUA)(
+        keys=_DAG_KEYS,
+        args=[*_args(), job_id, status]
+    )
+
+
+def mark_finishing(redis_client, job_ids: list):
+    """
+    Call before committing a terminal outcome: the jobs that have
+    waiting children stay in dag:finishing until release_dependents()
+    ran for them, so a release cut short can be found and redone.
+    """
+    return _script(redis_client, "dag_mark_finishing", _MARK_FINISHING_LUA)(
+        keys=[DAG_PARENTS, DAG_FINISHING],
+        args=[time.time(), *job_ids]
+    )
+
+
+def finishing_jobs(redis_client, older_than: float, count: int) -> list:
+    """
+    Up to `count` jobs marked finishing before `older_than` (UNIX time).
+    """
+    return redis_client.zrangebyscore(DAG_FINISHING, "-inf", older_than, start=0, num=count)
+
+
+def clear_finishing(redis_client, job_ids: list, older_than: float):
+    """
+    Drops marks of jobs whose outcome never committed, unless they were
+    marked again after `older_than`.
+    """
+    return _script(redis_client, "dag_clear_finishing", _CLEAR_FINISHING_LUA)(
+        keys=[DAG_FINISHING],
+        args=[older_than, *job_ids]
+    )
+
+
+def settle_dependents(redis_client, job_ids: list):
+    """
+    Forgets unsettled children once their row updates committed.
+    """
+    return redis_client.hdel(DAG_UNSETTLED, *job_ids)
+
+
+def unsettled_dependents(redis_client, older_than: float) -> dict:
+    """
+    Unsettled children released / failed before `older_than` (UNIX time):
+    {child: {"status", "parent", "at"}}.
+    """
+    entries = {child: json.loads(raw) for child, raw in redis_client.hgetall(DAG_UNSETTLED).items()}
+    return {child: entry for child, entry in entries.items() if entry["at"] < older_than}
+
+
+def dependency_error(job_id: str) -> str:
+    return f"Dependency {job_id} failed"
+
+
+# Rows of released / failed PENDING jobs; the WHERE clause leaves
+# jobs a worker already claimed untouched
+
+def queue_pending_jobs(job_ids: list):
+    return (
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.status == "PENDING")
+        .values(status="QUEUED")
+        .returning(Job.id, Job.user_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def fail_pending_jobs(job_ids: list, error: str, finished_at):
+    return (
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.status == "PENDING")
+        .values(status="FAILED", last_error=error, finished_at=naive_utc(finished_at))
+        .returning(Job.id, Job.user_id)
+        .execution_options(synchronize_session=False)
+    )
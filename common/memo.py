@@ -0,0 +1,295 @@
+import json
+import os
+import time
+import hashlib
+from typing import Optional
+
+from common.queue import _script
+
+# =========================
+# RESULT MEMOIZATION
+# =========================
+# Opt-in per job_type, e.g.
+# MEMOIZE_JOB_TYPES='{"report": {"ttl_seconds": 3600, "max_entries": 10000}}'
+#
+# Submissions of a memoized type are keyed by a canonical hash of their
+# payload, per user and job type. Every key of a job type carries the
+# {<job_type>} hash tag, so each script touches one Redis Cluster slot:
+#
+# - memo:{<job_type>}:<user_id>:<sha256> → {"job_id", "status"}, created
+#   by the first such submission ("QUEUED" while it is in flight,
+#   "COMPLETED" once it succeeded, dropped if it failed). A new claim
+#   expires after MEMO_CLAIM_TTL_SECONDS until its job is committed.
+# - memo:{<job_type>}:job:<job_id> → the job's memo key, for the worker
+#   finishing it
+# - memo:{<job_type>}:lru → zset of completed entries by last use; the
+#   least recently used are evicted beyond max_entries
+#
+# An identical submission while the entry exists gets the existing job
+# back: a COMPLETED one immediately, an in-flight one coalesced onto
+# the running job. Nothing is inserted or queued either way.
+#
+# Every key a script touches is passed in KEYS; scripts take the
+# entries of one job type (callers group them, see group_by_job_type).
+# Functions accept a blocking or an asyncio Redis client; with an
+# asyncio client the returned awaitable must be awaited.
+
+DEFAULT_MEMO = {
+    "ttl_seconds": 3600,
+    "max_entries": 10000,
+}
+
+MEMOIZE_JOB_TYPES = json.loads(os.getenv("MEMOIZE_JOB_TYPES", "{}"))
+
+MEMO_PREFIX = "memo:"
+MEMO_JOB_PREFIX = "job:"      # after memo:{<job_type>}:
+MEMO_LRU_SUFFIX = "lru"       # after memo:{<job_type>}:
+
+# How long a claimed entry lives until the API confirms its job was
+# committed (seconds), so an API dying in between blocks identical
+# submissions only briefly
+MEMO_CLAIM_TTL_SECONDS = int(os.getenv("MEMO_CLAIM_TTL_SECONDS", "30"))
+
+# Entries of one job type.
+# KEYS[1] = LRU zset, then (memo key, job key) per entry
+# ARGV: now, claim TTL, ttl, then the new job_id per entry
+_CLAIM_LUA = """
+local now, claim_ttl, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local existing = {}
+for i = 1, (#KEYS - 1) / 2 do
+    local key, job_key, job_id = KEYS[2 * i], KEYS[2 * i + 1], ARGV[3 + i]
+    local value = redis.call('GET', key)
+    local entry = value and cjson.decode(value)
+    -- Evicted entries left the LRU set and only wait to be deleted
+    if entry and entry.status == 'COMPLETED' and not redis.call('ZSCORE', KEYS[1], key) then
+        entry = nil
+    end
+    if entry then
+        if entry.status == 'COMPLETED' then
+            -- Used again: the entry and its LRU score both restart
+            redis.call('EXPIRE', key, ttl)
+            redis.call('ZADD', KEYS[1], now, key)
+        end
+        table.insert(existing, value)
+    else
+        redis.call('SET', key, cjson.encode({job_id = job_id, status = 'QUEUED'}), 'EX', claim_ttl)
+        redis.call('SET', job_key, key, 'EX', claim_ttl)
+        table.insert(existing, '')
+    end
+end
+return existing
+"""
+
+# KEYS: (memo key, job key) per entry; ARGV[1] = ttl, then job_id per entry
+_CONFIRM_LUA = """
+local ttl = tonumber(ARGV[1])
+for i = 1, #KEYS / 2 do
+    local key, job_key = KEYS[2 * i - 1], KEYS[2 * i]
+    local value = redis.call('GET', key)
+    if value and cjson.decode(value).job_id == ARGV[1 + i] then
+        redis.call('EXPIRE', key, ttl)
+        redis.call('EXPIRE', job_key, ttl)
+    end
+end
+return 1
+"""
+
+# KEYS: (memo key, job key) per entry; ARGV: job_id per entry
+_FORGET_LUA = """
+for i = 1, #KEYS / 2 do
+    local key = KEYS[2 * i - 1]
+    local value = redis.call('GET', key)
+    if value and cjson.decode(value).job_id == ARGV[i] then
+        redis.call('DEL', key)
+    end
+    redis.call('DEL', KEYS[2 * i])
+end
+return 1
+"""
+
+# KEYS[1] = job key, KEYS[2] = memo key it pointed to, KEYS[3] = LRU zset
+# ARGV: job_id, status, now, ttl, max_entries
+# Returns the memo keys evicted from the LRU set (see _EVICT_LUA)
+_FINISH_LUA = """
+local job_id, status, now = ARGV[1], ARGV[2], tonumber(ARGV[3])
+local ttl, max_entries = tonumber(ARGV[4]), tonumber(ARGV[5])
+
+local key = redis.call('GET', KEYS[1])
+if key ~= KEYS[2] then
+    return {}
+end
+redis.call('DEL', KEYS[1])
+local value = redis.call('GET', key)
+if not value or cjson.decode(value).job_id ~= job_id then
+    return {}
+end
+
+if status ~= 'COMPLETED' then
+    redis.call('DEL', key)
+    return {}
+end
+
+redis.call('SET', key, cjson.encode({job_id = job_id, status = 'COMPLETED'}), 'EX', ttl)
+redis.call('ZADD', KEYS[3], now, key)
+-- Entries unused for a whole TTL have expired already
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now - ttl)
+local evicted = {}
+local excess = redis.call('ZCARD', KEYS[3]) - max_entries
+if excess > 0 then
+    local popped = redis.call('ZPOPMIN', KEYS[3], excess)
+    for i = 1, #popped, 2 do
+        table.insert(evicted, popped[i])
+    end
+end
+return evicted
+"""
+
+# Deletes evicted entries unless they were claimed again meanwhile.
+# KEYS[1] = LRU zset, KEYS[2..] = evicted memo keys
+_EVICT_LUA = """
+local deleted = 0
+for i = 2, #KEYS do
+    local value = redis.call('GET', KEYS[i])
+    if value and cjson.decode(value).status == 'COMPLETED' and not redis.call('ZSCORE', KEYS[1], KEYS[i]) then
+        deleted = deleted + redis.call('DEL', KEYS[i])
+    end
+end
+return deleted
+"""
+
+
+def memo_policy(job_type: str) -> Optional[dict]:
+    """
+    Memoization settings of job_type, or None if it is not memoized.
+    """
+    if job_type not in MEMOIZE_JOB_TYPES:
+        return None
+    return {**DEFAULT_MEMO, **MEMOIZE_JOB_TYPES[job_type]}
+
+
+def _tag(job_type: str) -> str:
+    return f"{MEMO_PREFIX}{{{job_type}}}:"
+
+
+def memo_key(user_id: str, job_type: str, payload: dict) -> str:
+    # Canonical JSON: key order and whitespace do not matter
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f"{_tag(job_type)}{user_id}:{digest}"
+
+
+def memo_job_key(job_type: str, job_id: str) -> str:
+    return f"{_tag(job_type)}{MEMO_JOB_PREFIX}{job_id}"
+
+
+def memo_lru_key(job_type: str) -> str:
+    return f"{_tag(job_type)}{MEMO_LRU_SUFFIX}"
+
+
+def group_by_job_type(entries: list) -> dict:
+    """
+    {job_type: entries} for (memo_key, job_id, job_type) entries,
+    one group per script call.
+    """
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry[2], []).append(entry)
+    return groups
+
+
+def claim_memo_entries(redis_client, job_type: str, entries: list):
+    """
+    Looks up memo keys and claims the missing ones for new jobs, in one
+    script call. `entries` holds (memo_key, new_job_id, job_type) tuples
+    of one memoized job type; a key listed twice coalesces onto the first.
+    Returns one raw value per entry: "" when it was claimed for the new
+    job, otherwise the existing entry (see decode_memo).
+
+    Claims expire after MEMO_CLAIM_TTL_SECONDS unless the jobs are
+    committed and confirm_memo_entries is called.
+    """
+    keys = [memo_lru_key(job_type)]
+    for key, job_id, _ in entries:
+        keys += [key, memo_job_key(job_type, job_id)]
+    return _script(redis_client, "memo_claim", _CLAIM_LUA)(
+        keys=keys,
+        args=[
+            time.time(), MEMO_CLAIM_TTL_SECONDS, memo_policy(job_type)["ttl_seconds"],
+            *(job_id for _, job_id, _ in entries)
+        ]
+    )
+
+
+def decode_memo(raw: str) -> Optional[dict]:
+    return json.loads(raw) if raw else None
+
+
+def _entry_keys(job_type: str, entries: list) -> list:
+    return [key for memo, job_id, _ in entries for key in (memo, memo_job_key(job_type, job_id))]
+
+
+def confirm_memo_entries(redis_client, job_type: str, entries: list):
+    """
+    Extends claimed entries of one job type to their full ttl_seconds
+    once their jobs are committed. Entries that expired or were taken
+    over meanwhile are left alone.
+    """
+    return _script(redis_client, "memo_confirm", _CONFIRM_LUA)(
+        keys=_entry_keys(job_type, entries),
+        args=[memo_policy(job_type)["ttl_seconds"], *(job_id for _, job_id, _ in entries)]
+    )
+
+
+def forget_memo_entries(redis_client, job_type: str, entries: list):
+    """
+    Drops entries of one job type claimed for jobs that were never created.
+    """
+    return _script(redis_client, "memo_forget", _FORGET_LUA)(
+        keys=_entry_keys(job_type, entries),
+        args=[job_id for _, job_id, _ in entries]
+    )
+
+
+def _finish(redis_client, job_id: str, job_type: str, key: str, status: str):
+    policy = memo_policy(job_type)
+    return _script(redis_client, "memo_finish", _FINISH_LUA)(
+        keys=[memo_job_key(job_type, job_id), key, memo_lru_key(job_type)],
+        args=[job_id, status, time.time(), policy["ttl_seconds"], policy["max_entries"]]
+    )
+
+
+def _evict(redis_client, job_type: str, keys: list):
+    return _script(redis_client, "memo_evict", _EVICT_LUA)(
+        keys=[memo_lru_key(job_type), *keys],
+        args=[]
+    )
+
+
+def finish_memo_entry(redis_client, job_id: str, job_type: str, status: str):
+    """
+    Records a memoized job's terminal status: a COMPLETED job's entry
+    is kept for ttl_seconds (LRU-evicted beyond max_entries), a FAILED
+    job's entry is dropped so the next submission runs again.
+    Only call it for job types with a memo_policy().
+
+    Reads the job's memo key first, so the script can declare it.
+    Blocking client only; see finish_memo_entry_async.
+    """
+    key = redis_client.get(memo_job_key(job_type, job_id))
+    if key is None:
+        return
+    evicted = _finish(redis_client, job_id, job_type, key, status)
+    if evicted:
+        _evict(redis_client, job_type, evicted)
+
+
+async def finish_memo_entry_async(redis_client, job_id: str, job_type: str, status: str):
+    """
+    finish_memo_entry() for a redis.asyncio client.
+    """
+    key = await redis_client.get(memo_job_key(job_type, job_id))
+    if key is None:
+        return
+    evicted = await _finish(redis_client, job_id, job_type, key, status)
+    if evicted:
+        await _evict(redis_client, job_type, evicted)
@@ -1,20 +1,43 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Index, text
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from sqlalchemy.orm import mapped_column
+from datetime import datetime, timezone
 import uuid
 
 Base = declarative_base()
 
-class Job(Base):
-    __tablename__ = "jobs"
-    
+ACTIVE_STATUSES = ("QUEUED", "RUNNING", "RETRYING")
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+def naive_utc(value):
+    """
+    Timestamps are stored as naive UTC (DateTime without time zone);
+    asyncpg refuses to bind aware datetimes to such columns.
+    """
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _status_in(statuses) -> str:
+    return "status IN (" + ", ".join(f"'{s}'" for s in statuses) + ")"
+
+
+class JobColumns:
+    """
+    Columns shared by the live jobs table and the jobs_history archive.
+    """
     user_id = Column(String, nullable=False)
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     job_type = Column(String, nullable=False)
     worker_id = Column(String, nullable=True)
-    payload = Column(JSON, nullable=False)   # INPUT
-    result = Column(JSON, nullable=True)     # OUTPUT
+    # Deferred: only loaded when accessed or selected explicitly.
+    # Large documents are blob references (see common.blobstore).
+    payload = mapped_column(JSON, nullable=False, deferred=True)   # INPUT
+    result = mapped_column(JSON, nullable=True, deferred=True)     # OUTPUT
     status = Column(String, nullable=False)
+    priority = Column(Integer, nullable=False, default=1)  # 0 low, 1 normal, 2 high
     attempts = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
     timeout_seconds = Column(Integer, default=120)
@@ -22,4 +45,42 @@ class Job(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
     finished_at = Column(DateTime, nullable=True)
+    run_at = Column(DateTime, nullable=True)  # delayed start / next retry
     last_error = Column(String, nullable=True)
+
+
+class Job(JobColumns, Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # GET /jobs keyset pagination, unfiltered and filtered by status
+        Index("ix_jobs_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_jobs_user_status_created", "user_id", "status", "created_at", "id"),
+        # Status counts, completed-jobs throughput window
+        Index("ix_jobs_status_finished", "status", "finished_at"),
+        # Stale RUNNING recovery; only the (small) set of active jobs
+        Index(
+            "ix_jobs_active_started", "status", "started_at",
+            postgresql_where=text(_status_in(ACTIVE_STATUSES))
+        ),
+        # Archiver: terminal jobs by age
+        Index(
+            "ix_jobs_terminal_updated", "updated_at",
+            postgresql_where=text(_status_in(TERMINAL_STATUSES))
+        ),
+    )
+
+
+class JobHistory(JobColumns, Base):
+    """
+    Archived terminal jobs (see worker/archiver.py), range-partitioned
+    by month of created_at: jobs_history_<YYYY>_<MM>. The partition key
+    has to be part of the primary key.
+    """
+    __tablename__ = "jobs_history"
+    __table_args__ = (
+        Index("ix_jobs_history_id", "id"),
+        Index("ix_jobs_history_user_created", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
@@ -0,0 +1,21 @@
+import json
+import zlib
+
+from common.constants import JOB_UPDATES_CHANNEL_PREFIX, JOB_UPDATE_SHARDS
+
+
+def job_update_channel(user_id: str) -> str:
+    """
+    Shard channel carrying the updates of every job owned by user_id.
+    API nodes only subscribe to the shards of the users connected to them.
+    """
+    shard = zlib.crc32(user_id.encode()) % JOB_UPDATE_SHARDS
+    return f"{JOB_UPDATES_CHANNEL_PREFIX}{shard}"
+
+
+def job_update_message(job_id: str, status: str, user_id: str) -> str:
+    return json.dumps({
+        "job_id": job_id,
+        "status": status,
+        "user_id": user_id
+    })
@@ -0,0 +1,320 @@
+import json
+import os
+import time
+import weakref
+
+# =========================
+# WEIGHTED FAIR JOB QUEUE
+# =========================
+# Jobs are queued in per-flow sub-queues, one flow per
+# (job_type, priority, user_id). Workers dequeue with self-clocked
+# fair queuing: each flow carries a virtual finish tag that advances
+# by 1 / weight every time it is served, and the flow with the
+# smallest tag goes next. A flow that has not been served for
+# STARVATION_SECONDS is served first regardless of its tag.
+#
+# Both operations are Lua scripts, so every enqueue/dequeue is one
+# atomic round trip. Functions accept a blocking or an asyncio Redis
+# client; with an asyncio client the returned awaitable must be awaited.
+#
+# The scripts pick flows (and per-type keys) at run time, so not every
+# key they touch can be passed in KEYS. All scheduler keys, including
+# the workers' processing lists and the common.dag keys, share the
+# {sched} hash tag: they live in one slot, as Redis Cluster requires.
+
+SCHED_TAG = "{sched}"
+
+FLOW_PREFIX = f"{SCHED_TAG}:queue:"
+TYPE_FLOWS_PREFIX = f"{SCHED_TAG}:flows:"   # zset per job_type: flow → finish tag
+TYPES_SET = f"{SCHED_TAG}:types"            # job types with a backlog
+SINCE_SET = f"{SCHED_TAG}:since"            # zset: flow → last served (UNIX time)
+FLOW_WEIGHTS = f"{SCHED_TAG}:weights"       # hash: flow → weight
+FLOW_TYPES = f"{SCHED_TAG}:flow_types"      # hash: flow → job_type
+VIRTUAL_CLOCK = f"{SCHED_TAG}:vclock"
+QUEUE_DEPTH = f"{SCHED_TAG}:depth"          # total number of queued job IDs
+TYPE_DEPTH_PREFIX = f"{QUEUE_DEPTH}:"       # queued job IDs per job_type (absent when 0)
+DOORBELL = f"{SCHED_TAG}:signal"            # list workers BLPOP on when idle
+SCHEDULED_SET = f"{SCHED_TAG}:delayed"      # zset: job_id → run-at (UNIX time)
+SCHEDULED_META = f"{SCHED_TAG}:delayed_meta"  # hash: job_id → flow metadata
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+PRIORITY_WEIGHTS = {PRIORITY_LOW: 1, PRIORITY_NORMAL: 4, PRIORITY_HIGH: 16}
+
+# Extra weight per job_type, e.g. JOB_TYPE_WEIGHTS='{"report": 0.5}'
+JOB_TYPE_WEIGHTS = json.loads(os.getenv("JOB_TYPE_WEIGHTS", "{}"))
+
+STARVATION_SECONDS = int(os.getenv("STARVATION_SECONDS", 30))
+
+# Most wake-up tokens kept in the doorbell list
+DOORBELL_MAX_TOKENS = 1024
+
+# Most scheduled jobs moved to the ready flows per promoter call
+PROMOTE_BATCH_SIZE = 500
+
+_SCHEDULER_KEYS = [TYPES_SET, SINCE_SET, FLOW_WEIGHTS, FLOW_TYPES, VIRTUAL_CLOCK, QUEUE_DEPTH, DOORBELL]
+
+
+# Shared by the enqueue and promote scripts.
+# KEYS[1..7] are always: types set, since set, weights, flow types,
+# virtual clock, depth counter, doorbell.
+_PUSH_LUA = """
+local types_set, since_set, weights, flow_types = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local vclock, depth, doorbell = KEYS[5], KEYS[6], KEYS[7]
+
+local function push(prefix, flow, job_type, weight, now, at_head, job_ids, max_tokens)
+    local type_flows = prefix .. job_type
+    if not redis.call('ZSCORE', type_flows, flow) then
+        local clock = tonumber(redis.call('GET', vclock) or '0')
+        redis.call('ZADD', type_flows, clock + 1 / weight, flow)
+        redis.call('ZADD', since_set, now, flow)
+        redis.call('HSET', weights, flow, weight)
+        redis.call('HSET', flow_types, flow, job_type)
+        redis.call('SADD', types_set, job_type)
+    end
+
+    for _, job_id in ipairs(job_ids) do
+        if at_head then
+            redis.call('LPUSH', flow, job_id)
+        else
+            redis.call('RPUSH', flow, job_id)
+        end
+    end
+    redis.call('INCRBY', depth, #job_ids)
+    redis.call('INCRBY', depth .. ':' .. job_type, #job_ids)
+
+    for _ = 1, math.min(#job_ids, 64) do
+        redis.call('LPUSH', doorbell, '1')
+    end
+    redis.call('LTRIM', doorbell, 0, max_tokens - 1)
+end
+"""
+
+_ENQUEUE_LUA = _PUSH_LUA + """
+local job_ids = {}
+for i = 7, #ARGV do
+    table.insert(job_ids, ARGV[i])
+end
+push(ARGV[1], KEYS[8], ARGV[2], tonumber(ARGV[3]), ARGV[4], ARGV[5] == '1', job_ids, tonumber(ARGV[6]))
+return #job_ids
+"""
+
+# Moves due entries of the scheduled set into their flows.
+# KEYS[8] = scheduled set, KEYS[9] = scheduled metadata hash
+_PROMOTE_LUA = _PUSH_LUA + """
+local prefix, now, batch, max_tokens = ARGV[1], ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[4])
+local due = redis.call('ZRANGEBYSCORE', KEYS[8], '-inf', now, 'LIMIT', 0, batch)
+for _, job_id in ipairs(due) do
+    local meta = redis.call('HGET', KEYS[9], job_id)
+    redis.call('ZREM', KEYS[8], job_id)
+    redis.call('HDEL', KEYS[9], job_id)
+    if meta then
+        local m = cjson.decode(meta)
+        push(prefix, m.flow, m.job_type, tonumber(m.weight), now, false, {job_id}, max_tokens)
+    end
+end
+return #due
+"""
+
+_DEQUEUE_LUA = """
+local types_set, since_set, weights, flow_types = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local vclock, depth, dest = KEYS[5], KEYS[6], KEYS[7]
+local count, now, starvation = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local prefix = ARGV[4]
+
+-- Optional job type filter: ARGV[5] = 'only' / 'except', types in ARGV[6..]
+local mode = ARGV[5]
+local listed = {}
+for i = 6, #ARGV do
+    listed[ARGV[i]] = true
+end
+local function allowed(job_type)
+    if mode == 'only' then
+        return listed[job_type] == true
+    elseif mode == 'except' then
+        return not listed[job_type]
+    end
+    return true
+end
+
+local picked = {}
+for _ = 1, count do
+    local flow = nil
+
+    -- Starvation bound: a flow not served for too long goes first
+    local starved = redis.call('ZRANGEBYSCORE', since_set, '-inf', now - starvation, 'LIMIT', 0, 32)
+    for _, candidate in ipairs(starved) do
+        if allowed(redis.call('HGET', flow_types, candidate)) then
+            flow = candidate
+            break
+        end
+    end
+
+    if not flow then
+        local best_tag = nil
+        local job_types = {}
+        if mode == 'only' then
+            for i = 6, #ARGV do
+                table.insert(job_types, ARGV[i])
+            end
+        else
+            job_types = redis.call('SMEMBERS', types_set)
+        end
+        for _, job_type in ipairs(job_types) do
+            if allowed(job_type) then
+                local head = redis.call('ZRANGE', prefix .. job_type, 0, 0, 'WITHSCORES')
+                if #head > 0 and (best_tag == nil or tonumber(head[2]) < best_tag) then
+                    flow, best_tag = head[1], tonumber(head[2])
+                end
+            end
+        end
+    end
+
+    if not flow then
+        break
+    end
+
+    local job_type = redis.call('HGET', flow_types, flow)
+    local type_flows = prefix .. job_type
+    local weight = tonumber(redis.call('HGET', weights, flow))
+    local tag = tonumber(redis.call('ZSCORE', type_flows, flow))
+
+    local job_id = redis.call('LMOVE', flow, dest, 'LEFT', 'RIGHT')
+    if job_id then
+        redis.call('DECR', depth)
+        -- Dropped once empty, so retired job types leave no key behind
+        if redis.call('DECR', depth .. ':' .. job_type) <= 0 then
+            redis.call('DEL', depth .. ':' .. job_type)
+        end
+        table.insert(picked, {job_id, flow, job_type, tostring(weight)})
+    end
+
+    if tag > tonumber(redis.call('GET', vclock) or '0') then
+        redis.call('SET', vclock, tostring(tag))
+    end
+
+    if redis.call('LLEN', flow) == 0 then
+        redis.call('ZREM', type_flows, flow)
+        redis.call('ZREM', since_set, flow)
+        redis.call('HDEL', weights, flow)
+        redis.call('HDEL', flow_types, flow)
+        if redis.call('ZCARD', type_flows) == 0 then
+            redis.call('SREM', types_set, job_type)
+        end
+    else
+        redis.call('ZADD', type_flows, tag + 1 / weight, flow)
+        redis.call('ZADD', since_set, now, flow)
+    end
+end
+return picked
+"""
+
+_scripts = weakref.WeakKeyDictionary()
+
+
+def _script(redis_client, name: str, source: str):
+    scripts = _scripts.setdefault(redis_client, {})
+    if name not in scripts:
+        scripts[name] = redis_client.register_script(source)
+    return scripts[name]
+
+
+def flow_key(job_type: str, priority: int, user_id: str) -> str:
+    return f"{FLOW_PREFIX}{job_type}:{priority}:{user_id}"
+
+
+def type_depth_key(job_type: str) -> str:
+    return f"{TYPE_DEPTH_PREFIX}{job_type}"
+
+
+def flow_weight(job_type: str, priority: int) -> float:
+    return PRIORITY_WEIGHTS.get(priority, 1) * JOB_TYPE_WEIGHTS.get(job_type, 1)
+
+
+def push_to_flow(redis_client, flow: str, job_type: str, weight: float, job_ids: list, at_head: bool = False):
+    """
+    Appends job IDs to a flow (or puts them back at its head),
+    activating the flow in the scheduler if it was idle.
+    """
+    return _script(redis_client, "enqueue", _ENQUEUE_LUA)(
+        keys=[*_SCHEDULER_KEYS, flow],
+        args=[
+            TYPE_FLOWS_PREFIX, job_type, weight, time.time(),
+            "1" if at_head else "0", DOORBELL_MAX_TOKENS, *job_ids
+        ]
+    )
+
+
+def enqueue(redis_client, job_type: str, priority: int, user_id: str, job_ids: list, at_head: bool = False):
+    """
+    Queues job IDs that share job_type, priority and owner.
+    """
+    return push_to_flow(
+        redis_client,
+        flow_key(job_type, priority, user_id),
+        job_type,
+        flow_weight(job_type, priority),
+        job_ids,
+        at_head
+    )
+
+
+def dequeue(redis_client, dest: str, count: int, job_types: list = None, exclude_types: list = None):
+    """
+    Moves up to `count` job IDs, chosen by the fair scheduler,
+    into the `dest` list (a worker's processing list).
+    With job_types, only flows of those types are considered;
+    with exclude_types, flows of every other type.
+    Returns [job_id, flow, job_type, weight] entries.
+    """
+    if job_types is not None:
+        type_filter = ["only", *job_types]
+    elif exclude_types:
+        type_filter = ["except", *exclude_types]
+    else:
+        type_filter = [""]
+    return _script(redis_client, "dequeue", _DEQUEUE_LUA)(
+        keys=[TYPES_SET, SINCE_SET, FLOW_WEIGHTS, FLOW_TYPES, VIRTUAL_CLOCK, QUEUE_DEPTH, dest],
+        args=[count, time.time(), STARVATION_SECONDS, TYPE_FLOWS_PREFIX, *type_filter]
+    )
+
+
+def schedule(redis_client, jobs: list):
+    """
+    Parks jobs in the scheduled set until their run-at time.
+    `jobs` holds (job_id, job_type, priority, user_id, run_at) tuples,
+    run_at being a UNIX timestamp. promote_due_jobs() later moves
+    them into their flows.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    for job_id, job_type, priority, user_id, run_at in jobs:
+        pipe.zadd(SCHEDULED_SET, {job_id: run_at})
+        pipe.hset(SCHEDULED_META, job_id, json.dumps({
+            "flow": flow_key(job_type, priority, user_id),
+            "job_type": job_type,
+            "weight": flow_weight(job_type, priority)
+        }))
+    return pipe.execute()
+
+
+def promote_due_jobs(redis_client, batch_size: int = PROMOTE_BATCH_SIZE):
+    """
+    Moves up to batch_size due scheduled jobs into the ready flows
+    in one atomic script call. Returns how many were promoted.
+    """
+    return _script(redis_client, "promote", _PROMOTE_LUA)(
+        keys=[*_SCHEDULER_KEYS, SCHEDULED_SET, SCHEDULED_META],
+        args=[TYPE_FLOWS_PREFIX, time.time(), batch_size, DOORBELL_MAX_TOKENS]
+    )
+
+
+def seconds_until_next_scheduled(redis_client, default: float) -> float:
+    """
+    Time until the earliest scheduled job is due (0 if overdue),
+    or `default` when nothing is scheduled.
+    """
+    earliest = redis_client.zrange(SCHEDULED_SET, 0, 0, withscores=True)
+    if not earliest:
+        return default
+    return max(earliest[0][1] - time.time(), 0)
@@ -0,0 +1,38 @@
+import json
+import os
+import random
+
+# =========================
+# RETRY BACKOFF POLICY
+# =========================
+# Delay before retry attempt n (1-based):
+#     min(max_seconds, base_seconds * factor ** (n - 1)) ± jitter
+#
+# Overridable per job_type, e.g.
+# RETRY_BACKOFF='{"email": {"base_seconds": 5, "max_seconds": 600}}'
+
+DEFAULT_BACKOFF = {
+    "base_seconds": 1,
+    "factor": 2,
+    "max_seconds": 300,
+    "jitter": 0.2,   # ± fraction of the delay
+}
+
+RETRY_BACKOFF = json.loads(os.getenv("RETRY_BACKOFF", "{}"))
+
+
+def backoff_policy(job_type: str) -> dict:
+    return {**DEFAULT_BACKOFF, **RETRY_BACKOFF.get("default", {}), **RETRY_BACKOFF.get(job_type, {})}
+
+
+def retry_delay(job_type: str, attempts: int) -> float:
+    """
+    Seconds to wait before running a job again after `attempts` failures.
+    """
+    policy = backoff_policy(job_type)
+    delay = min(
+        policy["max_seconds"],
+        policy["base_seconds"] * policy["factor"] ** max(attempts - 1, 0)
+    )
+    jitter = delay * policy["jitter"]
+    return max(delay + random.uniform(-jitter, jitter), 0)
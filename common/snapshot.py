@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timezone
+
+# =========================
+# JOB STATUS SNAPSHOTS
+# =========================
+# A Redis hash per job (job:snapshot:<job_id>) holding the fields of
+# GET /jobs/{job_id}, one JSON-encoded value per field, so status polls
+# are answered without PostgreSQL.
+#
+# - Workers and the timeout monitor write the fields they change on
+#   every transition (queue_snapshot_update)
+# - The API fills in missing fields from PostgreSQL on a miss without
+#   overwriting fresher ones (queue_snapshot_fill)
+# - A hash is complete once it has every SNAPSHOT_FIELDS entry
+#
+# Writers queue commands on a blocking or asyncio pipeline, so they
+# share a round trip with the caller's other commands.
+
+SNAPSHOT_PREFIX = "job:snapshot:"
+SNAPSHOT_TTL_SECONDS = 3600
+
+SNAPSHOT_FIELDS = (
+    "job_id", "user_id", "job_type", "status", "attempts", "created_at",
+    "started_at", "finished_at", "run_at", "last_error", "result"
+)
+
+
+def snapshot_key(job_id: str) -> str:
+    return f"{SNAPSHOT_PREFIX}{job_id}"
+
+
+def _encode(value) -> str:
+    if isinstance(value, datetime):
+        # Same shape as the naive UTC timestamps stored in PostgreSQL
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        value = value.isoformat()
+    return json.dumps(value)
+
+
+def queue_snapshot_update(pipe, job_id: str, fields: dict):
+    """
+    Queues an overwrite of the given snapshot fields on a pipeline
+    the caller executes (usually together with the job update publish).
+    """
+    key = snapshot_key(job_id)
+    pipe.hset(key, mapping={name: _encode(value) for name, value in fields.items()})
+    pipe.expire(key, SNAPSHOT_TTL_SECONDS)
+
+
+def queue_snapshot_fill(pipe, job_id: str, fields: dict):
+    """
+    Queues setting only the fields the snapshot does not have yet, so
+    values read from PostgreSQL never replace a newer transition.
+    The last queued command returns the merged hash (see decode_snapshot).
+    """
+    key = snapshot_key(job_id)
+    for name, value in fields.items():
+        pipe.hsetnx(key, name, _encode(value))
+    pipe.expire(key, SNAPSHOT_TTL_SECONDS)
+    pipe.hgetall(key)
+
+
+def delete_snapshots(redis_client, job_ids: list):
+    """
+    Drops snapshots, e.g. after bulk transitions by the reaper or
+    recovery; the next read rebuilds them from PostgreSQL.
+    """
+    return redis_client.delete(*(snapshot_key(job_id) for job_id in job_ids))
+
+
+def decode_snapshot(raw: dict):
+    """
+    Decoded snapshot, or None if the hash is missing or incomplete.
+    """
+    if not raw or any(name not in raw for name in SNAPSHOT_FIELDS):
+        return None
+    return {name: json.loads(raw[name]) for name in SNAPSHOT_FIELDS}
@@ -0,0 +1,357 @@
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# =========================
+# REDIS-BACKED JOB COUNTERS
+# =========================
+# Updated by the API and the workers on every job state transition,
+# so /metrics can be answered without touching PostgreSQL.
+#
+# Writers accept either a blocking redis.Redis or a redis.asyncio.Redis
+# client: they return the pipeline's execute() result, which async
+# callers must await.
+
+JOB_STATUSES = ("PENDING", "QUEUED", "RUNNING", "RETRYING", "COMPLETED", "FAILED")
+
+# Hash: status → number of jobs currently in that status
+JOB_COUNTS_KEY = "metrics:job_counts"
+
+# Hash: execution time histogram (count, sum, one field per bucket)
+EXECUTION_TIME_KEY = "metrics:execution_time"
+EXECUTION_TIME_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Completed jobs per THROUGHPUT_SLOT_SECONDS slot: metrics:completed:<slot>
+THROUGHPUT_PREFIX = "metrics:completed:"
+THROUGHPUT_SLOT_SECONDS = 10
+THROUGHPUT_RETENTION_SECONDS = 3600
+
+
+def _bucket_field(seconds: float) -> str:
+    for bound in EXECUTION_TIME_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+def record_transition(
+    redis_client,
+    old_status: str,
+    new_status: str,
+    count: int = 1,
+    execution_seconds: float = None
+):
+    """
+    Moves `count` jobs from old_status to new_status in the counters.
+    old_status=None records newly created jobs.
+
+    Only call it for rows a committed UPDATE actually changed (e.g.
+    counted from its RETURNING rows): the counters are not clamped,
+    so a transition recorded twice shows up as drift.
+
+    When execution_seconds is given (COMPLETED jobs) it is also added
+    to the execution time histogram and the throughput counters.
+    All updates go out in one pipelined round trip.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+
+    if old_status:
+        pipe.hincrby(JOB_COUNTS_KEY, old_status, -count)
+    pipe.hincrby(JOB_COUNTS_KEY, new_status, count)
+
+    if new_status == "COMPLETED":
+        slot = int(time.time()) // THROUGHPUT_SLOT_SECONDS
+        key = f"{THROUGHPUT_PREFIX}{slot}"
+        pipe.incrby(key, count)
+        pipe.expire(key, THROUGHPUT_RETENTION_SECONDS)
+
+    if execution_seconds is not None:
+        pipe.hincrby(EXECUTION_TIME_KEY, "count", 1)
+        pipe.hincrbyfloat(EXECUTION_TIME_KEY, "sum", execution_seconds)
+        pipe.hincrby(EXECUTION_TIME_KEY, _bucket_field(execution_seconds), 1)
+
+    return pipe.execute()
+
+
+def record_removal(redis_client, counts: dict):
+    """
+    Drops jobs that left the jobs table (e.g. archived) from the
+    status counters; counts is {status: number of jobs}.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for status, count in counts.items():
+        pipe.hincrby(JOB_COUNTS_KEY, status, -count)
+    return pipe.execute()
+
+
+def reset_job_counts(redis_client, counts: dict):
+    """
+    Overwrites the status counters with absolute values
+    (e.g. computed from PostgreSQL at API startup).
+    """
+    return redis_client.hset(
+        JOB_COUNTS_KEY,
+        mapping={status: counts.get(status, 0) for status in JOB_STATUSES}
+    )
+
+
+def _counters_pipeline(redis_client, window_minutes: int):
+    slots = (window_minutes * 60) // THROUGHPUT_SLOT_SECONDS
+    current = int(time.time()) // THROUGHPUT_SLOT_SECONDS
+    throughput_keys = [f"{THROUGHPUT_PREFIX}{current - i}" for i in range(slots)]
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(JOB_COUNTS_KEY)
+    pipe.hmget(EXECUTION_TIME_KEY, "count", "sum")
+    pipe.mget(throughput_keys)
+    return pipe
+
+
+def read_counters(redis_client, window_minutes: int = 1) -> dict:
+    """
+    Reads counts, average execution time and throughput
+    with a single pipelined round trip.
+    """
+    results = _counters_pipeline(redis_client, window_minutes).execute()
+    return _parse_counters(results, window_minutes)
+
+
+async def read_counters_async(redis_client, window_minutes: int = 1) -> dict:
+    """
+    read_counters() for a redis.asyncio client.
+    """
+    results = await _counters_pipeline(redis_client, window_minutes).execute()
+    return _parse_counters(results, window_minutes)
+
+
+def _parse_counters(results: list, window_minutes: int) -> dict:
+    counts, (exec_count, exec_sum), completed = results
+
+    exec_count = int(exec_count or 0)
+    avg = round(float(exec_sum) / exec_count, 2) if exec_count else 0
+
+    return {
+        "job_counts": {
+            status.lower(): int(counts.get(status, 0))
+            for status in JOB_STATUSES
+        },
+        "avg_execution_time_seconds": avg,
+        "throughput": {
+            "jobs_per_minute": sum(int(c) for c in completed if c),
+            "window_minutes": window_minutes
+        }
+    }
+
+
+# =========================
+# PROMETHEUS HISTOGRAMS, GAUGES & COUNTERS
+# =========================
+# Observations are aggregated in-process by a MetricsBuffer and
+# flushed to Redis periodically, so every API/worker process
+# contributes to one cluster-wide set of series.
+
+HISTOGRAM_PREFIX = "prom:hist:"
+GAUGE_PREFIX = "prom:gauge:"
+COUNTER_PREFIX = "prom:counter:"
+
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+HISTOGRAMS = {
+    "job_queue_wait_seconds": "Time from enqueue to execution start",
+    "job_execution_seconds": "Time spent executing job logic",
+    "job_db_commit_seconds": "Latency of job state commits",
+    "worker_dequeue_seconds": "Time to obtain a batch of job IDs",
+    "worker_redis_call_seconds": "Latency of worker Redis calls",
+    "worker_db_call_seconds": "Latency of worker database queries",
+}
+
+GAUGES = {
+    "worker_jobs_in_flight": "Execution slots currently in use",
+    "worker_concurrency_limit": "Configured execution slots",
+    "autoscaler_workers": "Worker processes run by the autoscaler",
+    "autoscaler_desired_workers": "Fleet size chosen by the last autoscaler decision",
+    "autoscaler_queue_depth": "Queued jobs seen by the autoscaler",
+    "autoscaler_queue_wait_seconds": "Mean queue wait over the last autoscaler interval",
+    "autoscaler_utilization": "Share of the fleet's execution slots in use",
+}
+
+COUNTERS = {
+    "autoscaler_scale_events_total": "Scaling decisions taken since the autoscaler started",
+}
+
+
+def _escape_label(value) -> str:
+    # Text exposition format: backslash, double quote and newline
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    return ",".join(f'{key}="{_escape_label(value)}"' for key, value in sorted(labels.items()))
+
+
+class MetricsBuffer:
+    """
+    Thread-safe in-process aggregation of histogram observations.
+    flush() writes the accumulated deltas to Redis in one pipeline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(float)
+
+    def observe(self, name: str, seconds: float, **labels):
+        label_str = format_labels(labels)
+        bucket = next((b for b in LATENCY_BUCKETS if seconds <= b), "+Inf")
+        with self._lock:
+            self._deltas[(name, f"{label_str}|{bucket}")] += 1
+            self._deltas[(name, f"{label_str}|sum")] += seconds
+            self._deltas[(name, f"{label_str}|count")] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _flush_pipeline(self, redis_client):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(float)
+        if not deltas:
+            return None
+        pipe = redis_client.pipeline(transaction=False)
+        for (name, field), value in deltas.items():
+            pipe.hincrbyfloat(f"{HISTOGRAM_PREFIX}{name}", field, value)
+        return pipe
+
+    def flush(self, redis_client):
+        pipe = self._flush_pipeline(redis_client)
+        if pipe is not None:
+            pipe.execute()
+
+    async def flush_async(self, redis_client):
+        """
+        flush() for a redis.asyncio client.
+        """
+        pipe = self._flush_pipeline(redis_client)
+        if pipe is not None:
+            await pipe.execute()
+
+
+def set_gauges(redis_client, values: dict, **labels):
+    """
+    Sets several gauges ({name: value}) for one label set.
+    """
+    label_str = format_labels(labels)
+    pipe = redis_client.pipeline(transaction=False)
+    for name, value in values.items():
+        pipe.hset(f"{GAUGE_PREFIX}{name}", label_str, value)
+    return pipe.execute()
+
+
+def clear_gauges(redis_client, names, **labels):
+    label_str = format_labels(labels)
+    pipe = redis_client.pipeline(transaction=False)
+    for name in names:
+        pipe.hdel(f"{GAUGE_PREFIX}{name}", label_str)
+    return pipe.execute()
+
+
+def increment_counter(redis_client, name: str, amount: float = 1, **labels):
+    return redis_client.hincrbyfloat(f"{COUNTER_PREFIX}{name}", format_labels(labels), amount)
+
+
+def clear_counters(redis_client, names, **labels):
+    label_str = format_labels(labels)
+    pipe = redis_client.pipeline(transaction=False)
+    for name in names:
+        pipe.hdel(f"{COUNTER_PREFIX}{name}", label_str)
+    return pipe.execute()
+
+
+def _series(name: str, labels: str, value) -> str:
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+def _render_histogram(name: str, fields: dict) -> list:
+    by_labels = defaultdict(dict)
+    for field, value in fields.items():
+        labels, _, suffix = field.rpartition("|")
+        by_labels[labels][suffix] = float(value)
+
+    lines = [f"# HELP {name} {HISTOGRAMS[name]}", f"# TYPE {name} histogram"]
+    for labels, values in sorted(by_labels.items()):
+        prefix = f"{labels}," if labels else ""
+        cumulative = 0
+        for bound in LATENCY_BUCKETS:
+            cumulative += values.get(str(bound), 0)
+            lines.append(_series(f"{name}_bucket", f'{prefix}le="{bound}"', int(cumulative)))
+        lines.append(_series(f"{name}_bucket", f'{prefix}le="+Inf"', int(values.get("count", 0))))
+        lines.append(_series(f"{name}_sum", labels, values.get("sum", 0)))
+        lines.append(_series(f"{name}_count", labels, int(values.get("count", 0))))
+    return lines
+
+
+def _prometheus_pipeline(redis_client):
+    pipe = redis_client.pipeline(transaction=False)
+    for name in HISTOGRAMS:
+        pipe.hgetall(f"{HISTOGRAM_PREFIX}{name}")
+    for name in GAUGES:
+        pipe.hgetall(f"{GAUGE_PREFIX}{name}")
+    for name in COUNTERS:
+        pipe.hgetall(f"{COUNTER_PREFIX}{name}")
+    pipe.hgetall(JOB_COUNTS_KEY)
+    return pipe
+
+
+def render_prometheus(redis_client, extra_gauges: dict = None, extra_counters: dict = None) -> str:
+    """
+    Renders every histogram, gauge, counter and job status count
+    in the Prometheus text exposition format.
+    extra_gauges / extra_counters are {name: (help, value)} series
+    local to the calling process.
+    """
+    results = _prometheus_pipeline(redis_client).execute()
+    return _format_prometheus(results, extra_gauges, extra_counters)
+
+
+async def render_prometheus_async(redis_client, extra_gauges: dict = None, extra_counters: dict = None) -> str:
+    """
+    render_prometheus() for a redis.asyncio client.
+    """
+    results = await _prometheus_pipeline(redis_client).execute()
+    return _format_prometheus(results, extra_gauges, extra_counters)
+
+
+def _format_prometheus(results: list, extra_gauges: dict, extra_counters: dict = None) -> str:
+    lines = []
+    for name, fields in zip(HISTOGRAMS, results):
+        lines.extend(_render_histogram(name, fields))
+
+    series = results[len(HISTOGRAMS):-1]
+    for metric_type, metrics in (("gauge", GAUGES), ("counter", COUNTERS)):
+        for name, fields in zip(metrics, series):
+            lines.append(f"# HELP {name} {metrics[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(fields.items()):
+                lines.append(_series(name, labels, value))
+        series = series[len(metrics):]
+
+    counts = results[-1]
+    lines.append("# HELP jobs_by_status Number of jobs in each status")
+    lines.append("# TYPE jobs_by_status gauge")
+    for status in JOB_STATUSES:
+        lines.append(_series("jobs_by_status", f'status="{status}"', int(counts.get(status, 0))))
+
+    for metric_type, extra in (("gauge", extra_gauges), ("counter", extra_counters)):
+        for name, (help_text, value) in (extra or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(_series(name, "", value))
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,151 @@
+import fakeredis
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import worker.dependencies as dependencies
+from common.dag import (
+    register_dependents,
+    release_dependents,
+    mark_finishing,
+    unsettled_dependents,
+    DAG_PARENTS,
+    DAG_FINISHING
+)
+from common.models import Base, Job
+from common.queue import flow_key
+
+# Runs the DAG scripts on fakeredis (Lua through lupa) and the row
+# updates on SQLite; no Redis server or PostgreSQL needed.
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def _child(job_id: str, *parents: str):
+    return (job_id, list(parents), "report", 1, "alice", None)
+
+
+def _queued(redis_client) -> list:
+    return redis_client.lrange(flow_key("report", 1, "alice"), 0, -1)
+
+
+def _add_jobs(session_factory, **statuses):
+    with session_factory() as db:
+        db.execute(insert(Job), [
+            {"id": job_id, "user_id": "alice", "job_type": "report", "payload": {}, "status": status}
+            for job_id, status in statuses.items()
+        ])
+        db.commit()
+
+
+def _status(session_factory, job_id: str) -> str:
+    with session_factory() as db:
+        return db.execute(select(Job.status).where(Job.id == job_id)).scalar_one()
+
+
+def test_child_is_queued_once_its_last_parent_completes(redis_client):
+    assert register_dependents(redis_client, [_child("c", "p1", "p2")]) == [[], [], []]
+
+    assert release_dependents(redis_client, "p1", "COMPLETED") == [[], []]
+    assert _queued(redis_client) == []
+
+    assert release_dependents(redis_client, "p2", "COMPLETED") == [["c"], []]
+    assert _queued(redis_client) == ["c"]
+    assert redis_client.smembers(DAG_PARENTS) == set()
+
+    # A second call for the same parent is a no-op
+    assert release_dependents(redis_client, "p2", "COMPLETED") == [[], []]
+    assert _queued(redis_client) == ["c"]
+
+
+def test_failed_parent_fails_every_waiting_descendant(redis_client):
+    register_dependents(redis_client, [_child("c", "p"), _child("g", "c"), _child("other", "q")])
+
+    ready, failed = release_dependents(redis_client, "p", "FAILED")
+
+    assert ready == []
+    assert sorted(failed) == ["c", "g"]
+    assert _queued(redis_client) == []
+    # Both stay unsettled until their rows are updated
+    assert set(unsettled_dependents(redis_client, float("inf"))) == {"c", "g"}
+    assert redis_client.smembers(DAG_PARENTS) == {"q"}
+
+
+def test_child_registered_after_its_parent_finished(redis_client):
+    release_dependents(redis_client, "done", "COMPLETED")
+    release_dependents(redis_client, "broken", "FAILED")
+
+    ready, failed, failed_parents = register_dependents(redis_client, [
+        _child("a", "done"),
+        _child("b", "done", "broken")
+    ])
+
+    assert ready == ["a"]
+    assert (failed, failed_parents) == (["b"], ["broken"])
+    assert _queued(redis_client) == ["a"]
+
+
+def test_only_parents_with_waiting_children_are_marked(redis_client):
+    register_dependents(redis_client, [_child("c", "p")])
+    redis_client.delete(DAG_FINISHING)
+
+    assert mark_finishing(redis_client, ["p", "lonely"]) == 1
+    assert redis_client.zrange(DAG_FINISHING, 0, -1) == ["p"]
+
+    # Releasing the parent clears its mark
+    release_dependents(redis_client, "p", "COMPLETED")
+    assert redis_client.zcard(DAG_FINISHING) == 0
+
+
+def test_recovery_redoes_a_release_cut_short(redis_client, session_factory, monkeypatch):
+    monkeypatch.setattr(dependencies, "RECOVERY_GRACE_SECONDS", -1)
+    _add_jobs(session_factory, p="COMPLETED", c="PENDING")
+    register_dependents(redis_client, [_child("c", "p")])
+    # The worker committed p's outcome, then died before releasing c
+    mark_finishing(redis_client, ["p"])
+
+    assert dependencies.recover_dependents(redis_client, session_factory) == 1
+
+    assert _status(session_factory, "c") == "QUEUED"
+    assert _queued(redis_client) == ["c"]
+    assert redis_client.zcard(DAG_FINISHING) == 0
+    assert unsettled_dependents(redis_client, float("inf")) == {}
+
+    # Nothing left to recover
+    assert dependencies.recover_dependents(redis_client, session_factory) == 0
+
+
+def test_recovery_drops_marks_of_outcomes_never_committed(redis_client, session_factory, monkeypatch):
+    monkeypatch.setattr(dependencies, "RECOVERY_GRACE_SECONDS", -1)
+    _add_jobs(session_factory, p="RUNNING", c="PENDING")
+    register_dependents(redis_client, [_child("c", "p")])
+    mark_finishing(redis_client, ["p"])
+
+    assert dependencies.recover_dependents(redis_client, session_factory) == 0
+
+    assert redis_client.zcard(DAG_FINISHING) == 0
+    assert _status(session_factory, "c") == "PENDING"
+    assert redis_client.smembers(DAG_PARENTS) == {"p"}
+
+
+def test_recovery_settles_children_whose_row_update_failed(redis_client, session_factory, monkeypatch):
+    monkeypatch.setattr(dependencies, "RECOVERY_GRACE_SECONDS", -1)
+    _add_jobs(session_factory, p="FAILED", c="PENDING")
+    register_dependents(redis_client, [_child("c", "p")])
+    # Released in Redis, but the row update never committed
+    release_dependents(redis_client, "p", "FAILED")
+
+    assert dependencies.recover_dependents(redis_client, session_factory) == 1
+
+    assert _status(session_factory, "c") == "FAILED"
+    assert unsettled_dependents(redis_client, float("inf")) == {}
@@ -0,0 +1,122 @@
+import asyncio
+
+import fakeredis
+import pytest
+from redis.crc import key_slot
+
+import common.memo as memo
+from common.memo import (
+    memo_key,
+    memo_job_key,
+    memo_lru_key,
+    claim_memo_entries,
+    confirm_memo_entries,
+    forget_memo_entries,
+    finish_memo_entry,
+    finish_memo_entry_async,
+    decode_memo,
+    MEMO_CLAIM_TTL_SECONDS
+)
+
+
+@pytest.fixture(autouse=True)
+def memoized(monkeypatch):
+    monkeypatch.setattr(memo, "MEMOIZE_JOB_TYPES", {"report": {"ttl_seconds": 3600, "max_entries": 2}})
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _entry(job_id: str, payload: dict = None, user_id: str = "alice"):
+    return (memo_key(user_id, "report", payload or {"n": 1}), job_id, "report")
+
+
+def _claim(redis_client, *entries):
+    return [decode_memo(raw) for raw in claim_memo_entries(redis_client, "report", list(entries))]
+
+
+def test_keys_of_a_job_type_share_one_slot():
+    entry = _entry("job-1")
+    keys = [entry[0], memo_key("bob", "report", {"other": True}), memo_job_key("report", "job-1"), memo_lru_key("report")]
+    assert len({key_slot(key.encode()) for key in keys}) == 1
+
+
+def test_payload_key_order_does_not_matter():
+    assert memo_key("alice", "report", {"a": 1, "b": 2}) == memo_key("alice", "report", {"b": 2, "a": 1})
+    assert memo_key("alice", "report", {"a": 1}) != memo_key("bob", "report", {"a": 1})
+
+
+def test_identical_submission_coalesces_onto_the_job_in_flight(redis_client):
+    assert _claim(redis_client, _entry("job-1")) == [None]
+    assert _claim(redis_client, _entry("job-2")) == [{"job_id": "job-1", "status": "QUEUED"}]
+    # Within one call too
+    assert _claim(redis_client, _entry("job-3", {"n": 2}), _entry("job-4", {"n": 2})) == [
+        None, {"job_id": "job-3", "status": "QUEUED"}
+    ]
+
+
+def test_claim_lives_briefly_until_confirmed(redis_client):
+    entry = _entry("job-1")
+    _claim(redis_client, entry)
+    assert 0 < redis_client.ttl(entry[0]) <= MEMO_CLAIM_TTL_SECONDS
+
+    confirm_memo_entries(redis_client, "report", [entry])
+    assert redis_client.ttl(entry[0]) > MEMO_CLAIM_TTL_SECONDS
+    assert redis_client.ttl(memo_job_key("report", "job-1")) > MEMO_CLAIM_TTL_SECONDS
+
+
+def test_forget_drops_only_its_own_claim(redis_client):
+    entry = _entry("job-1")
+    _claim(redis_client, entry)
+
+    forget_memo_entries(redis_client, "report", [_entry("job-2")])
+    assert redis_client.exists(entry[0])
+
+    forget_memo_entries(redis_client, "report", [entry])
+    assert not redis_client.exists(entry[0], memo_job_key("report", "job-1"))
+
+
+def test_completed_job_answers_later_submissions(redis_client):
+    entry = _entry("job-1")
+    _claim(redis_client, entry)
+    finish_memo_entry(redis_client, "job-1", "report", "COMPLETED")
+
+    assert _claim(redis_client, _entry("job-2")) == [{"job_id": "job-1", "status": "COMPLETED"}]
+    assert redis_client.ttl(entry[0]) > MEMO_CLAIM_TTL_SECONDS
+    assert not redis_client.exists(memo_job_key("report", "job-1"))
+
+
+def test_failed_job_is_forgotten(redis_client):
+    _claim(redis_client, _entry("job-1"))
+    finish_memo_entry(redis_client, "job-1", "report", "FAILED")
+
+    assert _claim(redis_client, _entry("job-2")) == [None]
+
+
+def test_least_recently_used_entries_are_evicted(redis_client):
+    for i in range(3):
+        _claim(redis_client, _entry(f"job-{i}", {"n": i}))
+    finish_memo_entry(redis_client, "job-0", "report", "COMPLETED")
+    finish_memo_entry(redis_client, "job-1", "report", "COMPLETED")
+    # A hit makes job-0 the most recently used
+    assert _claim(redis_client, _entry("again", {"n": 0}))[0]["job_id"] == "job-0"
+
+    finish_memo_entry(redis_client, "job-2", "report", "COMPLETED")
+
+    assert redis_client.zcard(memo_lru_key("report")) == 2
+    assert not redis_client.exists(_entry("job-1", {"n": 1})[0])
+    assert _claim(redis_client, _entry("new", {"n": 1})) == [None]
+    assert _claim(redis_client, _entry("hit", {"n": 0}))[0]["job_id"] == "job-0"
+
+
+def test_finish_with_an_asyncio_client():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await claim_memo_entries(redis_client, "report", [_entry("job-1")])
+        await finish_memo_entry_async(redis_client, "job-1", "report", "COMPLETED")
+        raws = await claim_memo_entries(redis_client, "report", [_entry("job-2")])
+        return [decode_memo(raw) for raw in raws]
+
+    assert asyncio.run(scenario()) == [{"job_id": "job-1", "status": "COMPLETED"}]
@@ -0,0 +1,145 @@
+import time
+
+import fakeredis
+import pytest
+
+import common.queue as queue
+from common.constants import PROCESSING_LIST_PREFIX
+from common.queue import (
+    enqueue,
+    dequeue,
+    schedule,
+    promote_due_jobs,
+    seconds_until_next_scheduled,
+    flow_key,
+    type_depth_key,
+    QUEUE_DEPTH,
+    SINCE_SET,
+    TYPES_SET,
+    SCHEDULED_SET,
+    SCHEDULED_META,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    PRIORITY_HIGH
+)
+
+# Runs the scheduler scripts on fakeredis (Lua through lupa); no Redis
+# server needed.
+
+PROCESSING = f"{PROCESSING_LIST_PREFIX}test"
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _ids(picked: list) -> list:
+    return [job_id for job_id, _, _, _ in picked]
+
+
+def test_type_depth_key_is_dropped_once_drained(redis_client):
+    enqueue(redis_client, "report", 1, "alice", ["a", "b"])
+    enqueue(redis_client, "email", 1, "alice", ["c"])
+    assert redis_client.get(type_depth_key("report")) == "2"
+
+    dequeue(redis_client, PROCESSING, 3)
+
+    assert not redis_client.exists(type_depth_key("report"), type_depth_key("email"))
+    assert redis_client.get(QUEUE_DEPTH) == "0"
+
+
+def test_flows_of_equal_weight_are_served_in_turn(redis_client):
+    enqueue(redis_client, "report", PRIORITY_NORMAL, "alice", [f"a{i}" for i in range(10)])
+    enqueue(redis_client, "report", PRIORITY_NORMAL, "bob", ["b0", "b1"])
+
+    picked = _ids(dequeue(redis_client, PROCESSING, 4))
+
+    # Bob's two jobs do not wait behind Alice's backlog; each flow is FIFO
+    assert sorted(picked) == ["a0", "a1", "b0", "b1"]
+    assert picked.index("a0") < picked.index("a1")
+    assert picked.index("b0") < picked.index("b1")
+    assert redis_client.lrange(PROCESSING, 0, -1) == picked
+
+
+def test_flows_are_served_in_proportion_to_their_weight(redis_client):
+    enqueue(redis_client, "report", PRIORITY_HIGH, "alice", [f"h{i}" for i in range(40)])
+    enqueue(redis_client, "report", PRIORITY_LOW, "bob", [f"l{i}" for i in range(40)])
+
+    picked = _ids(dequeue(redis_client, PROCESSING, 34))
+
+    lows = [job_id for job_id in picked if job_id.startswith("l")]
+    assert len(lows) == 2
+    assert all(job_id.startswith("h") for job_id in picked[:10])
+
+
+def test_starved_flow_goes_first(redis_client, monkeypatch):
+    monkeypatch.setattr(queue, "STARVATION_SECONDS", 30)
+    enqueue(redis_client, "report", PRIORITY_HIGH, "alice", [f"h{i}" for i in range(5)])
+    enqueue(redis_client, "report", PRIORITY_LOW, "bob", ["l0"])
+    assert _ids(dequeue(redis_client, PROCESSING, 1)) == ["h0"]
+
+    # Bob's flow has not been served for longer than the bound
+    redis_client.zadd(SINCE_SET, {flow_key("report", PRIORITY_LOW, "bob"): time.time() - 60})
+
+    assert _ids(dequeue(redis_client, PROCESSING, 1)) == ["l0"]
+
+
+def test_job_type_filters(redis_client):
+    enqueue(redis_client, "report", PRIORITY_NORMAL, "alice", ["r0"])
+    enqueue(redis_client, "email", PRIORITY_NORMAL, "alice", ["e0"])
+    enqueue(redis_client, "export", PRIORITY_NORMAL, "alice", ["x0"])
+
+    assert _ids(dequeue(redis_client, PROCESSING, 3, job_types=["email"])) == ["e0"]
+    assert _ids(dequeue(redis_client, PROCESSING, 3, exclude_types=["export"])) == ["r0"]
+    assert _ids(dequeue(redis_client, PROCESSING, 3)) == ["x0"]
+
+
+def test_drained_flows_leave_the_scheduler(redis_client):
+    enqueue(redis_client, "report", PRIORITY_NORMAL, "alice", ["a0"])
+
+    picked = dequeue(redis_client, PROCESSING, 5)
+
+    assert picked == [["a0", flow_key("report", PRIORITY_NORMAL, "alice"), "report", "4"]]
+    assert redis_client.scard(TYPES_SET) == 0
+    assert redis_client.zcard(SINCE_SET) == 0
+    assert dequeue(redis_client, PROCESSING, 1) == []
+
+
+def test_due_scheduled_jobs_are_promoted_into_their_flows(redis_client):
+    now = time.time()
+    schedule(redis_client, [
+        ("due", "report", PRIORITY_NORMAL, "alice", now - 1),
+        ("later", "report", PRIORITY_NORMAL, "alice", now + 3600)
+    ])
+
+    assert promote_due_jobs(redis_client) == 1
+
+    assert redis_client.lrange(flow_key("report", PRIORITY_NORMAL, "alice"), 0, -1) == ["due"]
+    assert redis_client.get(type_depth_key("report")) == "1"
+    assert redis_client.zrange(SCHEDULED_SET, 0, -1) == ["later"]
+    assert redis_client.hkeys(SCHEDULED_META) == ["later"]
+    assert _ids(dequeue(redis_client, PROCESSING, 5)) == ["due"]
+
+
+def test_promotion_is_batched(redis_client):
+    now = time.time()
+    schedule(redis_client, [(f"j{i}", "report", PRIORITY_NORMAL, "alice", now - 10 + i) for i in range(5)])
+
+    assert promote_due_jobs(redis_client, batch_size=2) == 2
+    assert promote_due_jobs(redis_client, batch_size=2) == 2
+    assert promote_due_jobs(redis_client, batch_size=2) == 1
+    assert promote_due_jobs(redis_client, batch_size=2) == 0
+
+    # Earliest run-at first
+    assert redis_client.lrange(flow_key("report", PRIORITY_NORMAL, "alice"), 0, -1) == [f"j{i}" for i in range(5)]
+
+
+def test_seconds_until_next_scheduled(redis_client):
+    assert seconds_until_next_scheduled(redis_client, 5.0) == 5.0
+
+    schedule(redis_client, [("later", "report", PRIORITY_NORMAL, "alice", time.time() + 30)])
+    assert 29 < seconds_until_next_scheduled(redis_client, 5.0) <= 30
+
+    schedule(redis_client, [("overdue", "report", PRIORITY_NORMAL, "alice", time.time() - 30)])
+    assert seconds_until_next_scheduled(redis_client, 5.0) == 0
@@ -0,0 +1,116 @@
+import asyncio
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+from redis.crc import key_slot
+
+import api.rate_limiter as rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "async_redis_client", fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(rate_limiter, "_script", None)
+    monkeypatch.setattr(rate_limiter, "_local_blocks", type(rate_limiter._local_blocks)())
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT", 5)
+    monkeypatch.setattr(rate_limiter, "BULK_RATE_LIMIT", 100)
+    monkeypatch.setattr(rate_limiter, "WINDOW_SECONDS", 60)
+    monkeypatch.setattr(rate_limiter, "JOB_TYPE_RATE_LIMITS", {"report": 2})
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_LOCAL_PRECHECK", False)
+
+
+def _check(job_type_costs: dict, user_id: str = "alice", bulk: bool = False):
+    """
+    (status code, headers) of one submission.
+    """
+    async def check():
+        try:
+            status = await rate_limiter.check_rate_limit(user_id, job_type_costs, bulk)
+        except HTTPException as error:
+            return error.status_code, error.headers or {}
+        return 200, status.headers()
+
+    return asyncio.run(check())
+
+
+def test_bucket_keys_of_a_user_share_one_slot():
+    keys = [key for key, _, _ in rate_limiter._buckets("alice", {"report": 1, "other": 1})]
+    keys += [key for key, _, _ in rate_limiter._buckets("alice", {"other": 1}, bulk=True)]
+    assert len(set(keys)) == 3
+    assert len({key_slot(key.encode()) for key in keys}) == 1
+
+
+def test_burst_up_to_capacity_then_429():
+    for remaining in (4, 3, 2, 1, 0):
+        code, headers = _check({"other": 1})
+        assert code == 200
+        assert headers["X-RateLimit-Limit"] == "5"
+        assert headers["X-RateLimit-Remaining"] == str(remaining)
+
+    code, headers = _check({"other": 1})
+    assert code == 429
+    # One token refills in WINDOW_SECONDS / RATE_LIMIT seconds
+    assert headers["Retry-After"] == "12"
+    assert headers["X-RateLimit-Remaining"] == "0"
+
+
+def test_users_have_separate_buckets():
+    for _ in range(5):
+        _check({"other": 1}, user_id="alice")
+    assert _check({"other": 1}, user_id="bob")[0] == 200
+
+
+def test_headers_describe_the_bucket_closest_to_empty():
+    code, headers = _check({"report": 1})
+    assert code == 200
+    assert (headers["X-RateLimit-Limit"], headers["X-RateLimit-Remaining"]) == ("2", "1")
+
+    code, headers = _check({"other": 1})
+    assert (headers["X-RateLimit-Limit"], headers["X-RateLimit-Remaining"]) == ("5", "3")
+
+
+def test_rejected_submission_charges_no_bucket():
+    _check({"report": 2})
+    assert _check({"report": 1, "other": 1})[0] == 429
+
+    # The user bucket was not charged for the rejected submission
+    code, headers = _check({"other": 3})
+    assert code == 200
+    assert headers["X-RateLimit-Remaining"] == "0"
+
+
+def test_local_precheck_rejects_with_headers(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_LOCAL_PRECHECK", True)
+    _check({"report": 2})
+    assert _check({"report": 1})[0] == 429
+
+    # Answered from the local block, no Redis round trip
+    monkeypatch.setattr(rate_limiter, "async_redis_client", None)
+    monkeypatch.setattr(rate_limiter, "_script", None)
+    code, headers = _check({"report": 1})
+    assert code == 429
+    assert headers["X-RateLimit-Limit"] == "2"
+    assert headers["X-RateLimit-Remaining"] == "0"
+    assert int(headers["Retry-After"]) >= 1
+
+
+def test_batch_larger_than_rate_limit_uses_bulk_bucket():
+    code, headers = _check({"other": 50}, bulk=True)
+    assert code == 200
+    assert (headers["X-RateLimit-Limit"], headers["X-RateLimit-Remaining"]) == ("100", "50")
+
+    # Single submissions have their own bucket
+    assert _check({"other": 5})[0] == 200
+    assert _check({"other": 50}, bulk=True)[0] == 200
+    assert _check({"other": 1}, bulk=True)[0] == 429
+
+
+def test_submission_above_capacity_is_413():
+    assert _check({"other": 101}, bulk=True)[0] == 413
+    assert _check({"other": 6})[0] == 413
+    assert _check({"report": 3, "other": 1}, bulk=True)[0] == 413
+
+    # Nothing was charged
+    code, headers = _check({"other": 100}, bulk=True)
+    assert code == 200
@@ -0,0 +1,33 @@
+import pytest
+
+import common.retry as retry
+from common.retry import retry_delay
+
+
+@pytest.fixture(autouse=True)
+def no_overrides(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BACKOFF", {})
+
+
+def test_delay_grows_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setitem(retry.DEFAULT_BACKOFF, "jitter", 0)
+
+    assert [retry_delay("report", attempts) for attempts in (1, 2, 3, 4)] == [1, 2, 4, 8]
+    assert retry_delay("report", 20) == 300
+
+
+def test_delay_is_jittered_within_bounds():
+    delays = [retry_delay("report", 3) for _ in range(200)]
+
+    assert all(3.2 <= delay <= 4.8 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_policy_overrides_per_job_type(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BACKOFF", {
+        "default": {"jitter": 0},
+        "email": {"base_seconds": 5, "max_seconds": 12}
+    })
+
+    assert [retry_delay("email", attempts) for attempts in (1, 2, 3)] == [5, 10, 12]
+    assert retry_delay("report", 2) == 2
@@ -0,0 +1,119 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect
+
+import api.routes.ws as ws
+from api.websocket_manager import WebSocketManager, MAX_PENDING_UPDATES
+
+
+class FakeWebSocket:
+    """
+    Just enough of starlette's WebSocket for the /ws/jobs route.
+    """
+
+    def __init__(self, messages: list):
+        self.query_params = {"token": "token"}
+        self.incoming = asyncio.Queue()
+        for message in messages:
+            self.incoming.put_nowait(message)
+        self.sent = []
+        self.close_codes = []
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect()
+        return message
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+
+def _run(monkeypatch, messages: list, owned_jobs: int):
+    async def fake_snapshots(job_ids):
+        return {
+            job_id: {"user_id": "alice", "status": "QUEUED"}
+            for job_id in job_ids if int(job_id.split("-")[1]) < owned_jobs
+        }
+
+    async def session():
+        monkeypatch.setattr(ws, "manager", WebSocketManager())
+        monkeypatch.setattr(ws, "verify_token", lambda token: "alice")
+        monkeypatch.setattr(ws, "get_job_snapshots", fake_snapshots)
+
+        websocket = FakeWebSocket(messages)
+        route = asyncio.create_task(ws.multi_job_updates(websocket))
+        # Let the sender task flush before the client disconnects
+        for _ in range(50):
+            await asyncio.sleep(0)
+        websocket.incoming.put_nowait(None)
+        await route
+        return websocket, ws.manager
+
+    return asyncio.run(session())
+
+
+def test_subscribe_more_jobs_than_pending_bound(monkeypatch):
+    jobs = [f"job-{i}" for i in range(500)]
+    assert len(jobs) > MAX_PENDING_UPDATES
+
+    websocket, manager = _run(monkeypatch, [{"action": "subscribe", "job_ids": jobs}], owned_jobs=500)
+
+    assert websocket.close_codes == []
+    [reply] = websocket.sent
+    assert reply["type"] == "subscribed"
+    assert reply["statuses"] == {job_id: "QUEUED" for job_id in jobs}
+    assert reply["rejected"] == []
+    # Disconnecting released every subscription
+    assert manager.active_connections == {}
+    assert manager.connections == {}
+
+
+def test_subscribe_reports_jobs_of_other_users_as_rejected(monkeypatch):
+    websocket, _ = _run(
+        monkeypatch,
+        [{"action": "subscribe", "job_ids": ["job-0", "job-7"]}],
+        owned_jobs=1
+    )
+
+    [reply] = websocket.sent
+    assert reply["job_ids"] == ["job-0"]
+    assert reply["rejected"] == ["job-7"]
+
+
+def test_non_string_job_ids_are_rejected(monkeypatch):
+    websocket, manager = _run(
+        monkeypatch,
+        [{"action": "subscribe", "job_ids": [{"id": 1}, ["job-0"]]}],
+        owned_jobs=1
+    )
+
+    [reply] = websocket.sent
+    assert reply["type"] == "error"
+    assert manager.active_connections == {}
+
+
+def test_dropped_connection_takes_no_more_subscriptions():
+    async def scenario():
+        manager = WebSocketManager()
+        websocket = FakeWebSocket([])
+        conn = await manager.connect(websocket, "alice")
+
+        # A client that never reads fills its queue and is dropped once
+        for i in range(MAX_PENDING_UPDATES + 10):
+            manager.enqueue(conn, f"job-{i}", {"job_id": f"job-{i}"})
+        manager.subscribe(conn, "job-late")
+        await asyncio.sleep(0.01)
+
+        assert conn.closed
+        assert manager.active_connections == {}
+        assert manager.connections == {}
+        assert websocket.close_codes == [1013]
+
+    asyncio.run(scenario())
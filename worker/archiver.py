@@ -0,0 +1,193 @@
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+# SQLAlchemy engine creation for database connectivity
+from sqlalchemy import create_engine, select, delete, insert, text
+
+# Session factory to manage DB transactions
+from sqlalchemy.orm import sessionmaker
+
+# Live and archived job tables
+from common.models import Job, JobHistory, TERMINAL_STATUSES
+
+# Redis client library
+import redis
+
+from api.config import DATABASE_URL, REDIS_HOST, REDIS_PORT
+from common.logger import logger
+from common.telemetry import record_removal
+
+# =========================
+# DATABASE SETUP
+# =========================
+
+# Create SQLAlchemy engine (connection factory)
+engine = create_engine(DATABASE_URL)
+
+# Create session factory for DB access
+SessionLocal = sessionmaker(bind=engine)
+
+# =========================
+# REDIS SETUP
+# =========================
+
+redis_client = redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    decode_responses=True
+)
+
+# =========================
+# ARCHIVER CONFIGURATION
+# =========================
+
+# Terminal jobs untouched for this long move to jobs_history
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", 7))
+
+# Rows moved per transaction, keeping locks and WAL bursts small
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+
+# Pause between full archiving passes (seconds)
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 60))
+
+# Pause between batches of one pass, to yield to the hot path (seconds)
+ARCHIVE_BATCH_PAUSE = 0.1
+
+# Monthly partitions known to exist (created by this process or earlier)
+_partitions = set()
+
+
+# =========================
+# PARTITIONS
+# =========================
+
+def partition_name(month: datetime) -> str:
+    return f"jobs_history_{month:%Y_%m}"
+
+
+def ensure_partitions(db, created_ats: list) -> set:
+    """
+    Creates the monthly jobs_history partitions covering created_ats.
+    Returns the partition names; the caller records them in
+    _partitions once the transaction has committed.
+    """
+    months = {
+        dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for dt in created_ats
+    }
+    names = set()
+    for month in months:
+        name = partition_name(month)
+        names.add(name)
+        if name in _partitions:
+            continue
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {JobHistory.__tablename__} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        ))
+    return names
+
+
+# =========================
+# ARCHIVING
+# =========================
+
+def archive_batch() -> int:
+    """
+    Moves up to ARCHIVE_BATCH_SIZE terminal jobs older than the
+    retention window from jobs to jobs_history in one transaction:
+
+    - Picks the oldest candidates with FOR UPDATE SKIP LOCKED
+    - Creates any missing monthly partitions
+    - Moves the rows with one DELETE ... RETURNING → INSERT statement
+
+    Returns the number of rows archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_RETENTION_DAYS)
+    jobs, history = Job.__table__, JobHistory.__table__
+
+    db = SessionLocal()
+    try:
+        batch = db.execute(
+            select(jobs.c.id, jobs.c.created_at)
+            .where(jobs.c.status.in_(TERMINAL_STATUSES), jobs.c.updated_at < cutoff)
+            .order_by(jobs.c.updated_at)
+            .limit(ARCHIVE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not batch:
+            return 0
+
+        partitions = ensure_partitions(db, [row.created_at for row in batch])
+
+        columns = [column.name for column in jobs.columns]
+        moved = (
+            delete(jobs)
+            .where(jobs.c.id.in_([row.id for row in batch]))
+            .returning(*jobs.c)
+            .cte("moved")
+        )
+        statuses = db.execute(
+            insert(history)
+            .from_select(columns, select(*(moved.c[name] for name in columns)))
+            .returning(history.c.status)
+        ).scalars().all()
+
+        db.commit()
+    finally:
+        db.close()
+
+    _partitions.update(partitions)
+
+    # Archived jobs no longer count towards the live status counters
+    record_removal(redis_client, Counter(statuses))
+    return len(statuses)
+
+
+def archive_expired_jobs() -> int:
+    """
+    Archives batches until no eligible job is left.
+    """
+    total = 0
+    while True:
+        moved = archive_batch()
+        total += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            return total
+        time.sleep(ARCHIVE_BATCH_PAUSE)
+
+
+# =========================
+# ARCHIVER MAIN LOOP
+# =========================
+
+def main():
+    """
+    Entry point for the archiver service.
+    Every ARCHIVE_INTERVAL seconds, moves terminal jobs older than
+    ARCHIVE_RETENTION_DAYS into the partitioned jobs_history table,
+    so the hot jobs table and its indexes stay small.
+    """
+
+    print("[ARCHIVER] Started.")
+
+    while True:
+        try:
+            archived = archive_expired_jobs()
+            if archived:
+                logger.info(f"[ARCHIVER] Archived {archived} jobs")
+        except Exception:
+            logger.exception("[ARCHIVER] Archiving pass failed")
+
+        time.sleep(ARCHIVE_INTERVAL)
+
+
+# =========================
+# SCRIPT ENTRY POINT
+# =========================
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+import os
+import signal
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+
+import redis.asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from api.config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    ASYNC_DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    REDIS_MAX_CONNECTIONS
+)
+from worker.job_state import claim_job, finish_job
+from worker.registry import HANDLERS, JobHandler, get_handler, load_handlers, job_type_label
+from worker.executor import execute_job_async
+from worker.dependencies import resolve_dependents_async
+from common.logger import logger
+from common.pubsub import job_update_channel, job_update_message
+from common.snapshot import queue_snapshot_update
+from common.blobstore import offload, resolve
+from common.queue import schedule, dequeue, promote_due_jobs, DOORBELL
+from common.retry import retry_delay
+from common.models import TERMINAL_STATUSES
+from common.memo import memo_policy, finish_memo_entry_async
+from common.dag import mark_finishing
+from common.telemetry import (
+    record_transition,
+    MetricsBuffer,
+    set_gauges,
+    clear_gauges,
+    GAUGES
+)
+from common.constants import (
+    PROCESSING_LIST_PREFIX,
+    WORKER_HEARTBEAT_PREFIX,
+    WORKERS_SET,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TTL,
+    DEADLINE_SET
+)
+
+# =========================
+# ASYNCIO WORKER
+# =========================
+# Runs `async def` handlers (backend="asyncio" in the registry) natively
+# on one event loop, with redis.asyncio and an asyncpg engine: a
+# concurrent job costs a task instead of an OS thread, so one process
+# can keep thousands of I/O-bound jobs in flight.
+#
+# Same job lifecycle as worker.worker (claim, retry with backoff,
+# publish, reliable processing list, graceful shutdown); dead workers
+# are still reaped by the timeout monitor and the thread workers.
+#
+#     python -m worker.async_worker
+#     WORKER_JOB_TYPES=io_wait python -m worker.async_worker
+
+# Job types this worker serves (comma separated), or "*" for every
+# type with an asyncio handler
+WORKER_JOB_TYPES = os.getenv("WORKER_JOB_TYPES", "*")
+
+# Blocking fallback timeout when the queue is empty (seconds)
+DEQUEUE_TIMEOUT = 5
+
+# Unique worker ID for tracking (assigned by the autoscaler, if any)
+WORKER_ID = os.getenv("WORKER_ID") or str(uuid.uuid4())
+
+# In-flight list owned by this worker (reliable queue)
+PROCESSING_LIST = f"{PROCESSING_LIST_PREFIX}{WORKER_ID}"
+
+# Hot-path timings, flushed to Redis by the heartbeat task
+metrics = MetricsBuffer()
+
+# Execution slots per served handler, and the running job tasks
+semaphores: Dict[str, asyncio.Semaphore] = {}
+concurrency_limit = 0
+jobs_in_flight = 0
+running_tasks = set()
+
+shutdown_event = None
+
+
+# =========================
+# REDIS & DATABASE SETUP
+# =========================
+
+# Jobs share one bounded connection pool
+# (callers wait for a free connection instead of failing)
+redis_client = redis.asyncio.Redis(
+    connection_pool=redis.asyncio.BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS
+    )
+)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+def served_handlers() -> list:
+    """
+    The asyncio handlers selected by WORKER_JOB_TYPES.
+    """
+    if WORKER_JOB_TYPES.strip() == "*":
+        return [handler for handler in HANDLERS.values() if handler.backend == "asyncio"]
+
+    handlers = []
+    for job_type in filter(None, (name.strip() for name in WORKER_JOB_TYPES.split(","))):
+        handler = get_handler(job_type)
+        if handler is None or handler.backend != "asyncio":
+            raise ValueError(f"Job type {job_type!r} has no asyncio handler")
+        handlers.append(handler)
+    return handlers
+
+
+async def publish_job_update(job_id: str, status: str, user_id: str, **fields):
+    """
+    Publishes a transition and writes it to the job's status snapshot
+    in one round trip (see worker.worker.publish_job_update).
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.publish(job_update_channel(user_id), job_update_message(job_id, status, user_id))
+    queue_snapshot_update(pipe, job_id, {"status": status, **fields})
+    with metrics.timer("worker_redis_call_seconds", op="publish"):
+        await pipe.execute()
+
+
+# =========================
+# JOB PROCESSING FUNCTION
+# =========================
+
+async def process_job(job_id: str):
+    """
+    Async counterpart of worker.worker.process_job: claims the job,
+    awaits its handler and applies the outcome with conditional UPDATEs.
+    """
+    started_at = datetime.now(timezone.utc)
+
+    with metrics.timer("worker_db_call_seconds", op="claim_job"):
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(claim_job(job_id, WORKER_ID, started_at))).first()
+            await db.commit()
+
+    if job is None:
+        logger.info(f"[WORKER] Skipping job {job_id}, not claimable")
+        return
+    logger.info(f"[WORKER] Job {job_id} marked RUNNING")
+
+    job_type = job.job_type
+    user_id = job.user_id
+    timeout_seconds = get_handler(job_type).effective_timeout(job.timeout_seconds)
+
+    # Last transition (submission or retry), or the scheduled run time
+    enqueued_at = max(filter(None, (job.previous_updated_at, job.run_at)), default=None)
+    if enqueued_at is not None:
+        metrics.observe(
+            "job_queue_wait_seconds",
+            max((started_at.replace(tzinfo=None) - enqueued_at).total_seconds(), 0),
+            job_type=job_type_label(job_type)
+        )
+
+    # Register the deadline so the timeout monitor only looks at expired jobs
+    with metrics.timer("worker_redis_call_seconds", op="zadd_deadline"):
+        await redis_client.zadd(DEADLINE_SET, {job_id: started_at.timestamp() + timeout_seconds})
+    await publish_job_update(job_id, "RUNNING", user_id, started_at=started_at)
+    await record_transition(redis_client, job.previous_status, "RUNNING")
+
+    try:
+        with metrics.timer("job_execution_seconds", job_type=job_type_label(job_type)):
+            payload = await asyncio.to_thread(resolve, job.payload)
+            result = await execute_job_async(job_type, payload, timeout_seconds)
+            result = await asyncio.to_thread(offload, result)
+
+    except Exception as e:
+        attempts = job.attempts + 1
+
+        if attempts <= job.max_retries:
+            # Mark job as RETRYING, to run again after an exponential backoff
+            delay = retry_delay(job_type, attempts)
+            run_at = time.time() + delay
+            if not await set_outcome(
+                job_id, job_type, user_id, "RETRYING",
+                attempts=attempts,
+                last_error=str(e),
+                run_at=datetime.fromtimestamp(run_at, timezone.utc)
+            ):
+                return
+            await record_transition(redis_client, "RUNNING", "RETRYING")
+
+            logger.warning(f"[WORKER] Job {job_id} failed with error: {e}. Retrying in {delay:.1f}s (attempt {attempts}/{job.max_retries})")
+
+            # Park the job in the scheduled set until its backoff expires
+            with metrics.timer("worker_redis_call_seconds", op="schedule_retry"):
+                await schedule(redis_client, [(job_id, job_type, job.priority, user_id, run_at)])
+
+        else:
+            if not await set_outcome(job_id, job_type, user_id, "FAILED", attempts=attempts, last_error=str(e)):
+                return
+            await record_transition(redis_client, "RUNNING", "FAILED")
+
+            logger.error(f"[WORKER] Job {job_id} permanently failed.")
+        return
+
+    finished_at = datetime.now(timezone.utc)
+    if not await set_outcome(job_id, job_type, user_id, "COMPLETED", finished_at=finished_at, result=result):
+        return
+
+    await record_transition(
+        redis_client, "RUNNING", "COMPLETED",
+        execution_seconds=(finished_at - started_at).total_seconds()
+    )
+
+    logger.info(f"[WORKER] Job {job_id} completed")
+
+
+async def set_outcome(job_id: str, job_type: str, user_id: str, status: str, **values) -> bool:
+    """
+    Applies a terminal transition in one conditional UPDATE, publishes
+    it and drops the job's deadline.
+    A COMPLETED / FAILED job then settles its memo entry and releases or
+    fails the jobs depending on it.
+    Returns False (and logs) if the job is no longer RUNNING on this worker.
+    """
+    if status in TERMINAL_STATUSES:
+        # Until its dependents are released, so a crash after the
+        # commit is recovered (see worker.dependencies)
+        with metrics.timer("worker_redis_call_seconds", op="mark_finishing"):
+            await mark_finishing(redis_client, [job_id])
+
+    with metrics.timer("job_db_commit_seconds", job_type=job_type_label(job_type), transition=status):
+        async with AsyncSessionLocal() as db:
+            updated = (await db.execute(finish_job(job_id, WORKER_ID, status=status, **values))).first()
+            await db.commit()
+        if updated is not None:
+            await publish_job_update(job_id, status, user_id, **values)
+
+    if not updated:
+        logger.warning(f"[WORKER] Job {job_id} is no longer running here, {status} discarded")
+        return False
+
+    # Only once the outcome is committed: until then the timeout
+    # monitor still recovers the job if this worker gets stuck
+    with metrics.timer("worker_redis_call_seconds", op="zrem_deadline"):
+        await redis_client.zrem(DEADLINE_SET, job_id)
+
+    if status in TERMINAL_STATUSES:
+        if memo_policy(job_type):
+            with metrics.timer("worker_redis_call_seconds", op="finish_memo"):
+                await finish_memo_entry_async(redis_client, job_id, job_type, status)
+        with metrics.timer("worker_redis_call_seconds", op="resolve_dependents"):
+            await resolve_dependents_async(redis_client, AsyncSessionLocal, job_id, status)
+    return True
+
+
+# =========================
+# DEQUEUE & DISPATCH
+# =========================
+
+async def run_job(job_id: str, semaphore: asyncio.Semaphore):
+    """
+    Runs a job, acknowledges it and frees its execution slot afterwards.
+    """
+    global jobs_in_flight
+
+    jobs_in_flight += 1
+    try:
+        await process_job(job_id)
+        with metrics.timer("worker_redis_call_seconds", op="ack"):
+            await redis_client.lrem(PROCESSING_LIST, 1, job_id)
+    except Exception:
+        logger.exception(f"[WORKER] Unexpected error while processing job {job_id}")
+    finally:
+        jobs_in_flight -= 1
+        semaphore.release()
+        logger.info(f"[WORKER] Job finished, slot released: {job_id}")
+
+
+def start_task(coro) -> asyncio.Task:
+    """
+    Starts a task that shutdown waits for (see main()).
+    """
+    task = asyncio.create_task(coro)
+    running_tasks.add(task)
+    task.add_done_callback(running_tasks.discard)
+    return task
+
+
+async def fetch_batch(handler: JobHandler, semaphore: asyncio.Semaphore, slots: int) -> int:
+    """
+    Dequeues up to `slots` jobs of the handler's type and starts them,
+    each holding one of the acquired slots; returns the unused ones.
+    Returns how many jobs were started.
+    """
+    entries = []
+    try:
+        start = time.perf_counter()
+        # Promote due delayed jobs and dequeue in one round trip
+        # (script calls on an asyncio pipeline are awaited to queue them)
+        pipe = redis_client.pipeline(transaction=False)
+        await promote_due_jobs(pipe)
+        await dequeue(pipe, PROCESSING_LIST, slots, [handler.job_type])
+        with metrics.timer("worker_redis_call_seconds", op="dequeue"):
+            _, entries = await pipe.execute()
+        if entries:
+            metrics.observe("worker_dequeue_seconds", time.perf_counter() - start)
+    except Exception:
+        logger.exception(f"[WORKER] Dequeue failed for {handler.job_type}")
+
+    for job_id, *_ in entries:
+        logger.info(f"[WORKER] Executing job (slot acquired): {job_id}")
+        start_task(run_job(job_id, semaphore))
+
+    for _ in range(slots - len(entries)):
+        semaphore.release()
+    return len(entries)
+
+
+async def fetch_loop(handler: JobHandler, doorbell: asyncio.Condition):
+    """
+    Feeds one handler: waits for a free slot, takes every other free
+    slot too, and dequeues at most that many jobs of its type.
+    """
+    semaphore = semaphores[handler.job_type]
+
+    while not shutdown_event.is_set():
+        await semaphore.acquire()
+        acquired = 1
+        while not semaphore.locked():
+            await semaphore.acquire()
+            acquired += 1
+
+        # Shielded, so a shutdown never drops jobs already moved
+        # to the processing list
+        fetched = await asyncio.shield(start_task(fetch_batch(handler, semaphore, acquired)))
+
+        if not fetched:
+            # Nothing queued: wait for the doorbell (or shutdown)
+            async with doorbell:
+                try:
+                    await asyncio.wait_for(doorbell.wait(), timeout=DEQUEUE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
+
+
+async def doorbell_loop(doorbell: asyncio.Condition):
+    """
+    One BLPOP on the scheduler doorbell for the whole process,
+    waking every idle fetch loop when new jobs arrive.
+    """
+    while not shutdown_event.is_set():
+        try:
+            rang = await redis_client.blpop(DOORBELL, timeout=1)
+        except Exception:
+            logger.exception("[WORKER] Doorbell wait failed")
+            await asyncio.sleep(1)
+            continue
+        if rang or shutdown_event.is_set():
+            async with doorbell:
+                doorbell.notify_all()
+
+
+# =========================
+# HEARTBEAT
+# =========================
+
+async def send_heartbeat():
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(f"{WORKER_HEARTBEAT_PREFIX}{WORKER_ID}", "alive", ex=HEARTBEAT_TTL)
+    pipe.sadd(WORKERS_SET, WORKER_ID)
+    await pipe.execute()
+
+
+async def publish_metrics():
+    """
+    Flushes buffered timings and this worker's gauges to Redis.
+    """
+    await metrics.flush_async(redis_client)
+    await set_gauges(
+        redis_client,
+        {
+            "worker_jobs_in_flight": jobs_in_flight,
+            "worker_concurrency_limit": concurrency_limit
+        },
+        worker=WORKER_ID
+    )
+
+
+async def heartbeat_loop():
+    while not shutdown_event.is_set():
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=HEARTBEAT_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await send_heartbeat()
+            await publish_metrics()
+        except Exception:
+            logger.exception("[WORKER] Heartbeat failed")
+
+
+async def unregister_worker():
+    """
+    Drops this worker's heartbeat. Jobs left unacknowledged in the
+    processing list stay registered so a peer's reaper requeues them.
+    """
+    await metrics.flush_async(redis_client)
+    await clear_gauges(redis_client, GAUGES, worker=WORKER_ID)
+    await redis_client.delete(f"{WORKER_HEARTBEAT_PREFIX}{WORKER_ID}")
+    if await redis_client.llen(PROCESSING_LIST) == 0:
+        await redis_client.srem(WORKERS_SET, WORKER_ID)
+
+
+# =========================
+# WORKER MAIN LOOP
+# =========================
+
+def handle_shutdown():
+    logger.info("[WORKER] Shutdown signal received. Finishing current jobs...")
+    shutdown_event.set()
+
+
+async def main():
+    """
+    Async worker entry point: one fetch loop per served handler,
+    each job a task bounded by its handler's asyncio.Semaphore.
+    """
+    global shutdown_event, concurrency_limit
+
+    load_handlers()
+    handlers = served_handlers()
+    if not handlers:
+        raise ValueError("No asyncio job handlers to serve")
+
+    shutdown_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, handle_shutdown)
+    loop.add_signal_handler(signal.SIGTERM, handle_shutdown)
+
+    for handler in handlers:
+        semaphores[handler.job_type] = asyncio.Semaphore(handler.max_concurrency)
+        concurrency_limit += handler.max_concurrency
+        logger.info(f"[WORKER] Handler {handler.job_type}: {handler.max_concurrency} slots")
+    logger.info("[WORKER] Async worker started. Waiting for jobs...")
+
+    await send_heartbeat()
+    doorbell = asyncio.Condition()
+    loops = [
+        asyncio.create_task(heartbeat_loop()),
+        asyncio.create_task(doorbell_loop(doorbell)),
+        *(asyncio.create_task(fetch_loop(handler, doorbell)) for handler in handlers)
+    ]
+
+    await shutdown_event.wait()
+
+    # Stop fetching; fetched jobs are never left unstarted
+    for task in loops[1:]:
+        task.cancel()
+    await asyncio.gather(*loops[1:], return_exceptions=True)
+
+    # Let in-flight jobs (and any they started) finish before exiting
+    while running_tasks:
+        await asyncio.gather(*running_tasks, return_exceptions=True)
+    await loops[0]
+
+    await unregister_worker()
+    await redis_client.aclose()
+    await async_engine.dispose()
+    logger.info("[WORKER] Shutdown complete.")
+
+
+# =========================
+# SCRIPT ENTRY POINT
+# =========================
+
+if __name__ == "__main__":
+    asyncio.run(main())
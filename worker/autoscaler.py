@@ -0,0 +1,296 @@
+import os
+import sys
+import math
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+import redis
+
+from api.config import REDIS_HOST, REDIS_PORT
+from common.logger import logger
+from common.queue import QUEUE_DEPTH, type_depth_key
+from worker.registry import load_handlers, job_type_label
+from common.telemetry import (
+    HISTOGRAM_PREFIX,
+    GAUGE_PREFIX,
+    format_labels,
+    set_gauges,
+    clear_gauges,
+    increment_counter,
+    clear_counters,
+    GAUGES,
+    COUNTERS
+)
+
+# =========================
+# WORKER AUTOSCALER
+# =========================
+# Supervises a local fleet of worker processes and resizes it every
+# AUTOSCALE_INTERVAL seconds from three signals:
+#
+# - queue depth: ready jobs of the served types in the fair queue
+#   ({sched}:depth, or the per-type {sched}:depth:<job_type> counters)
+# - queue wait: mean job_queue_wait_seconds of the jobs started since
+#   the previous check (cluster-wide histogram in Redis)
+# - utilization: execution slots in use / slots of this fleet
+#   (worker_jobs_in_flight / worker_concurrency_limit gauges)
+#
+# With a backlog and waits above AUTOSCALE_TARGET_WAIT_SECONDS (or slots
+# nearly all busy) the fleet grows in proportion to the pressure, at
+# most doubling per step. With an empty queue and mostly idle slots it
+# shrinks by one worker per AUTOSCALE_SCALE_DOWN_COOLDOWN_SECONDS. A
+# removed worker gets SIGTERM and drains its in-flight jobs first.
+#
+# Decisions are exported as autoscaler_* gauges and the
+# autoscaler_scale_events_total counter (label supervisor=<id>).
+#
+#     python -m worker.autoscaler
+#     AUTOSCALE_WORKER_COMMAND="python -m worker.async_worker" python -m worker.autoscaler
+
+MIN_WORKERS = int(os.getenv("AUTOSCALE_MIN_WORKERS", 1))
+MAX_WORKERS = int(os.getenv("AUTOSCALE_MAX_WORKERS", 8))
+CHECK_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", 5))
+
+TARGET_WAIT_SECONDS = float(os.getenv("AUTOSCALE_TARGET_WAIT_SECONDS", 2))
+SCALE_UP_UTILIZATION = float(os.getenv("AUTOSCALE_SCALE_UP_UTILIZATION", 0.8))
+SCALE_DOWN_UTILIZATION = float(os.getenv("AUTOSCALE_SCALE_DOWN_UTILIZATION", 0.3))
+
+# Minimum time between two resizes in the same direction (seconds)
+SCALE_UP_COOLDOWN_SECONDS = float(os.getenv("AUTOSCALE_SCALE_UP_COOLDOWN_SECONDS", 10))
+SCALE_DOWN_COOLDOWN_SECONDS = float(os.getenv("AUTOSCALE_SCALE_DOWN_COOLDOWN_SECONDS", 60))
+
+# Command starting one worker; it inherits this process's environment
+# (WORKER_JOB_TYPES, ...) plus its WORKER_ID
+WORKER_COMMAND = shlex.split(os.getenv("AUTOSCALE_WORKER_COMMAND", f"{sys.executable} -m worker.worker"))
+
+# Job types the fleet serves (same format as the workers' WORKER_JOB_TYPES);
+# queue waits of other types are ignored
+WORKER_JOB_TYPES = os.getenv("WORKER_JOB_TYPES", "*")
+
+SUPERVISOR_ID = str(uuid.uuid4())
+
+redis_client = redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    decode_responses=True
+)
+
+shutdown_event = threading.Event()
+
+
+class Fleet:
+    """
+    The worker processes started by this supervisor: running ones,
+    keyed by WORKER_ID, and draining ones (SIGTERM sent, not exited yet).
+    """
+
+    def __init__(self):
+        self.running = {}
+        self.draining = {}
+
+    def __len__(self):
+        return len(self.running)
+
+    def spawn(self):
+        worker_id = str(uuid.uuid4())
+        process = subprocess.Popen(WORKER_COMMAND, env={**os.environ, "WORKER_ID": worker_id})
+        self.running[worker_id] = process
+        logger.info(f"[AUTOSCALER] Started worker {worker_id} (pid {process.pid})")
+
+    def drain(self):
+        # Newest first: the oldest workers keep their warm caches
+        worker_id, process = self.running.popitem()
+        process.send_signal(signal.SIGTERM)
+        self.draining[worker_id] = process
+        logger.info(f"[AUTOSCALER] Draining worker {worker_id} (pid {process.pid})")
+
+    def reap(self):
+        """
+        Forgets exited workers; a running worker that exited is replaced
+        by the next decision.
+        """
+        for group in (self.running, self.draining):
+            for worker_id, process in list(group.items()):
+                if process.poll() is not None:
+                    del group[worker_id]
+                    if group is self.running:
+                        logger.warning(f"[AUTOSCALER] Worker {worker_id} exited with code {process.returncode}")
+
+    def stop(self):
+        while self.running:
+            self.drain()
+        for process in self.draining.values():
+            process.wait()
+        self.draining.clear()
+
+
+# =========================
+# SIGNALS
+# =========================
+
+def _served_types() -> list:
+    """
+    Job types the fleet serves, or None for all of them.
+    """
+    if WORKER_JOB_TYPES.strip() == "*":
+        return None
+    return [job_type.strip() for job_type in WORKER_JOB_TYPES.split(",") if job_type.strip()]
+
+
+def _served(labels: str) -> bool:
+    served = _served_types()
+    if served is None:
+        return True
+    # As labelled by the workers (unregistered types share one label)
+    return any(
+        format_labels({"job_type": job_type_label(job_type)}) == labels
+        for job_type in served
+    )
+
+
+def read_signals(worker_ids: list):
+    """
+    One pipelined round trip: queue depth of the served types, the
+    queue wait histogram and the fleet's slot gauges.
+    Returns (depth, (wait sum, wait count), slots in use, slot limit).
+    """
+    labels = [format_labels({"worker": worker_id}) for worker_id in worker_ids]
+    served = _served_types()
+
+    pipe = redis_client.pipeline(transaction=False)
+    if served is None:
+        pipe.mget([QUEUE_DEPTH])
+    else:
+        pipe.mget([type_depth_key(job_type) for job_type in served])
+    pipe.hgetall(f"{HISTOGRAM_PREFIX}job_queue_wait_seconds")
+    if labels:
+        pipe.hmget(f"{GAUGE_PREFIX}worker_jobs_in_flight", labels)
+        pipe.hmget(f"{GAUGE_PREFIX}worker_concurrency_limit", labels)
+    results = pipe.execute()
+
+    depth = sum(max(int(value or 0), 0) for value in results[0])
+    wait_sum = wait_count = 0.0
+    for field, value in results[1].items():
+        labels_str, _, part = field.rpartition("|")
+        if not _served(labels_str):
+            continue
+        if part == "sum":
+            wait_sum += float(value)
+        elif part == "count":
+            wait_count += float(value)
+
+    in_use = limit = 0
+    if labels:
+        in_use = sum(float(value or 0) for value in results[2])
+        limit = sum(float(value or 0) for value in results[3])
+    return depth, (wait_sum, wait_count), in_use, limit
+
+
+def desired_workers(current: int, depth: int, mean_wait: float, utilization: float) -> int:
+    """
+    Fleet size for the observed load, before cooldowns.
+    """
+    if depth > 0:
+        pressure = max(mean_wait / TARGET_WAIT_SECONDS, utilization / SCALE_UP_UTILIZATION)
+        if pressure > 1:
+            target = max(current + 1, math.ceil(current * pressure))
+            return max(MIN_WORKERS, min(MAX_WORKERS, target, max(2 * current, 1)))
+    elif utilization < SCALE_DOWN_UTILIZATION:
+        return max(MIN_WORKERS, current - 1)
+    return max(MIN_WORKERS, min(MAX_WORKERS, current))
+
+
+# =========================
+# SUPERVISOR MAIN LOOP
+# =========================
+
+def handle_shutdown(signum, frame):
+    logger.info("[AUTOSCALER] Shutdown signal received. Draining all workers...")
+    shutdown_event.set()
+
+
+def main():
+    """
+    Autoscaler entry point: starts MIN_WORKERS workers, then resizes
+    the fleet every CHECK_INTERVAL seconds until SIGINT/SIGTERM, when
+    every worker is drained.
+    """
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    # The workers' job type labels depend on the registered handlers
+    load_handlers()
+
+    logger.info(f"[AUTOSCALER] Started: {MIN_WORKERS}-{MAX_WORKERS} workers running {' '.join(WORKER_COMMAND)}")
+
+    fleet = Fleet()
+    for _ in range(MIN_WORKERS):
+        fleet.spawn()
+
+    last_wait = None
+    last_up = last_down = 0.0
+
+    while not shutdown_event.wait(CHECK_INTERVAL):
+        try:
+            fleet.reap()
+            depth, wait, in_use, limit = read_signals(list(fleet.running))
+
+            # Mean wait of the jobs started since the previous check
+            mean_wait = 0.0
+            if last_wait is not None and wait[1] > last_wait[1]:
+                mean_wait = (wait[0] - last_wait[0]) / (wait[1] - last_wait[1])
+            last_wait = wait
+            utilization = in_use / limit if limit else 0.0
+
+            current = len(fleet)
+            desired = desired_workers(current, depth, mean_wait, utilization)
+            now = time.time()
+
+            # Replacing crashed workers (below MIN_WORKERS) skips the cooldown
+            if desired > current and (current < MIN_WORKERS or now - last_up >= SCALE_UP_COOLDOWN_SECONDS):
+                for _ in range(desired - current):
+                    fleet.spawn()
+                last_up = now
+            elif desired < current and now - last_down >= SCALE_DOWN_COOLDOWN_SECONDS:
+                for _ in range(current - desired):
+                    fleet.drain()
+                last_down = now
+            else:
+                desired = current
+
+            if desired != current:
+                increment_counter(redis_client, "autoscaler_scale_events_total", supervisor=SUPERVISOR_ID)
+                logger.info(
+                    f"[AUTOSCALER] {current} → {desired} workers "
+                    f"(depth={depth}, wait={mean_wait:.2f}s, utilization={utilization:.0%})"
+                )
+
+            set_gauges(
+                redis_client,
+                {
+                    "autoscaler_workers": len(fleet),
+                    "autoscaler_desired_workers": desired,
+                    "autoscaler_queue_depth": depth,
+                    "autoscaler_queue_wait_seconds": round(mean_wait, 6),
+                    "autoscaler_utilization": round(utilization, 4)
+                },
+                supervisor=SUPERVISOR_ID
+            )
+        except Exception:
+            logger.exception("[AUTOSCALER] Check failed")
+
+    fleet.stop()
+    clear_gauges(redis_client, GAUGES, supervisor=SUPERVISOR_ID)
+    clear_counters(redis_client, COUNTERS, supervisor=SUPERVISOR_ID)
+    logger.info("[AUTOSCALER] Shutdown complete.")
+
+
+# =========================
+# SCRIPT ENTRY POINT
+# =========================
+
+if __name__ == "__main__":
+    main()
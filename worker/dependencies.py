@@ -0,0 +1,161 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from common.dag import (
+    release_dependents,
+    settle_dependents,
+    unsettled_dependents,
+    finishing_jobs,
+    clear_finishing,
+    queue_pending_jobs,
+    fail_pending_jobs,
+    dependency_error
+)
+from common.logger import logger
+from common.models import Job, JobHistory, TERMINAL_STATUSES
+from common.pubsub import job_update_channel, job_update_message
+from common.snapshot import queue_snapshot_update
+from common.telemetry import record_transition
+
+
+# =========================
+# DEPENDENT JOB RESOLUTION
+# =========================
+# Called once a job reached COMPLETED or FAILED (after its outcome is
+# committed): releases or fails the jobs waiting for it (see common.dag)
+# and moves their PENDING rows along by primary key. Children leave
+# dag:unsettled only after that commit.
+#
+# Finishers call mark_finishing() before committing the outcome. If
+# anything between that point and the release fails (DB or Redis error,
+# the process dies), the timeout monitor's recover_dependents() finishes
+# the job after RECOVERY_GRACE_SECONDS.
+
+# How long a release may take before the monitor redoes it (seconds)
+RECOVERY_GRACE_SECONDS = 30
+
+# Most finishing parents checked per recovery pass
+RECOVERY_BATCH_SIZE = 500
+
+
+def _publish_pipeline(redis_client, queued: list, failed: list, finished_at):
+    pipe = redis_client.pipeline(transaction=False)
+    for row in queued:
+        pipe.publish(job_update_channel(row.user_id), job_update_message(row.id, "QUEUED", row.user_id))
+        queue_snapshot_update(pipe, row.id, {"status": "QUEUED"})
+    for row, error in failed:
+        pipe.publish(job_update_channel(row.user_id), job_update_message(row.id, "FAILED", row.user_id))
+        queue_snapshot_update(pipe, row.id, {"status": "FAILED", "last_error": error, "finished_at": finished_at})
+    return pipe
+
+
+def _settle(redis_client, session_factory, ready: list, failed_by_parent: dict):
+    """
+    Moves released / failed children's PENDING rows along, then
+    publishes them and takes them out of dag:unsettled.
+    `failed_by_parent` maps the failed job to the children failed by it.
+    """
+    finished_at = datetime.now(timezone.utc)
+    with session_factory() as db:
+        queued = db.execute(queue_pending_jobs(ready)).all() if ready else []
+        failed = [
+            (row, dependency_error(parent))
+            for parent, child_ids in failed_by_parent.items()
+            for row in db.execute(fail_pending_jobs(child_ids, dependency_error(parent), finished_at)).all()
+        ]
+        db.commit()
+
+    if queued:
+        record_transition(redis_client, "PENDING", "QUEUED", count=len(queued))
+    if failed:
+        record_transition(redis_client, "PENDING", "FAILED", count=len(failed))
+    _publish_pipeline(redis_client, queued, failed, finished_at).execute()
+    settle_dependents(redis_client, [*ready, *(child for ids in failed_by_parent.values() for child in ids)])
+
+
+def resolve_dependents(redis_client, session_factory, job_id: str, status: str):
+    """
+    Blocking version, for the thread workers and the timeout monitor.
+    """
+    ready, failed_ids = release_dependents(redis_client, job_id, status)
+    if not ready and not failed_ids:
+        return
+
+    _settle(redis_client, session_factory, ready, {job_id: failed_ids} if failed_ids else {})
+    logger.info(f"[DAG] Job {job_id} {status}: released {len(ready)}, failed {len(failed_ids)} dependents")
+
+
+async def resolve_dependents_async(redis_client, session_factory, job_id: str, status: str):
+    """
+    resolve_dependents() for a redis.asyncio client and AsyncSessions.
+    """
+    ready, failed_ids = await release_dependents(redis_client, job_id, status)
+    if not ready and not failed_ids:
+        return
+
+    error = dependency_error(job_id)
+    finished_at = datetime.now(timezone.utc)
+    async with session_factory() as db:
+        queued = (await db.execute(queue_pending_jobs(ready))).all() if ready else []
+        failed = (await db.execute(fail_pending_jobs(failed_ids, error, finished_at))).all() if failed_ids else []
+        await db.commit()
+
+    if queued:
+        await record_transition(redis_client, "PENDING", "QUEUED", count=len(queued))
+    if failed:
+        await record_transition(redis_client, "PENDING", "FAILED", count=len(failed))
+    await _publish_pipeline(redis_client, queued, [(row, error) for row in failed], finished_at).execute()
+    await settle_dependents(redis_client, [*ready, *failed_ids])
+    logger.info(f"[DAG] Job {job_id} {status}: released {len(ready)}, failed {len(failed_ids)} dependents")
+
+
+def recover_dependents(redis_client, session_factory) -> int:
+    """
+    Finishes dependent resolutions that were cut short:
+
+    - Re-applies row updates of children still in dag:unsettled
+      after RECOVERY_GRACE_SECONDS
+    - Re-runs release_dependents() for jobs marked in dag:finishing
+      for that long that are COMPLETED / FAILED, and drops the marks
+      of the others (their outcome never committed)
+
+    Only looks at releases in flight, not at every waiting child.
+    Idempotent, so it may overlap with a worker's own resolution.
+    Returns the number of recovered parents and children.
+    """
+    cutoff = time.time() - RECOVERY_GRACE_SECONDS
+
+    stale = unsettled_dependents(redis_client, cutoff)
+    if stale:
+        ready = [child for child, entry in stale.items() if entry["status"] == "QUEUED"]
+        failed_by_parent = defaultdict(list)
+        for child, entry in stale.items():
+            if entry["status"] == "FAILED":
+                failed_by_parent[entry["parent"]].append(child)
+        _settle(redis_client, session_factory, ready, failed_by_parent)
+        logger.warning(f"[DAG] Settled {len(stale)} dependents left unsettled")
+
+    marked = finishing_jobs(redis_client, cutoff, RECOVERY_BATCH_SIZE)
+    if not marked:
+        return len(stale)
+
+    finished = []
+    with session_factory() as db:
+        # Archived jobs (see worker/archiver.py) are all terminal
+        for table in (Job, JobHistory):
+            finished += db.execute(
+                select(table.id, table.status)
+                .where(table.id.in_(marked), table.status.in_(TERMINAL_STATUSES))
+            ).all()
+
+    finished_ids = {row.id for row in finished}
+    clear_finishing(redis_client, [job_id for job_id in marked if job_id not in finished_ids], cutoff)
+
+    for row in finished:
+        logger.warning(f"[DAG] Resolving dependents of {row.id}, missed when it {row.status}")
+        resolve_dependents(redis_client, session_factory, row.id, row.status)
+
+    return len(stale) + len(finished)
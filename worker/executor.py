@@ -1,40 +1,50 @@
-import time
-import random
-from common.logger import logger
+import asyncio
+import threading
+from worker.registry import get_handler
+
+
+class JobTimeoutError(Exception):
+    """
+    Raised when a job exceeds its timeout on a backend that can
+    interrupt it (process pool, asyncio).
+    """
+
 
 def execute_job(job_type: str, payload: dict) -> dict:
-    delay = payload.get("delay_seconds", 20)
-    if payload.get("force_stuck") is True:
-        logger.info("[EXECUTOR] Simulating stuck job")
-        while True:
-            pass  # infinite loop
-
-# Example of how to test a stuck job via API:        
-#     Invoke-RestMethod `
-#   -Uri "http://127.0.0.1:8000/jobs" `
-#   -Method POST `
-#   -ContentType "application/json" `
-#   -Body '{"job_type":"timeout_test","payload":{"force_stuck": true},"timeout_seconds":5}'
-    
-    logger.info(f"[EXECUTOR] Executing job, sleeping for {delay} seconds")
-    time.sleep(delay)
-
-    # Simulate failure (30% chance)
-    if random.random() < 0.3:
-        raise Exception("Simulated job failure")
-    
-#     if payload.get("force_fail") is True:
-#         raise Exception("Forced failure for testing")
-    
-# Example of how to test a failing job via API:
-#     Invoke-RestMethod `
-#   -Uri "http://127.0.0.1:8000/jobs" `
-#   -Method POST `
-#   -ContentType "application/json" `
-#   -Body '{"job_type":"test","payload":{"force_fail": true}}'
-
-    return {
-        "job_type": job_type,
-        "input": payload,
-        "message": f"Job executed after {delay} seconds"
-    }
+    """
+    Runs the registered handler for job_type (see worker.registry)
+    in the calling thread. Used by the thread and process backends.
+    """
+    return get_handler(job_type).func(payload)
+
+
+async def execute_job_async(job_type: str, payload: dict, timeout_seconds: int) -> dict:
+    """
+    Awaits the registered async def handler for job_type, raising
+    JobTimeoutError after timeout_seconds. Used by the asyncio backend.
+    """
+    try:
+        return await asyncio.wait_for(get_handler(job_type).func(payload), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        raise JobTimeoutError("Job timed out")
+
+
+class AsyncRunner:
+    """
+    Event loop on a background thread running the coroutines of
+    asyncio-backend handlers; run() blocks the calling job thread
+    until the coroutine finishes or times out.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="job-asyncio", daemon=True)
+        self._thread.start()
+
+    def run(self, job_type: str, payload: dict, timeout_seconds: int) -> dict:
+        coro = execute_job_async(job_type, payload, timeout_seconds)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
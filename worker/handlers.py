@@ -0,0 +1,76 @@
+import time
+import random
+import asyncio
+import hashlib
+from common.logger import logger
+from worker.registry import register
+
+# =========================
+# BUILT-IN JOB HANDLERS
+# =========================
+# Loaded by every worker (see WORKER_HANDLER_MODULES). Add handlers
+# here or in another module listed in WORKER_HANDLER_MODULES.
+
+
+@register("*")
+def simulated_job(payload: dict) -> dict:
+    """
+    Fallback for job types without a handler: sleeps, then fails
+    30% of the time (used to exercise retries and timeouts).
+    """
+    delay = payload.get("delay_seconds", 20)
+    if payload.get("force_stuck") is True:
+        logger.info("[EXECUTOR] Simulating stuck job")
+        while True:
+            pass  # infinite loop
+
+# Example of how to test a stuck job via API:        
+#     Invoke-RestMethod `
+#   -Uri "http://127.0.0.1:8000/jobs" `
+#   -Method POST `
+#   -ContentType "application/json" `
+#   -Body '{"job_type":"timeout_test","payload":{"force_stuck": true},"timeout_seconds":5}'
+    
+    logger.info(f"[EXECUTOR] Executing job, sleeping for {delay} seconds")
+    time.sleep(delay)
+
+    # Simulate failure (30% chance)
+    if random.random() < 0.3:
+        raise Exception("Simulated job failure")
+    
+#     if payload.get("force_fail") is True:
+#         raise Exception("Forced failure for testing")
+    
+# Example of how to test a failing job via API:
+#     Invoke-RestMethod `
+#   -Uri "http://127.0.0.1:8000/jobs" `
+#   -Method POST `
+#   -ContentType "application/json" `
+#   -Body '{"job_type":"test","payload":{"force_fail": true}}'
+
+    return {
+        "input": payload,
+        "message": f"Job executed after {delay} seconds"
+    }
+
+
+@register("io_wait", max_concurrency=100, backend="asyncio")
+async def io_wait(payload: dict) -> dict:
+    """
+    Simulated I/O-bound job: many run concurrently on one event loop.
+    """
+    delay = payload.get("delay_seconds", 1)
+    await asyncio.sleep(delay)
+    return {"message": f"Waited {delay} seconds"}
+
+
+@register("cpu_hash", max_concurrency=2, backend="process", timeout_seconds=300)
+def cpu_hash(payload: dict) -> dict:
+    """
+    Simulated CPU-bound job: iterated SHA-256 of the payload's "data".
+    """
+    digest = str(payload.get("data", "")).encode()
+    rounds = int(payload.get("rounds", 1_000_000))
+    for _ in range(rounds):
+        digest = hashlib.sha256(digest).digest()
+    return {"digest": digest.hex(), "rounds": rounds}
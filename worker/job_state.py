@@ -0,0 +1,131 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import update, values, column, cast, func, String, Integer, DateTime, JSON
+from sqlalchemy.orm import aliased
+
+from common.models import Job, naive_utc
+
+# =========================
+# ATOMIC JOB STATE TRANSITIONS
+# =========================
+# Every transition a worker makes is one conditional UPDATE, so the
+# status check and the write cannot be separated by another worker
+# (or by the timeout monitor / reaper) and no SELECT is needed.
+
+# PENDING jobs only reach a queue once their parents completed (see
+# common.dag); their row may still say PENDING when a worker gets them
+CLAIMABLE_STATUSES = ("QUEUED", "RETRYING", "PENDING")
+
+
+def claim_job(job_id: str, worker_id: str, started_at):
+    """
+    UPDATE moving a QUEUED/RETRYING (or released PENDING) job to RUNNING for worker_id.
+
+    Returns no row when the job is missing or already claimed.
+    The self-join exposes the row as it was before the update
+    (previous status, last transition time) for metrics.
+    """
+    previous = aliased(Job)
+    return (
+        update(Job)
+        .where(
+            Job.id == job_id,
+            previous.id == Job.id,
+            Job.status.in_(CLAIMABLE_STATUSES)
+        )
+        .values(status="RUNNING", worker_id=worker_id, started_at=naive_utc(started_at))
+        .returning(
+            previous.status.label("previous_status"),
+            previous.updated_at.label("previous_updated_at"),
+            Job.run_at,
+            Job.job_type,
+            Job.payload,
+            Job.user_id,
+            Job.priority,
+            Job.attempts,
+            Job.max_retries,
+            Job.timeout_seconds
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def finish_job(job_id: str, worker_id: str, **values):
+    """
+    UPDATE applying a terminal transition (COMPLETED/RETRYING/FAILED)
+    only while the job is still RUNNING on worker_id.
+
+    Returns no row when the job was taken away in the meantime
+    (timed out or requeued by the reaper).
+    """
+    return (
+        update(Job)
+        .where(
+            Job.id == job_id,
+            Job.status == "RUNNING",
+            Job.worker_id == worker_id
+        )
+        .values({name: naive_utc(value) for name, value in values.items()})
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Columns a terminal transition may set, with the type each VALUES
+# entry is cast to (psycopg2 sends untyped literals)
+OUTCOME_COLUMNS = {
+    "status": String,
+    "attempts": Integer,
+    "last_error": String,
+    "run_at": DateTime,
+    "finished_at": DateTime,
+    "result": JSON,
+}
+
+
+def finish_jobs(worker_id: str, outcomes: list):
+    """
+    Bulk form of finish_job(): one UPDATE ... FROM (VALUES ...) for
+    many jobs. Each outcome is a dict with "id" plus any OUTCOME_COLUMNS;
+    columns an outcome leaves out keep their current value.
+
+    Returns the IDs of the rows actually updated.
+    """
+    rows = values(
+        column("id", String),
+        *(column(name, String) for name in OUTCOME_COLUMNS),
+        name="outcomes"
+    ).data([
+        (
+            outcome["id"],
+            *(_value(name, outcome.get(name)) for name in OUTCOME_COLUMNS)
+        )
+        for outcome in outcomes
+    ])
+
+    return (
+        update(Job)
+        .where(
+            Job.id == rows.c.id,
+            Job.status == "RUNNING",
+            Job.worker_id == worker_id
+        )
+        .values({
+            name: func.coalesce(cast(rows.c[name], type_), getattr(Job, name))
+            for name, type_ in OUTCOME_COLUMNS.items()
+        })
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _value(name: str, value):
+    # VALUES entries travel as text and are cast back per column
+    if value is None:
+        return None
+    if name == "result":
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return naive_utc(value).isoformat()
+    return str(value)
@@ -0,0 +1,121 @@
+import queue
+import signal
+import multiprocessing
+
+from worker.executor import execute_job, JobTimeoutError
+from worker.registry import load_handlers
+from common.blobstore import offload, resolve
+from common.logger import logger
+
+
+def _child_main(conn):
+    """
+    Loop run by every pool process.
+    Receives (job_type, payload) tasks and replies with (ok, result_or_error).
+    Blob references are resolved/offloaded here, so large documents
+    never cross the pipe.
+    """
+    # Shutdown is coordinated by the parent worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # Spawned children start with an empty handler registry
+    load_handlers()
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+
+        if task is None:
+            break
+
+        job_type, payload = task
+        try:
+            conn.send((True, offload(execute_job(job_type, resolve(payload)))))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+class _Child:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class ProcessPool:
+    """
+    Pre-forked pool of job execution processes.
+
+    - Each job runs in its own child, outside the worker's GIL
+    - A child that exceeds the job timeout is killed and replaced
+    - A child that dies mid-job is replaced as well
+    """
+
+    def __init__(self, size: int):
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Child:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_child_main,
+            args=(child_conn,),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Child(process, parent_conn)
+
+    def _replace(self, child: _Child) -> _Child:
+        child.process.kill()
+        child.process.join()
+        child.conn.close()
+        return self._spawn()
+
+    def run(self, job_type: str, payload: dict, timeout_seconds: int) -> dict:
+        """
+        Executes a job in an idle child, waiting at most timeout_seconds.
+        Raises JobTimeoutError if the job runs too long.
+        """
+        child = self._idle.get()
+        try:
+            child.conn.send((job_type, payload))
+
+            if not child.conn.poll(timeout_seconds):
+                logger.warning(
+                    f"[POOL] Killing pid {child.process.pid} after {timeout_seconds}s"
+                )
+                child = self._replace(child)
+                raise JobTimeoutError("Job timed out")
+
+            ok, value = child.conn.recv()
+
+        except (EOFError, OSError):
+            child = self._replace(child)
+            raise Exception("Execution process died")
+
+        finally:
+            self._idle.put(child)
+
+        if not ok:
+            raise Exception(value)
+        return value
+
+    def close(self):
+        """
+        Stops all idle children. Call once no jobs are running.
+        """
+        while not self._idle.empty():
+            child = self._idle.get_nowait()
+            try:
+                child.conn.send(None)
+            except OSError:
+                pass
+            child.process.join(timeout=5)
+            if child.process.is_alive():
+                child.process.kill()
+            child.conn.close()
@@ -0,0 +1,87 @@
+from sqlalchemy import select, update
+
+from common.models import Job
+from worker.job_state import CLAIMABLE_STATUSES
+from common.constants import (
+    PROCESSING_LIST_PREFIX,
+    WORKER_HEARTBEAT_PREFIX,
+    WORKERS_SET,
+    DEADLINE_SET
+)
+from common.logger import logger
+from common.queue import enqueue
+from common.telemetry import record_transition, clear_gauges, GAUGES
+from common.snapshot import delete_snapshots
+
+# Only one reaper handles a given dead worker at a time (seconds)
+REAP_LOCK_TTL = 60
+
+
+def reap_dead_workers(redis_client, session_factory, exclude: str = None) -> int:
+    """
+    Requeues the in-flight jobs of workers whose heartbeat has expired.
+
+    - Resets their RUNNING rows back to QUEUED (by primary key only)
+    - Puts every unfinished job back at the head of its fair-queue flow
+    - Safe to run concurrently from several workers (per-worker lock)
+
+    Returns the number of jobs requeued.
+    """
+    requeued = 0
+
+    for worker_id in redis_client.smembers(WORKERS_SET):
+        if worker_id == exclude:
+            continue
+        if redis_client.exists(f"{WORKER_HEARTBEAT_PREFIX}{worker_id}"):
+            continue
+
+        lock = f"reaper:lock:{worker_id}"
+        if not redis_client.set(lock, "1", nx=True, ex=REAP_LOCK_TTL):
+            continue
+
+        processing_list = f"{PROCESSING_LIST_PREFIX}{worker_id}"
+        job_ids = redis_client.lrange(processing_list, 0, -1)
+
+        if job_ids:
+            db = session_factory()
+            try:
+                reset = db.execute(
+                    update(Job)
+                    .where(
+                        Job.id.in_(job_ids),
+                        Job.status == "RUNNING",
+                        Job.worker_id == worker_id
+                    )
+                    .values(status="QUEUED", worker_id=None)
+                    .returning(Job.id)
+                ).all()
+                db.commit()
+
+                # Prefetched jobs that never started are still QUEUED/RETRYING
+                # (or PENDING, if released by their last parent just now)
+                pending = db.execute(
+                    select(Job.id, Job.job_type, Job.priority, Job.user_id)
+                    .where(Job.id.in_(job_ids), Job.status.in_(CLAIMABLE_STATUSES))
+                ).all()
+            finally:
+                db.close()
+
+            redis_client.zrem(DEADLINE_SET, *job_ids)
+            if reset:
+                record_transition(redis_client, "RUNNING", "QUEUED", count=len(reset))
+                delete_snapshots(redis_client, [row.id for row in reset])
+
+            for job in pending:
+                enqueue(redis_client, job.job_type, job.priority, job.user_id, [job.id], at_head=True)
+            requeued += len(pending)
+
+            logger.warning(
+                f"[REAPER] Worker {worker_id} is dead. Requeued {len(pending)} jobs."
+            )
+
+        redis_client.delete(processing_list)
+        redis_client.srem(WORKERS_SET, worker_id)
+        clear_gauges(redis_client, GAUGES, worker=worker_id)
+        redis_client.delete(lock)
+
+    return requeued
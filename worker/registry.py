@@ -0,0 +1,99 @@
+import os
+import importlib
+import inspect
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+# =========================
+# JOB HANDLER REGISTRY
+# =========================
+# Maps job_type to the code that runs it, together with how it runs:
+#
+#     @register("thumbnail", max_concurrency=4, backend="process", timeout_seconds=60)
+#     def make_thumbnail(payload: dict) -> dict:
+#         ...
+#
+# - max_concurrency: execution slots for this type on each worker
+# - backend: "thread", "process" (hard timeouts, no GIL sharing) or
+#   "asyncio" (for async def handlers; many concurrent I/O jobs)
+# - timeout_seconds: upper bound on the job's own timeout_seconds
+#
+# Job types without a handler run on DEFAULT_HANDLER, which shares one
+# pool of DEFAULT_CONCURRENCY slots.
+
+BACKENDS = ("thread", "process", "asyncio")
+
+# Modules imported for their @register calls (comma separated)
+HANDLER_MODULES = os.getenv("WORKER_HANDLER_MODULES", "worker.handlers")
+
+DEFAULT_CONCURRENCY = 2
+DEFAULT_BACKEND = os.getenv("WORKER_EXECUTION_BACKEND", "thread")
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    job_type: str
+    func: Callable[[dict], dict]
+    max_concurrency: int = DEFAULT_CONCURRENCY
+    backend: str = DEFAULT_BACKEND
+    timeout_seconds: Optional[int] = None
+
+    def effective_timeout(self, job_timeout: int) -> int:
+        if self.timeout_seconds is None:
+            return job_timeout
+        return min(job_timeout, self.timeout_seconds)
+
+
+HANDLERS: Dict[str, JobHandler] = {}
+DEFAULT_HANDLER: Optional[JobHandler] = None
+
+
+def register(
+    job_type: str,
+    max_concurrency: int = DEFAULT_CONCURRENCY,
+    backend: str = None,
+    timeout_seconds: int = None
+):
+    """
+    Decorator registering a handler for job_type.
+    job_type="*" sets the fallback for unregistered job types.
+    """
+    def decorator(func):
+        global DEFAULT_HANDLER
+
+        handler_backend = backend or ("asyncio" if inspect.iscoroutinefunction(func) else DEFAULT_BACKEND)
+        if handler_backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {handler_backend!r} for job type {job_type!r}")
+        if inspect.iscoroutinefunction(func) != (handler_backend == "asyncio"):
+            raise ValueError(f"Job type {job_type!r}: only async def handlers run on the asyncio backend")
+
+        handler = JobHandler(job_type, func, max_concurrency, handler_backend, timeout_seconds)
+        if job_type == "*":
+            DEFAULT_HANDLER = handler
+        else:
+            HANDLERS[job_type] = handler
+        return func
+
+    return decorator
+
+
+def load_handlers():
+    """
+    Imports HANDLER_MODULES so their handlers register themselves.
+    Also called in process-pool children, which start from scratch.
+    """
+    for module in filter(None, (name.strip() for name in HANDLER_MODULES.split(","))):
+        importlib.import_module(module)
+
+
+def get_handler(job_type: str) -> JobHandler:
+    return HANDLERS.get(job_type, DEFAULT_HANDLER)
+
+
+# Metric label of job types without a handler of their own, so
+# arbitrary submitted job_type strings cannot add series
+OTHER_JOB_TYPES_LABEL = "other"
+
+
+def job_type_label(job_type: str) -> str:
+    return job_type if job_type in HANDLERS else OTHER_JOB_TYPES_LABEL
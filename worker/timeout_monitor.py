@@ -1,12 +1,9 @@
 # SQLAlchemy engine creation for database connectivity
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, update, case
 
 # Session factory to manage DB transactions
 from sqlalchemy.orm import sessionmaker
 
-# Used for time comparison and timeout calculation
-from datetime import datetime, timedelta
-
 # Job ORM model (represents jobs table)
 from common.models import Job
 
@@ -15,8 +12,21 @@ import redis
 
 # Used to pause execution between checks
 import time
-from api.config import DATABASE_URL, REDIS_HOST, REDIS_PORT, QUEUE_NAME
+from datetime import datetime, timezone
+from api.config import DATABASE_URL, REDIS_HOST, REDIS_PORT
 from common.logger import logger
+from worker.reaper import reap_dead_workers
+from worker.dependencies import resolve_dependents, recover_dependents
+from common.memo import memo_policy, finish_memo_entry
+from common.dag import mark_finishing
+from common.constants import DEADLINE_SET, HEARTBEAT_INTERVAL
+from common.telemetry import record_transition
+from common.pubsub import job_update_channel, job_update_message
+from common.snapshot import queue_snapshot_update
+from common.queue import (
+    _script, schedule, promote_due_jobs, seconds_until_next_scheduled, PROMOTE_BATCH_SIZE
+)
+from common.retry import retry_delay
 
 # =========================
 # DATABASE SETUP
@@ -43,71 +53,168 @@ redis_client = redis.Redis(
 # MONITOR CONFIGURATION
 # =========================
 
-# How often the timeout monitor runs (in seconds)
+# Longest the monitor sleeps between checks (in seconds).
+# It wakes up earlier when the next deadline is closer.
 CHECK_INTERVAL = 10
 
+# Shortest sleep between checks (in seconds)
+MIN_CHECK_INTERVAL = 0.05
+
+# Most expired deadlines handled per check
+EXPIRED_BATCH_SIZE = 1000
+
+# Drops handled deadlines, unless a new deadline replaced one meanwhile
+# (the job was claimed again). KEYS[1] = deadline set, ARGV[1] = now
+_CLEAR_EXPIRED_LUA = """
+local now = tonumber(ARGV[1])
+local removed = 0
+for i = 2, #ARGV do
+    local deadline = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if deadline and tonumber(deadline) <= now then
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+
 
 # =========================
 # TIMEOUT CHECK LOGIC
 # =========================
 
-def check_timed_out_jobs():
+def expired_jobs(now: float) -> list:
     """
-    Scans all RUNNING jobs and checks whether they have exceeded
-    their allowed execution time (timeout_seconds).
-
-    If a job times out:
-    - Retry it if retries remain
-    - Otherwise mark it FAILED
+    IDs of jobs whose deadline in the DEADLINE_SET sorted set has
+    passed. They stay in the set until clear_expired_jobs(), so a
+    failed check is simply retried.
     """
+    return redis_client.zrangebyscore(DEADLINE_SET, "-inf", now, start=0, num=EXPIRED_BATCH_SIZE)
 
-    # Open a new database session
-    db = SessionLocal()
-
-    # Current time (used to calculate elapsed execution time)
-    # NOTE: utcnow() is used here; later we should move to timezone-aware UTC
-    now = datetime.utcnow()
-
-    # Fetch all jobs that are currently RUNNING
-    running_jobs = db.query(Job).filter(Job.status == "RUNNING").all()
 
-    # Iterate over all running jobs
-    for job in running_jobs:
-        # Calculate how long the job has been running
-        elapsed = (now - job.started_at).total_seconds()
+def clear_expired_jobs(job_ids: list, now: float):
+    """
+    Removes deadlines once their jobs' UPDATE has committed.
+    """
+    return _script(redis_client, "clear_expired", _CLEAR_EXPIRED_LUA)(
+        keys=[DEADLINE_SET],
+        args=[now, *job_ids]
+    )
 
-        # Check if job exceeded its timeout limit
-        if elapsed > job.timeout_seconds:
-            # Increment retry attempt counter
-            job.attempts += 1
 
-            # Store timeout error message
-            job.last_error = "Job timed out"
+def check_timed_out_jobs():
+    """
+    Handles jobs whose deadline (started_at + timeout_seconds),
+    registered by the worker, has passed.
 
-            # If retries are still allowed
-            if job.attempts <= job.max_retries:
-                # Mark job as RETRYING
-                job.status = "RETRYING"
+    If a job times out:
+    - Retry it after its backoff delay if retries remain
+    - Otherwise mark it FAILED
 
-                # Persist DB changes
-                db.commit()
+    All transitions are applied with a single UPDATE. Deadlines are
+    only removed after it committed; if it fails, the next check sees
+    the same jobs again.
+    """
 
-                # Push job back into Redis queue for retry
-                redis_client.rpush(QUEUE_NAME, job.id)
+    checked_at = time.time()
+    expired_ids = expired_jobs(checked_at)
+    if not expired_ids:
+        return
 
-                logger.info(f"[TIMEOUT] Job {job.id} timed out. Retrying.")
+    # Jobs failing below keep a mark until their dependents are released
+    mark_finishing(redis_client, expired_ids)
 
-            else:
-                # No retries left → permanently fail job
-                job.status = "FAILED"
+    # Open a new database session
+    db = SessionLocal()
 
-                # Persist DB changes
-                db.commit()
+    try:
+        # Only jobs still RUNNING are affected; the SET clause sees
+        # the pre-update row, so attempts + 1 is the new attempt count
+        rows = db.execute(
+            update(Job)
+            .where(Job.id.in_(expired_ids), Job.status == "RUNNING")
+            .values(
+                attempts=Job.attempts + 1,
+                last_error="Job timed out",
+                status=case(
+                    (Job.attempts + 1 <= Job.max_retries, "RETRYING"),
+                    else_="FAILED"
+                )
+            )
+            .returning(Job.id, Job.status, Job.job_type, Job.priority, Job.user_id, Job.attempts)
+        ).all()
+
+        # Backoff per retried job, stored as run_at in one more UPDATE
+        now = time.time()
+        retries = [
+            (row, now + retry_delay(row.job_type, row.attempts))
+            for row in rows if row.status == "RETRYING"
+        ]
+        if retries:
+            db.execute(
+                update(Job)
+                .where(Job.id.in_([row.id for row, _ in retries]))
+                .values(run_at=case(
+                    {row.id: datetime.fromtimestamp(run_at, timezone.utc) for row, run_at in retries},
+                    value=Job.id
+                ))
+            )
+
+        # Persist DB changes
+        db.commit()
+
+    finally:
+        # Close database session
+        db.close()
+
+    # Handled: timed out now, or no longer RUNNING anyway
+    clear_expired_jobs(expired_ids, checked_at)
+
+    # Park retried jobs in the scheduled set until their backoff expires
+    if retries:
+        schedule(redis_client, [
+            (row.id, row.job_type, row.priority, row.user_id, run_at)
+            for row, run_at in retries
+        ])
+        record_transition(redis_client, "RUNNING", "RETRYING", count=len(retries))
+    if len(rows) > len(retries):
+        record_transition(redis_client, "RUNNING", "FAILED", count=len(rows) - len(retries))
+
+    # Publish the transitions and refresh the status snapshots in one pipeline
+    run_at_by_id = {row.id: run_at for row, run_at in retries}
+    pipe = redis_client.pipeline(transaction=False)
+    for row in rows:
+        fields = {"status": row.status, "attempts": row.attempts, "last_error": "Job timed out"}
+        if row.id in run_at_by_id:
+            fields["run_at"] = datetime.fromtimestamp(run_at_by_id[row.id], timezone.utc)
+        pipe.publish(job_update_channel(row.user_id), job_update_message(row.id, row.status, row.user_id))
+        queue_snapshot_update(pipe, row.id, fields)
+    pipe.execute()
+
+    for row in rows:
+        if row.status == "RETRYING":
+            logger.info(f"[TIMEOUT] Job {row.id} timed out. Retrying.")
+        else:
+            logger.error(f"[TIMEOUT] Job {row.id} permanently failed.")
+            # Identical submissions run again; jobs waiting for it fail
+            if memo_policy(row.job_type):
+                finish_memo_entry(redis_client, row.id, row.job_type, "FAILED")
+            resolve_dependents(redis_client, SessionLocal, row.id, "FAILED")
+
+
+def seconds_until_next_deadline() -> float:
+    """
+    How long the monitor may sleep before the earliest deadline expires
+    or the earliest scheduled job is due, bounded by MIN_CHECK_INTERVAL
+    and CHECK_INTERVAL.
+    """
+    wait = seconds_until_next_scheduled(redis_client, CHECK_INTERVAL)
 
-                logger.error(f"[TIMEOUT] Job {job.id} permanently failed.")
+    earliest = redis_client.zrange(DEADLINE_SET, 0, 0, withscores=True)
+    if earliest:
+        _, deadline = earliest[0]
+        wait = min(wait, deadline - time.time())
 
-    # Close database session
-    db.close()
+    return min(CHECK_INTERVAL, max(MIN_CHECK_INTERVAL, wait))
 
 
 # =========================
@@ -119,18 +226,39 @@ def main():
     Entry point for the timeout monitor service.
 
     Runs forever:
-    - Periodically checks for timed-out jobs
-    - Sleeps for CHECK_INTERVAL seconds
+    - Handles timed-out jobs as soon as their deadline passes
+    - Promotes delayed jobs and retries once they are due
+      (a backstop for the workers, which promote before dequeuing)
+    - Requeues in-flight jobs of dead workers
+    - Finishes interrupted dependent job releases (see worker.dependencies)
+    - Sleeps until the next deadline (at most CHECK_INTERVAL seconds)
     """
 
     print("[TIMEOUT MONITOR] Started.")
 
-    while True:
-        # Perform timeout check
-        check_timed_out_jobs()
+    last_reap = 0.0
 
-        # Sleep before next scan
-        time.sleep(CHECK_INTERVAL)
+    while True:
+        try:
+            # Perform timeout check
+            check_timed_out_jobs()
+
+            # Move due delayed jobs into the ready queue
+            while promote_due_jobs(redis_client) >= PROMOTE_BATCH_SIZE:
+                pass
+
+            # Backstop for the workers' own reapers (e.g. when all workers died),
+            # and for dependent releases cut short by a crash or DB error
+            if time.time() - last_reap >= HEARTBEAT_INTERVAL:
+                reap_dead_workers(redis_client, SessionLocal)
+                recover_dependents(redis_client, SessionLocal)
+                last_reap = time.time()
+        except Exception:
+            # Expired deadlines are kept, so the next check retries them
+            logger.exception("[TIMEOUT] Check failed")
+
+        # Sleep until the next deadline or scheduled job is due
+        time.sleep(min(seconds_until_next_deadline(), HEARTBEAT_INTERVAL))
 
 
 # =========================
@@ -1,7 +1,10 @@
+import os
 import signal
 import threading
-from threading import Semaphore
-from api.config import REDIS_HOST, REDIS_PORT, QUEUE_NAME, DATABASE_URL
+from collections import deque
+from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from api.config import REDIS_HOST, REDIS_PORT, DATABASE_URL
 # Redis client library to interact with Redis queue
 import redis
 
@@ -9,30 +12,98 @@ import redis
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-# Job ORM model (represents jobs table)
-from common.models import Job
+# Atomic job state transitions
+from worker.job_state import claim_job, finish_job
 
-# Function that actually executes the job logic
-from worker.executor import execute_job
+# Handler registry and the backends that execute job logic
+from worker.registry import HANDLERS, JobHandler, get_handler, load_handlers, job_type_label
+from worker.executor import execute_job, AsyncRunner
+from worker.process_pool import ProcessPool
+from worker.reaper import reap_dead_workers
+from worker.write_behind import WriteBehindBuffer
+from worker.dependencies import resolve_dependents
 
 # Used for timezone-aware timestamps
 from datetime import datetime, timezone
-import json
 import time
 import uuid
 from common.logger import logger
+from common.pubsub import job_update_channel, job_update_message
+from common.snapshot import queue_snapshot_update
+from common.blobstore import offload, resolve
+from common.queue import schedule, dequeue, push_to_flow, promote_due_jobs, DOORBELL
+from common.retry import retry_delay
+from common.models import TERMINAL_STATUSES
+from common.memo import memo_policy, finish_memo_entry
+from common.dag import mark_finishing
+from common.telemetry import (
+    record_transition,
+    MetricsBuffer,
+    set_gauges,
+    clear_gauges,
+    GAUGES
+)
+from common.constants import (
+    PROCESSING_LIST_PREFIX,
+    WORKER_HEARTBEAT_PREFIX,
+    WORKERS_SET,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TTL,
+    DEADLINE_SET
+)
 
 # =========================
 # CONFIGURATION CONSTANTS
 # =========================
 
 
-MAX_CONCURRENT_JOBS = 2
-semaphore = Semaphore(MAX_CONCURRENT_JOBS)
-
-# Unique worker ID for tracking
-WORKER_ID = str(uuid.uuid4())
+# Job types this worker serves (comma separated), or "*" for all.
+# Handlers, per-type concurrency, timeouts and execution backends
+# ("thread", "process", "asyncio") come from the registry
+# (worker/registry.py, handlers in worker/handlers.py).
+WORKER_JOB_TYPES = os.getenv("WORKER_JOB_TYPES", "*")
+SERVED_TYPES = None if WORKER_JOB_TYPES.strip() == "*" else [
+    job_type.strip() for job_type in WORKER_JOB_TYPES.split(",") if job_type.strip()
+]
+
+# Execution slots per handler (its job_type, "*" for the fallback
+# handler of unregistered types); filled in by main()
+slot_limits: Dict[str, int] = {}
+slots_in_use: Dict[str, int] = {}
+slot_freed = threading.Event()
+
+# Upper bound on job IDs pulled from Redis per round trip (0 = free slots).
+# A worker only fetches as many jobs as it has free slots for.
+PREFETCH_COUNT = int(os.getenv("WORKER_PREFETCH_COUNT", 0))
+
+# Blocking fallback timeout when the queue is empty (seconds)
+DEQUEUE_TIMEOUT = 5
+
+# Backends, created by main() for the handlers this worker serves
+process_pools: Dict[str, ProcessPool] = {}
+async_runner = None
+
+# Write-behind mode: terminal transitions of all job threads are
+# committed together every WRITE_BEHIND_FLUSH_MS milliseconds with one
+# bulk UPDATE, and their job updates are published in one pipeline.
+# A job is acknowledged only after its outcome has been flushed.
+WRITE_BEHIND = os.getenv("WORKER_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_FLUSH_MS = int(os.getenv("WORKER_WRITE_BEHIND_FLUSH_MS", 5))
+write_behind = None
+
+# Unique worker ID for tracking (assigned by the autoscaler, if any)
+WORKER_ID = os.getenv("WORKER_ID") or str(uuid.uuid4())
 shutdown_event = threading.Event()
+
+# In-flight list owned by this worker (reliable queue)
+PROCESSING_LIST = f"{PROCESSING_LIST_PREFIX}{WORKER_ID}"
+
+# Hot-path timings, flushed to Redis by the heartbeat thread
+metrics = MetricsBuffer()
+
+# Number of execution slots currently in use
+jobs_in_flight = 0
+jobs_in_flight_lock = threading.Lock()
 # =========================
 # REDIS CLIENT SETUP
 # =========================
@@ -56,12 +127,36 @@ engine = create_engine(DATABASE_URL)
 # Create session factory for DB transactions
 SessionLocal = sessionmaker(bind=engine)
 
-def publish_job_update(job_id: str, status: str):
-    message = json.dumps({
-        "job_id": job_id,
-        "status": status
-    })
-    redis_client.publish("job_updates", message)
+def execute(handler: JobHandler, job_type: str, payload: dict, timeout_seconds: int) -> dict:
+    """
+    Runs job logic on the handler's execution backend.
+    The process and asyncio backends raise JobTimeoutError when
+    the job overruns.
+
+    Takes and returns documents as stored in the jobs row: large
+    payloads/results are blob references (see common.blobstore),
+    resolved and offloaded next to the job code.
+    """
+    if handler.backend == "process":
+        return process_pools[handler.job_type].run(job_type, payload, timeout_seconds)
+    if handler.backend == "asyncio":
+        return offload(async_runner.run(job_type, resolve(payload), timeout_seconds))
+    return offload(execute_job(job_type, resolve(payload)))
+
+def publish_job_update(job_id: str, status: str, user_id: str, **fields):
+    """
+    Publishes a transition on the owner's shard channel (see common.pubsub)
+    and writes it, with the other changed fields, to the job's status
+    snapshot (see common.snapshot), in one round trip.
+    """
+    if write_behind is not None:
+        write_behind.publish(job_id, status, user_id, **fields)
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.publish(job_update_channel(user_id), job_update_message(job_id, status, user_id))
+    queue_snapshot_update(pipe, job_id, {"status": status, **fields})
+    with metrics.timer("worker_redis_call_seconds", op="publish"):
+        pipe.execute()
 # =========================
 # JOB PROCESSING FUNCTION
 # =========================
@@ -76,95 +171,340 @@ def process_job(job_id: str):
     """
     Process a single job identified by job_id.
     This function:
-    - Loads the job from DB
-    - Marks it RUNNING
+    - Claims the job (QUEUED/RETRYING → RUNNING) with one conditional UPDATE
     - Executes job logic
-    - Updates status based on success or failure
+    - Applies the outcome with one conditional UPDATE
+
+    A job claimed by another worker is skipped, and an outcome is
+    discarded if the job stopped being RUNNING on this worker
+    (timed out or requeued) while it executed.
     """
-    # Open a new DB session
-    db = SessionLocal()
+    # Record job start time (timezone-aware UTC)
+    started_at = datetime.now(timezone.utc)
 
-    # Fetch job record from database
-    job = db.query(Job).filter(Job.id == job_id).first()
+    # Claim the job; no row means it is missing or already taken
+    with metrics.timer("worker_db_call_seconds", op="claim_job"):
+        with SessionLocal() as db:
+            job = db.execute(claim_job(job_id, WORKER_ID, started_at)).first()
+            db.commit()
 
-    # If job does not exist, log and exit
-    if not job:
-        logger.info(f"[WORKER] Job {job_id} not found")
+    if job is None:
+        logger.info(f"[WORKER] Skipping job {job_id}, not claimable")
         return
-    # 🔒 SAFETY CHECK — ADD THIS HERE
-    if job.status not in ("QUEUED", "RETRYING"):
-        logger.info(f"[WORKER] Skipping job {job.id}, status={job.status}")
-        return
-    logger.info(f"[WORKER] Processing job {job.id}")
-
-    # Mark job as RUNNING
-    job.status = "RUNNING"
-    job.worker_id = WORKER_ID
-    # Record job start time (timezone-aware UTC)
-    job.started_at = datetime.now(timezone.utc)
-
-    # Persist changes
-    db.commit()
-    logger.info(f"[WORKER] Job {job.id} marked RUNNING")
-    publish_job_update(job.id, "RUNNING")
+    logger.info(f"[WORKER] Job {job_id} marked RUNNING")
+
+    job_type = job.job_type
+    user_id = job.user_id
+    handler = get_handler(job_type)
+    timeout_seconds = handler.effective_timeout(job.timeout_seconds)
+
+    # Last transition (submission or retry), or the scheduled run time
+    enqueued_at = max(filter(None, (job.previous_updated_at, job.run_at)), default=None)
+    if enqueued_at is not None:
+        metrics.observe(
+            "job_queue_wait_seconds",
+            max((started_at.replace(tzinfo=None) - enqueued_at).total_seconds(), 0),
+            job_type=job_type_label(job_type)
+        )
+
+    # Register the deadline so the timeout monitor only looks at expired jobs
+    with metrics.timer("worker_redis_call_seconds", op="zadd_deadline"):
+        redis_client.zadd(
+            DEADLINE_SET,
+            {job_id: started_at.timestamp() + timeout_seconds}
+        )
+    publish_job_update(job_id, "RUNNING", user_id, started_at=started_at)
+    record_transition(redis_client, job.previous_status, "RUNNING")
 
     try:
         # Execute the actual job logic
         # This is user-defined work (CPU / IO / etc.)
-        logger.info(f"[WORKER] Waiting for execution slot: {job.id}")
-        with semaphore:
-            logger.info(f"[WORKER] Executing job (slot acquired): {job.id}")
-            result = execute_job(job.job_type, job.payload)
-        logger.info(f"[WORKER] Job finished, slot released: {job.id}")
-    
+        # The execution slot is held by the caller (see run_job)
+        with metrics.timer("job_execution_seconds", job_type=job_type_label(job_type)):
+            result = execute(handler, job_type, job.payload, timeout_seconds)
 
+    except Exception as e:
+        # If execution fails, increment attempt counter
+        attempts = job.attempts + 1
 
-        # If execution succeeds, mark job COMPLETED
-        job.status = "COMPLETED"
+        # Check if retries are still allowed
+        if attempts <= job.max_retries:
+            # Mark job as RETRYING, to run again after an exponential backoff
+            delay = retry_delay(job_type, attempts)
+            run_at = time.time() + delay
+            if not set_outcome(
+                job_id, job_type, user_id, "RETRYING",
+                attempts=attempts,
+                last_error=str(e),
+                run_at=datetime.fromtimestamp(run_at, timezone.utc)
+            ):
+                return
+            record_transition(redis_client, "RUNNING", "RETRYING")
+
+            logger.warning(f"[WORKER] Job {job_id} failed with error: {e}. Retrying in {delay:.1f}s (attempt {attempts}/{job.max_retries})")
+
+            # Park the job in the scheduled set until its backoff expires
+            with metrics.timer("worker_redis_call_seconds", op="schedule_retry"):
+                schedule(redis_client, [(job_id, job_type, job.priority, user_id, run_at)])
 
-        # Record completion time
-        job.finished_at = datetime.now(timezone.utc)
+        else:
+            # If retries exhausted, mark job as FAILED
+            if not set_outcome(job_id, job_type, user_id, "FAILED", attempts=attempts, last_error=str(e)):
+                return
+            record_transition(redis_client, "RUNNING", "FAILED")
 
-        # Store result (temporary – may move elsewhere later)
-        job.result = result
+            logger.error(f"[WORKER] Job {job_id} permanently failed.")
+        return
 
-        # Persist changes
-        db.commit()
-        
-        publish_job_update(job.id, "COMPLETED")
+    # If execution succeeds, mark job COMPLETED with its result
+    finished_at = datetime.now(timezone.utc)
+    if not set_outcome(job_id, job_type, user_id, "COMPLETED", finished_at=finished_at, result=result):
+        return
 
-        logger.info(f"[WORKER] Job {job.id} completed")
+    record_transition(
+        redis_client, "RUNNING", "COMPLETED",
+        execution_seconds=(finished_at - started_at).total_seconds()
+    )
 
-    except Exception as e:
-        # If execution fails, increment attempt counter
-        job.attempts += 1
+    logger.info(f"[WORKER] Job {job_id} completed")
 
-        # Store error message for debugging
-        job.last_error = str(e)
 
-        # Check if retries are still allowed
-        if job.attempts <= job.max_retries:
-            # Mark job as RETRYING
-            job.status = "RETRYING"
-            db.commit()
-            publish_job_update(job.id, "RETRYING")
+def set_outcome(job_id: str, job_type: str, user_id: str, status: str, **values) -> bool:
+    """
+    Applies a terminal transition in one conditional UPDATE
+    (or the next write-behind flush), publishes it and drops the job's
+    deadline (a failed commit leaves it to the timeout monitor). A COMPLETED /
+    FAILED job then settles its memo entry and releases or fails the
+    jobs depending on it.
+    Returns False (and logs) if the job is no longer RUNNING on this worker.
+    """
+    if status in TERMINAL_STATUSES:
+        # Until its dependents are released, so a crash after the
+        # commit is recovered (see worker.dependencies)
+        with metrics.timer("worker_redis_call_seconds", op="mark_finishing"):
+            mark_finishing(redis_client, [job_id])
+
+    with metrics.timer("job_db_commit_seconds", job_type=job_type_label(job_type), transition=status):
+        if write_behind is not None:
+            # Blocks until flushed, so the job is acked only afterwards
+            updated = write_behind.submit(job_id, user_id, status, **values).result()
+        else:
+            with SessionLocal() as db:
+                updated = db.execute(finish_job(job_id, WORKER_ID, status=status, **values)).first()
+                db.commit()
+            if updated is not None:
+                publish_job_update(job_id, status, user_id, **values)
+
+    if not updated:
+        logger.warning(f"[WORKER] Job {job_id} is no longer running here, {status} discarded")
+        return False
+
+    # Only once the outcome is committed: until then the timeout
+    # monitor still recovers the job if this worker gets stuck
+    with metrics.timer("worker_redis_call_seconds", op="zrem_deadline"):
+        redis_client.zrem(DEADLINE_SET, job_id)
+
+    if status in TERMINAL_STATUSES:
+        if memo_policy(job_type):
+            with metrics.timer("worker_redis_call_seconds", op="finish_memo"):
+                finish_memo_entry(redis_client, job_id, job_type, status)
+        with metrics.timer("worker_redis_call_seconds", op="resolve_dependents"):
+            resolve_dependents(redis_client, SessionLocal, job_id, status)
+    return True
+
+
+# =========================
+# DEQUEUE & DISPATCH
+# =========================
+
+def try_acquire_slot(handler_key: str) -> bool:
+    with jobs_in_flight_lock:
+        if slots_in_use[handler_key] >= slot_limits[handler_key]:
+            return False
+        slots_in_use[handler_key] += 1
+        return True
+
+
+def release_slot(handler_key: str):
+    with jobs_in_flight_lock:
+        slots_in_use[handler_key] -= 1
+    slot_freed.set()
 
-            logger.warning(f"[WORKER] Job {job.id} failed with error: {e}. Retrying (attempt {job.attempts}/{job.max_retries})")
 
-            # Push job ID back into Redis queue for retry
-            redis_client.rpush(QUEUE_NAME, job.id)
+def free_slots() -> Dict[str, int]:
+    with jobs_in_flight_lock:
+        return {key: slot_limits[key] - slots_in_use[key] for key in slot_limits}
 
+
+def fetch_plan(buffer: deque) -> list:
+    """
+    (count, job_types, exclude_types) dequeue requests, one per handler
+    with free slots not already covered by buffered jobs, so this
+    worker never takes jobs it has no slot for.
+
+    The fallback handler ("*") only fetches types without a handler of
+    their own (job_types None = any type but exclude_types), and every
+    buffered job counts against it, so it never drains the queue while
+    jobs wait here for a slot.
+    """
+    free = free_slots()
+    for entry in buffer:
+        handler_key = get_handler(entry[2]).job_type
+        free[handler_key] -= 1
+        if handler_key != "*" and "*" in free:
+            free["*"] -= 1
+
+    served = SERVED_TYPES if SERVED_TYPES is not None else list(HANDLERS)
+    plan = []
+    for handler_key, count in free.items():
+        if count <= 0:
+            continue
+        if PREFETCH_COUNT > 0:
+            count = min(count, PREFETCH_COUNT)
+        if handler_key == "*":
+            if SERVED_TYPES is None:
+                plan.append((count, None, list(HANDLERS)))
+                continue
+            # Listed types without a handler of their own
+            job_types = [job_type for job_type in served if job_type not in HANDLERS]
         else:
-            # If retries exhausted, mark job as FAILED
-            job.status = "FAILED"
-            db.commit()
-            publish_job_update(job.id, "FAILED")
+            job_types = [handler_key] if handler_key in served else []
+        if job_types:
+            plan.append((count, job_types, None))
+    return plan
+
+
+def fetch_jobs(plan: list, block_timeout: int = DEQUEUE_TIMEOUT) -> list:
+    """
+    Moves job IDs, picked by the weighted fair scheduler
+    (common.queue), into this worker's processing list: up to `count`
+    of the given types per (count, job_types, exclude_types) entry of
+    the plan (any type but exclude_types for job_types None).
+
+    - One round trip promotes due delayed jobs and drains a batch
+    - When nothing is queued, blocks on the scheduler doorbell
+      for up to block_timeout seconds (0 = don't block) and tries once more
+
+    IDs stay in the processing list until ack_job() removes them,
+    so a crashed worker's jobs can be requeued by the reaper.
+    Returns [job_id, flow, job_type, weight] entries.
+    """
+    start = time.perf_counter()
+
+    def drain(promote: bool) -> list:
+        pipe = redis_client.pipeline(transaction=False)
+        if promote:
+            promote_due_jobs(pipe)
+        for count, job_types, exclude_types in plan:
+            dequeue(pipe, PROCESSING_LIST, count, job_types, exclude_types)
+        with metrics.timer("worker_redis_call_seconds", op="dequeue"):
+            results = pipe.execute()
+        return [entry for batch in results[1 if promote else 0:] for entry in batch]
+
+    # Promote due delayed jobs and dequeue in one round trip
+    entries = drain(promote=True)
 
-            logger.error(f"[WORKER] Job {job.id} permanently failed.")
+    if not entries and block_timeout and redis_client.blpop(DOORBELL, timeout=block_timeout):
+        entries = drain(promote=False)
 
+    # Includes time blocked on an empty queue
+    if entries:
+        metrics.observe("worker_dequeue_seconds", time.perf_counter() - start)
+    return entries
+
+
+def ack_job(job_id: str):
+    """
+    Removes a finished job from this worker's processing list.
+    """
+    with metrics.timer("worker_redis_call_seconds", op="ack"):
+        redis_client.lrem(PROCESSING_LIST, 1, job_id)
+
+
+def run_job(job_id: str, handler_key: str):
+    """
+    Runs a job on a pool thread, acknowledges it and
+    frees its handler's execution slot afterwards.
+    """
+    global jobs_in_flight
+
+    with jobs_in_flight_lock:
+        jobs_in_flight += 1
+    try:
+        process_job(job_id)
+        ack_job(job_id)
+    except Exception:
+        logger.exception(f"[WORKER] Unexpected error while processing job {job_id}")
     finally:
-        # Always close DB session
-        db.close()
+        with jobs_in_flight_lock:
+            jobs_in_flight -= 1
+        release_slot(handler_key)
+        logger.info(f"[WORKER] Job finished, slot released: {job_id}")
+
+
+def return_unstarted_jobs(buffer: deque):
+    """
+    Moves prefetched but unstarted job IDs from the processing list
+    back to the head of their flows so another worker picks them up first.
+    """
+    if buffer:
+        for job_id, flow, job_type, weight in reversed(buffer):
+            push_to_flow(redis_client, flow, job_type, float(weight), [job_id], at_head=True)
+            redis_client.lrem(PROCESSING_LIST, 1, job_id)
+        logger.info(f"[WORKER] Returned {len(buffer)} prefetched jobs to the queue")
+        buffer.clear()
+
+
+# =========================
+# HEARTBEAT & REAPER
+# =========================
+
+def send_heartbeat():
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(f"{WORKER_HEARTBEAT_PREFIX}{WORKER_ID}", "alive", ex=HEARTBEAT_TTL)
+    pipe.sadd(WORKERS_SET, WORKER_ID)
+    pipe.execute()
+
+
+def heartbeat_loop():
+    """
+    Keeps this worker's heartbeat alive and reaps dead peers,
+    so a crashed worker's jobs are requeued within seconds.
+    """
+    while not shutdown_event.wait(HEARTBEAT_INTERVAL):
+        try:
+            send_heartbeat()
+            reap_dead_workers(redis_client, SessionLocal, exclude=WORKER_ID)
+            publish_metrics()
+        except Exception:
+            logger.exception("[WORKER] Heartbeat failed")
+
+
+def publish_metrics():
+    """
+    Flushes buffered timings and this worker's gauges to Redis.
+    """
+    metrics.flush(redis_client)
+    set_gauges(
+        redis_client,
+        {
+            "worker_jobs_in_flight": jobs_in_flight,
+            "worker_concurrency_limit": sum(slot_limits.values())
+        },
+        worker=WORKER_ID
+    )
+
+
+def unregister_worker():
+    """
+    Drops this worker's heartbeat. Jobs left unacknowledged in the
+    processing list stay registered so a peer's reaper requeues them.
+    """
+    metrics.flush(redis_client)
+    clear_gauges(redis_client, GAUGES, worker=WORKER_ID)
+    redis_client.delete(f"{WORKER_HEARTBEAT_PREFIX}{WORKER_ID}")
+    if redis_client.llen(PROCESSING_LIST) == 0:
+        redis_client.srem(WORKERS_SET, WORKER_ID)
 
 
 # =========================
@@ -174,17 +514,91 @@ def process_job(job_id: str):
 def main():
     """
     Worker entry point.
-    Continuously waits for jobs from Redis queue
-    and processes them one by one.
+    Fetches job IDs of the types it serves, as many as its handlers
+    have free slots for, and fans them out to a thread pool.
+    Each handler (worker/registry.py) has its own concurrency limit
+    and execution backend.
     """
 
-    logger.info("[WORKER] Worker started. Waiting for jobs...")
+    global async_runner, write_behind
+
+    load_handlers()
+    if SERVED_TYPES is None:
+        handlers = [*HANDLERS.values(), get_handler("*")]
+    else:
+        handlers = [get_handler(job_type) for job_type in SERVED_TYPES]
+
+    for handler in handlers:
+        if handler.job_type in slot_limits:
+            continue
+        slot_limits[handler.job_type] = handler.max_concurrency
+        slots_in_use[handler.job_type] = 0
+        if handler.backend == "process":
+            process_pools[handler.job_type] = ProcessPool(handler.max_concurrency)
+        elif handler.backend == "asyncio" and async_runner is None:
+            async_runner = AsyncRunner()
+        logger.info(
+            f"[WORKER] Handler {handler.job_type}: {handler.max_concurrency} slots "
+            f"on the {handler.backend} backend"
+        )
+
+    logger.info(f"[WORKER] Worker started, serving job types: {WORKER_JOB_TYPES}. Waiting for jobs...")
+
+    if WRITE_BEHIND:
+        write_behind = WriteBehindBuffer(
+            SessionLocal, redis_client, WORKER_ID, WRITE_BEHIND_FLUSH_MS / 1000, metrics
+        )
+        logger.info(f"[WORKER] Write-behind enabled, flushing every {WRITE_BEHIND_FLUSH_MS}ms")
+
+    send_heartbeat()
+    heartbeat = threading.Thread(target=heartbeat_loop, daemon=True)
+    heartbeat.start()
+
+    # One thread per slot: process and asyncio jobs also hold a
+    # thread while they wait for their backend
+    pool = ThreadPoolExecutor(
+        max_workers=sum(slot_limits.values()),
+        thread_name_prefix="job"
+    )
+    buffer = deque()
 
     while not shutdown_event.is_set():
-        job = redis_client.blpop(QUEUE_NAME, timeout=5)
-
-        if job:
-            process_job(job[1])
+        # Top up with jobs for handlers that have room; only block
+        # on an empty queue when nothing is waiting to be dispatched
+        slot_freed.clear()
+        plan = fetch_plan(buffer)
+        if plan:
+            buffer.extend(fetch_jobs(plan, 0 if buffer else DEQUEUE_TIMEOUT))
+
+        # Dispatch every buffered job whose handler has a free slot
+        dispatched = False
+        for entry in list(buffer):
+            job_id, job_type = entry[0], entry[2]
+            handler_key = get_handler(job_type).job_type
+            if not try_acquire_slot(handler_key):
+                continue
+            buffer.remove(entry)
+            dispatched = True
+            logger.info(f"[WORKER] Executing job (slot acquired): {job_id}")
+            pool.submit(run_job, job_id, handler_key)
+
+        # Wait for a free execution slot (timeout keeps shutdown responsive)
+        if not dispatched and (buffer or not plan):
+            slot_freed.wait(timeout=1)
+
+    return_unstarted_jobs(buffer)
+
+    # Let in-flight jobs finish before exiting
+    pool.shutdown(wait=True)
+    for process_pool in process_pools.values():
+        process_pool.close()
+    if async_runner is not None:
+        async_runner.close()
+    if write_behind is not None:
+        write_behind.close()
+
+    unregister_worker()
+    logger.info("[WORKER] Shutdown complete.")
 
 
 # =========================
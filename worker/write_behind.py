@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import Future
+
+from common.logger import logger
+from common.pubsub import job_update_channel, job_update_message
+from common.snapshot import queue_snapshot_update
+from worker.job_state import finish_jobs
+
+
+class WriteBehindBuffer:
+    """
+    Batches terminal job transitions from all job threads.
+
+    - submit() queues an outcome and returns a Future
+    - A flusher thread applies every queued outcome with one bulk
+      UPDATE ... FROM (VALUES ...) each flush_interval seconds
+    - Job update messages and status snapshot writes of the flushed
+      outcomes (and any queued with publish()) go out in one pipelined
+      round trip, in queue order
+
+    The Future resolves to True once the outcome is committed, or False
+    if the job was no longer RUNNING on this worker. Callers wait for it
+    before acknowledging the job, so an acknowledged job's terminal
+    state is always durable.
+    """
+
+    def __init__(self, session_factory, redis_client, worker_id: str, flush_interval: float, metrics):
+        self._session_factory = session_factory
+        self._redis = redis_client
+        self._worker_id = worker_id
+        self._flush_interval = flush_interval
+        self._metrics = metrics
+
+        self._lock = threading.Lock()
+        self._outcomes = []   # (outcome dict, user_id, Future)
+        self._messages = []   # (job_id, status, user_id, fields) to publish
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, job_id: str, user_id: str, status: str, **values) -> Future:
+        future = Future()
+        with self._lock:
+            self._outcomes.append(({"id": job_id, "status": status, **values}, user_id, future))
+        return future
+
+    def publish(self, job_id: str, status: str, user_id: str, **fields):
+        """
+        Queues a job update message and snapshot write without a database write.
+        """
+        with self._lock:
+            self._messages.append((job_id, status, user_id, fields))
+
+    def close(self):
+        """
+        Flushes whatever is still queued and stops the flusher thread.
+        """
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("[WORKER] Write-behind flush failed")
+
+    def flush(self):
+        with self._lock:
+            outcomes, self._outcomes = self._outcomes, []
+            messages, self._messages = self._messages, []
+
+        applied = set()
+        if outcomes:
+            try:
+                with self._metrics.timer("worker_db_call_seconds", op="flush_outcomes"):
+                    with self._session_factory() as db:
+                        applied = set(db.scalars(
+                            finish_jobs(self._worker_id, [outcome for outcome, _, _ in outcomes])
+                        ).all())
+                        db.commit()
+            except Exception as e:
+                for _, _, future in outcomes:
+                    future.set_exception(e)
+                raise
+
+            for outcome, user_id, _ in outcomes:
+                if outcome["id"] in applied:
+                    fields = {name: value for name, value in outcome.items() if name != "id"}
+                    messages.append((outcome["id"], outcome["status"], user_id, fields))
+
+        try:
+            if messages:
+                pipe = self._redis.pipeline(transaction=False)
+                for job_id, status, user_id, fields in messages:
+                    pipe.publish(job_update_channel(user_id), job_update_message(job_id, status, user_id))
+                    queue_snapshot_update(pipe, job_id, {"status": status, **fields})
+                with self._metrics.timer("worker_redis_call_seconds", op="publish_batch"):
+                    pipe.execute()
+        finally:
+            # Resolved only after the commit; updates are best effort
+            for outcome, _, future in outcomes:
+                future.set_result(outcome["id"] in applied)